@@ -3,12 +3,33 @@ from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth import get_user_model
 from .models import (
     Course, Lesson, Challenge, UserProgress,
-    StudentLesson, StudentChallenge, Submission
+    StudentLesson, StudentChallenge, Submission, Cohort, Task
 )
+from .paginators import EstimatedCountPaginator
+from .tasks import retry
 
 User = get_user_model()
 
 
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Админка таблиц с большим числом строк: оценка числа строк вместо COUNT(*),
+    без подсчета всех строк при фильтрации, тяжелые поля (changelist_defer)
+    не читаются в списке. Связанные объекты - через list_select_related
+    и autocomplete_fields в наследниках.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    changelist_defer = []
+    
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        match = request.resolver_match
+        if self.changelist_defer and match and match.url_name.endswith('_changelist'):
+            queryset = queryset.defer(*self.changelist_defer)
+        return queryset
+
+
 @admin.register(User)
 class UserAdmin(BaseUserAdmin):
     """Админка для пользователей"""
@@ -62,38 +83,55 @@ class ChallengeAdmin(admin.ModelAdmin):
 
 
 @admin.register(UserProgress)
-class UserProgressAdmin(admin.ModelAdmin):
+class UserProgressAdmin(LargeTableAdmin):
     """Админка для прогресса"""
-    list_display = ['user', 'course', 'current_lesson_id', 'updated_at']
+    list_display = ['user', 'course', 'current_lesson_id', 'completed_count', 'percent_complete', 'last_activity_at']
     list_filter = ['course', 'updated_at']
     search_fields = ['user__username', 'course__title']
+    list_select_related = ['user', 'course']
+    autocomplete_fields = ['user']
+    ordering = ['-id']
+    changelist_defer = ['completed_lesson_ids', 'unlocked_lesson_ids']
 
 
 @admin.register(StudentLesson)
-class StudentLessonAdmin(admin.ModelAdmin):
+class StudentLessonAdmin(LargeTableAdmin):
     """Админка для индивидуальных уроков учеников"""
     list_display = ['student', 'lesson', 'is_unlocked', 'is_completed', 'completed_at']
     list_filter = ['is_unlocked', 'is_completed', 'created_at']
     search_fields = ['student__username', 'lesson__title']
     readonly_fields = ['created_at', 'updated_at']
+    list_select_related = ['student', 'lesson__course']
+    autocomplete_fields = ['student', 'lesson']
+    # Сортировка модели (lesson__order) требует JOIN и сортировки всей таблицы
+    ordering = ['-id']
 
 
 @admin.register(StudentChallenge)
-class StudentChallengeAdmin(admin.ModelAdmin):
+class StudentChallengeAdmin(LargeTableAdmin):
     """Админка для индивидуальных заданий учеников"""
     list_display = ['student', 'lesson', 'created_at']
     list_filter = ['created_at']
     search_fields = ['student__username', 'lesson__title']
     readonly_fields = ['created_at', 'updated_at']
+    list_select_related = ['student', 'lesson__course']
+    autocomplete_fields = ['student', 'lesson']
+    ordering = ['-id']
+    changelist_defer = ['instructions', 'initial_code', 'hints']
 
 
 @admin.register(Submission)
-class SubmissionAdmin(admin.ModelAdmin):
+class SubmissionAdmin(LargeTableAdmin):
     """Админка для отправленных заданий"""
     list_display = ['student', 'lesson', 'status', 'passed_auto_check', 'reviewed_by', 'submitted_at']
     list_filter = ['status', 'passed_auto_check', 'submitted_at', 'reviewed_at']
     search_fields = ['student__username', 'lesson__title', 'admin_comment']
     readonly_fields = ['submitted_at', 'updated_at']
+    list_select_related = ['student', 'lesson__course', 'reviewed_by']
+    autocomplete_fields = ['student', 'lesson', 'reviewed_by']
+    # id растет вместе с submitted_at, но, в отличие от него, проиндексирован
+    ordering = ['-id']
+    changelist_defer = ['code', 'output', 'error']
     fieldsets = (
         ('Основная информация', {
             'fields': ('student', 'lesson', 'status', 'passed_auto_check')
@@ -109,3 +147,28 @@ class SubmissionAdmin(admin.ModelAdmin):
         }),
     )
 
+
+@admin.register(Cohort)
+class CohortAdmin(admin.ModelAdmin):
+    """Админка для классов"""
+    list_display = ['name', 'teacher', 'created_at']
+    search_fields = ['name', 'teacher__username']
+    filter_horizontal = ['students']
+    readonly_fields = ['created_at', 'updated_at']
+
+
+@admin.register(Task)
+class TaskAdmin(LargeTableAdmin):
+    """Админка для фоновых задач (фильтр status=dead - задачи с исчерпанными попытками)"""
+    list_display = ['id', 'name', 'status', 'attempts', 'max_attempts', 'run_after', 'updated_at']
+    # Фильтр по name (SELECT DISTINCT по всей таблице) заменяет поиск
+    list_filter = ['status']
+    search_fields = ['name', 'last_error']
+    readonly_fields = ['locked_by', 'locked_at', 'last_error', 'result', 'created_at', 'updated_at']
+    actions = ['retry_tasks']
+    changelist_defer = ['kwargs', 'last_error', 'result']
+    
+    @admin.action(description='Перезапустить выбранные задачи')
+    def retry_tasks(self, request, queryset):
+        count = retry(queryset)
+        self.message_user(request, f'Перезапущено задач: {count}')
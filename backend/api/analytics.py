@@ -0,0 +1,226 @@
+"""
+Аналитика для учителей: роллапы по урокам (LessonStats).
+
+Строки LessonStats обновляются инкрементально: после коммита создания,
+проверки или удаления отправки счетчики меняются одним UPDATE с F()-дельтами,
+без блокировки строки в транзакции запроса. Время проверки считается так же,
+как при полном пересчете: вклад отправки - ее текущее reviewed_at, поэтому
+повторная проверка не учитывается дважды. Одновременные отправки одного
+ученика могут ненадолго сдвинуть гистограмму попыток: периодическая задача
+reconcile_lesson_analytics (раз в ANALYTICS['RECONCILE_SECONDS']) и команда
+rebuild_analytics пересчитывают роллапы с нуля функцией rebuild_lesson_stats.
+Ответы API зависят только от числа уроков, а не от числа отправок.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from .models import Lesson, LessonStats, Submission
+
+STATUS_COUNTERS = {
+    'pending': 'pending_count',
+    'approved': 'approved_count',
+    'rejected': 'rejected_count',
+}
+
+
+def _setting(name, default):
+    return getattr(settings, 'ANALYTICS', {}).get(name, default)
+
+
+def reconcile_interval():
+    return _setting('RECONCILE_SECONDS', 24 * 60 * 60)
+
+
+def _contribution(status, submitted_at, reviewed_at):
+    """Вклад одной отправки в счетчики роллапа (как в rebuild_lesson_stats)"""
+    counters = {'submissions_count': 1}
+    if status in STATUS_COUNTERS:
+        counters[STATUS_COUNTERS[status]] = 1
+    if reviewed_at is not None:
+        counters['review_count'] = 1
+        counters['review_seconds_total'] = int((reviewed_at - submitted_at).total_seconds())
+    return counters
+
+
+def _difference(new, old):
+    deltas = dict(new)
+    for field, value in old.items():
+        deltas[field] = deltas.get(field, 0) - value
+    return {field: value for field, value in deltas.items() if value}
+
+
+def _shift_histogram(histogram, before, after):
+    """Ученик перешел из корзины before в корзину after (0 - нет попыток)"""
+    if before and histogram.get(str(before)):
+        histogram[str(before)] -= 1
+        if not histogram[str(before)]:
+            del histogram[str(before)]
+    if after:
+        histogram[str(after)] = histogram.get(str(after), 0) + 1
+
+
+def record_submission(submission, created):
+    """Учитывает создание отправки, смену ее статуса или времени проверки после коммита"""
+    if created:
+        old_status, old = None, {}
+    else:
+        old_status = getattr(submission, '_loaded_status', None)
+        old = _contribution(
+            old_status, submission.submitted_at, getattr(submission, '_loaded_reviewed_at', None)
+        )
+    new = _contribution(submission.status, submission.submitted_at, submission.reviewed_at)
+    # Следующий вызов save() того же объекта сравнивает с сохраненным
+    submission._loaded_status = submission.status
+    submission._loaded_reviewed_at = submission.reviewed_at
+
+    counters = _difference(new, old)
+    if counters:
+        _on_commit(submission, counters, 1 if created else 0, old_status, submission.status)
+
+
+def record_submission_deleted(submission):
+    old = _contribution(submission.status, submission.submitted_at, submission.reviewed_at)
+    _on_commit(submission, _difference({}, old), -1, submission.status, None)
+
+
+def _on_commit(submission, counters, attempts_change, old_status, new_status):
+    lesson_id, student_id, submission_id = submission.lesson_id, submission.student_id, submission.pk
+    transaction.on_commit(lambda: apply_changes(
+        lesson_id, student_id, submission_id, counters, attempts_change, old_status, new_status,
+    ))
+
+
+def apply_changes(lesson_id, student_id, submission_id, counters, attempts_change=0,
+                  old_status=None, new_status=None):
+    """Применяет F()-дельты к строке LessonStats; если строки еще нет, пересчитывает урок"""
+    counters = dict(counters)
+    student_submissions = Submission.objects.filter(lesson_id=lesson_id, student_id=student_id)
+
+    attempts = before = 0
+    if attempts_change:
+        attempts = student_submissions.count()
+        before = attempts - attempts_change
+        counters['students_attempted'] = counters.get('students_attempted', 0) + (attempts > 0) - (before > 0)
+
+    if old_status != new_status and 'approved' in [old_status, new_status]:
+        # Ученик завершил урок, если у него есть хотя бы одно одобренное задание
+        other_approved = student_submissions.filter(status='approved').exclude(pk=submission_id).exists()
+        if not other_approved:
+            counters['students_completed'] = 1 if new_status == 'approved' else -1
+
+    with transaction.atomic():
+        updated = LessonStats.objects.filter(lesson_id=lesson_id).update(
+            updated_at=timezone.now(),
+            **{field: F(field) + value for field, value in counters.items() if value},
+        )
+        if not updated:
+            lesson = Lesson.objects.only('id', 'course_id').filter(pk=lesson_id).first()
+            if lesson is not None:
+                # Первая отправка урока: пересчет уже видит закоммиченное изменение
+                rebuild_lesson_stats(lesson)
+            return
+        if before != attempts:
+            # Гистограмма в JSON не меняется F()-выражением: короткая блокировка только при смене числа попыток
+            stats = LessonStats.objects.select_for_update().only('lesson_id', 'attempts_histogram').get(
+                lesson_id=lesson_id
+            )
+            _shift_histogram(stats.attempts_histogram, before, attempts)
+            stats.save(update_fields=['attempts_histogram'])
+
+
+def reconcile_all(course_id=None):
+    """Пересчет роллапов всех уроков (или уроков курса), по одному уроку в транзакции"""
+    lessons = Lesson.objects.only('id', 'course_id').order_by('course_id', 'order')
+    if course_id:
+        lessons = lessons.filter(course_id=course_id)
+
+    rebuilt = 0
+    for lesson in lessons.iterator(chunk_size=200):
+        # Короткая транзакция на урок: инкрементальные обновления того же урока ждут только ее
+        with transaction.atomic():
+            LessonStats.objects.select_for_update().filter(lesson=lesson).first()
+            rebuild_lesson_stats(lesson)
+        rebuilt += 1
+    return rebuilt
+
+
+def rebuild_lesson_stats(lesson):
+    """Полный пересчет роллапа одного урока"""
+    submissions = Submission.objects.filter(lesson=lesson)
+    status_counts = dict(submissions.values_list('status').annotate(n=Count('id')))
+
+    histogram = {}
+    per_student = submissions.values('student_id').annotate(n=Count('id')).values_list('n', flat=True)
+    for attempts in per_student.iterator(chunk_size=2000):
+        histogram[str(attempts)] = histogram.get(str(attempts), 0) + 1
+
+    review_count = 0
+    review_seconds_total = 0
+    reviewed = submissions.filter(reviewed_at__isnull=False).values_list('submitted_at', 'reviewed_at')
+    for submitted_at, reviewed_at in reviewed.iterator(chunk_size=2000):
+        review_count += 1
+        review_seconds_total += int((reviewed_at - submitted_at).total_seconds())
+
+    LessonStats.objects.update_or_create(
+        lesson=lesson,
+        defaults={
+            'course_id': lesson.course_id,
+            'submissions_count': sum(status_counts.values()),
+            'pending_count': status_counts.get('pending', 0),
+            'approved_count': status_counts.get('approved', 0),
+            'rejected_count': status_counts.get('rejected', 0),
+            'students_attempted': sum(histogram.values()),
+            'students_completed': submissions.filter(status='approved').values('student_id').distinct().count(),
+            'attempts_histogram': histogram,
+            'review_count': review_count,
+            'review_seconds_total': review_seconds_total,
+        }
+    )
+
+
+def median_from_histogram(histogram):
+    total = sum(histogram.values())
+    if not total:
+        return None
+    middle = (total + 1) / 2
+    seen = 0
+    for attempts in sorted(histogram, key=int):
+        seen += histogram[attempts]
+        if seen >= middle:
+            return int(attempts)
+    return None
+
+
+def summarize(rows):
+    """Показатели для набора роллапов (урока или всех уроков курса)"""
+    histogram = {}
+    totals = {
+        'submissions_count': 0, 'pending_count': 0, 'approved_count': 0, 'rejected_count': 0,
+        'students_attempted': 0, 'students_completed': 0, 'review_count': 0, 'review_seconds_total': 0,
+    }
+    for row in rows:
+        for field in totals:
+            totals[field] += getattr(row, field)
+        for attempts, students in row.attempts_histogram.items():
+            histogram[attempts] = histogram.get(attempts, 0) + students
+
+    reviewed = totals['approved_count'] + totals['rejected_count']
+    return {
+        'submissions_count': totals['submissions_count'],
+        'pending_count': totals['pending_count'],
+        'approved_count': totals['approved_count'],
+        'rejected_count': totals['rejected_count'],
+        'students_attempted': totals['students_attempted'],
+        'students_completed': totals['students_completed'],
+        'pass_rate': round(totals['approved_count'] / reviewed, 4) if reviewed else None,
+        'median_attempts': median_from_histogram(histogram),
+        'avg_review_seconds': (
+            round(totals['review_seconds_total'] / totals['review_count']) if totals['review_count'] else None
+        ),
+        'drop_off_rate': (
+            round(1 - totals['students_completed'] / totals['students_attempted'], 4)
+            if totals['students_attempted'] else None
+        ),
+    }
@@ -2,10 +2,14 @@ from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes, authentication_classes
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
-from rest_framework.authentication import TokenAuthentication
 from django.contrib.auth import authenticate
 from django.contrib.auth import get_user_model
 from rest_framework.authtoken.models import Token
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.tokens import RefreshToken
+from .authentication import forget_token, issue_tokens, revoke_token
+from .user_cache import invalidate_user
 from .serializers import UserSerializer
 
 User = get_user_model()
@@ -28,10 +32,13 @@ def login(request):
     user = authenticate(username=username, password=password)
     
     if user:
-        token, created = Token.objects.get_or_create(user=user)
+        # Старые бессрочные токены больше не нужны: клиент переходит на JWT
+        Token.objects.filter(user=user).delete()
+        refresh, access = issue_tokens(user)
         serializer = UserSerializer(user)
         return Response({
-            'token': token.key,
+            'token': str(access),
+            'refresh': str(refresh),
             'user': serializer.data
         })
     else:
@@ -41,15 +48,46 @@ def login(request):
         )
 
 
+@api_view(['POST'])
+@permission_classes([AllowAny])
+@authentication_classes([])  # Refresh выполняется с истекшим access токеном в заголовке
+def refresh(request):
+    """Обновление access токена по refresh токену"""
+    serializer = TokenRefreshSerializer(data={'refresh': request.data.get('refresh', '')})
+    try:
+        serializer.is_valid(raise_exception=True)
+    except TokenError:
+        return Response(
+            {'error': 'Refresh токен недействителен или истек'},
+            status=status.HTTP_401_UNAUTHORIZED
+        )
+    data = serializer.validated_data
+    return Response({
+        'token': data['access'],
+        # При ROTATE_REFRESH_TOKENS выдается новый refresh токен
+        'refresh': data.get('refresh', request.data.get('refresh')),
+    })
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
-@authentication_classes([TokenAuthentication])  # Используем только TokenAuthentication для logout
 def logout(request):
     """Выход пользователя"""
-    try:
-        request.user.auth_token.delete()
-    except:
-        pass
+    if isinstance(request.auth, Token):
+        # Старый непрозрачный токен из authtoken
+        forget_token(request.auth.key)
+        request.auth.delete()
+    elif request.auth is not None:
+        revoke_token(request.auth)
+
+    refresh_token = request.data.get('refresh')
+    if refresh_token:
+        try:
+            RefreshToken(refresh_token).blacklist()
+        except TokenError:
+            pass
+
+    invalidate_user(request.user.pk)
     return Response({'message': 'Успешный выход'}, status=status.HTTP_200_OK)
 
 
@@ -0,0 +1,175 @@
+"""
+Аутентификация по подписанным JWT токенам.
+
+Access токен проверяется по подписи без обращения к таблице токенов.
+Отозванные при выходе access токены хранятся в кэше до истечения их срока
+(список отзыва), refresh токены отзываются через token_blacklist.
+Пользователь по токену берется из кэша (см. user_cache).
+
+Старые непрозрачные токены authtoken не истекают сами: они удаляются при
+входе (клиент получает JWT) и перестают приниматься через
+LEGACY_TOKEN_MAX_AGE_DAYS после выдачи.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework.authentication import BaseAuthentication, TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication as BaseJWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from . import user_cache
+
+REVOKED_KEY_PREFIX = 'jwt:revoked:'
+TOKEN_USER_KEY_PREFIX = 'auth:token:'
+STREAM_TICKET_SALT = 'api.events.ticket'
+
+
+def issue_tokens(user):
+    """Выпускает пару refresh/access токенов для пользователя"""
+    refresh = RefreshToken.for_user(user)
+    # Роль кладем в токен, чтобы клиенту и логам не нужен был лишний запрос
+    refresh['role'] = user.role
+    return refresh, refresh.access_token
+
+
+def revoke_token(token):
+    """Добавляет токен в список отзыва до момента истечения его срока"""
+    jti = token.get(jwt_settings.JTI_CLAIM)
+    exp = token.get('exp')
+    if not jti or not exp:
+        return
+    ttl = int(exp - timezone.now().timestamp())
+    if ttl > 0:
+        cache.set(f'{REVOKED_KEY_PREFIX}{jti}', True, timeout=ttl)
+
+
+def is_token_revoked(token):
+    """Проверяет, был ли токен отозван при выходе"""
+    jti = token.get(jwt_settings.JTI_CLAIM)
+    return bool(jti) and cache.get(f'{REVOKED_KEY_PREFIX}{jti}', False)
+
+
+class JWTAuthentication(BaseJWTAuthentication):
+    """
+    JWT аутентификация с проверкой списка отзыва.
+
+    Заголовок вида `Token <opaque>` (старые токены из authtoken) пропускается,
+    чтобы его обработал следующий класс аутентификации.
+    """
+
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None or raw_token.count(b'.') != 2:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+        if is_token_revoked(validated_token):
+            raise AuthenticationFailed('Токен отозван', code='token_revoked')
+
+        return self.get_user(validated_token), validated_token
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[jwt_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken('Токен не содержит идентификатор пользователя')
+
+        try:
+            user = user_cache.get_user(user_id)
+        except get_user_model().DoesNotExist:
+            raise AuthenticationFailed('Пользователь не найден', code='user_not_found')
+
+        if not user.is_active:
+            raise AuthenticationFailed('Пользователь неактивен', code='user_inactive')
+
+        if jwt_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(jwt_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed('Пароль пользователя был изменен', code='password_changed')
+
+        return user
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Аутентификация старыми токенами authtoken с кэшированием token -> user"""
+
+    def authenticate_credentials(self, key):
+        cache_key = f'{TOKEN_USER_KEY_PREFIX}{key}'
+        user_id = cache.get(cache_key)
+        if user_id is None:
+            row = Token.objects.filter(key=key).values_list('user_id', 'created').first()
+            if row is None:
+                raise AuthenticationFailed('Недействительный токен')
+            user_id, created = row
+            ttl = legacy_token_ttl(created)
+            if ttl <= 0:
+                Token.objects.filter(key=key).delete()
+                raise AuthenticationFailed('Срок действия токена истек, войдите заново')
+            # Запись в кэше не переживает токен
+            cache.set(cache_key, user_id, timeout=min(user_cache.shared_ttl(), ttl))
+
+        try:
+            user = user_cache.get_user(user_id)
+        except get_user_model().DoesNotExist:
+            raise AuthenticationFailed('Недействительный токен')
+
+        if not user.is_active:
+            raise AuthenticationFailed('Пользователь неактивен или удален')
+
+        return user, Token(key=key, user_id=user_id)
+
+
+def legacy_token_ttl(created):
+    """Сколько секунд старый токен, выданный в created, еще принимается"""
+    expires = created + timedelta(days=settings.LEGACY_TOKEN_MAX_AGE_DAYS)
+    return int((expires - timezone.now()).total_seconds())
+
+
+def forget_token(key):
+    """Удаляет из кэша связь старого токена с пользователем"""
+    cache.delete(f'{TOKEN_USER_KEY_PREFIX}{key}')
+
+
+def issue_stream_ticket(user):
+    """Подписанный билет для открытия потока SSE (живет SSE_TICKET_SECONDS)"""
+    return signing.dumps({'u': user.pk}, salt=STREAM_TICKET_SALT)
+
+
+class StreamTicketAuthentication(BaseAuthentication):
+    """
+    Билет из параметра ?ticket= для EventSource, который не умеет передавать заголовки.
+    Используется только потоками событий: билет годится лишь для открытия потока
+    и истекает через SSE_TICKET_SECONDS, поэтому его попадание в журналы доступа
+    не раскрывает JWT.
+    """
+
+    def authenticate(self, request):
+        ticket = request.query_params.get('ticket')
+        if not ticket:
+            return None
+        try:
+            data = signing.loads(ticket, salt=STREAM_TICKET_SALT, max_age=settings.SSE_TICKET_SECONDS)
+        except signing.SignatureExpired:
+            raise AuthenticationFailed('Билет потока истек', code='ticket_expired')
+        except signing.BadSignature:
+            raise AuthenticationFailed('Недействительный билет потока', code='ticket_invalid')
+
+        try:
+            user = user_cache.get_user(data['u'])
+        except get_user_model().DoesNotExist:
+            raise AuthenticationFailed('Пользователь не найден', code='user_not_found')
+        if not user.is_active:
+            raise AuthenticationFailed('Пользователь неактивен', code='user_inactive')
+        return user, None
@@ -0,0 +1,169 @@
+"""
+Опубликованные JSON-бандлы каталога для анонимных клиентов.
+
+Для каждого курса в MEDIA_ROOT/catalog/ пишутся:
+- courses/<id>.<hash>.json - версионированный бандл (кэшируется навсегда);
+- courses/<id>.json - последняя версия (то же, что GET /api/courses/<id>/ без токена);
+- index.json - список курсов (то же, что GET /api/courses/ без токена).
+Рядом лежат сжатые копии .gz и .br (brotli, если установлен), nginx отдает их
+напрямую (gzip_static), и анонимные запросы каталога не доходят до gunicorn.
+"""
+import gzip
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .catalog import build_course_payload
+from .models import Course
+
+try:
+    import brotli
+except ImportError:  # brotli необязателен: без него публикуются только .gz
+    brotli = None
+
+BUNDLE_DIR = 'catalog'
+URL_KEY_PREFIX = 'catalog:bundle:'
+# Сколько предыдущих версий бандла оставлять для клиентов, загрузивших старый index.json
+KEEP_VERSIONS = 2
+# Сколько помнить, что бандл курса не опубликован (publish_course перезаписывает метку сразу)
+MISSING_TIMEOUT = 300
+
+
+def _root():
+    return Path(settings.MEDIA_ROOT) / BUNDLE_DIR
+
+
+def _url(relative):
+    return f'/{settings.MEDIA_URL.strip("/")}/{BUNDLE_DIR}/{relative}'
+
+
+def _write(path, data):
+    """Атомарная запись файла и его сжатых копий"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    variants = [(path, data), (path.with_name(path.name + '.gz'), gzip.compress(data, 9, mtime=0))]
+    if brotli is not None:
+        variants.append((path.with_name(path.name + '.br'), brotli.compress(data)))
+    for target, content in variants:
+        # Временное имя уникально для потока: бандл могут писать несколько воркеров сразу
+        tmp = target.with_name(f'.{target.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+        tmp.write_bytes(content)
+        os.replace(tmp, target)
+
+
+def _dump(payload):
+    return json.dumps(payload, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def _prune(course_id, keep):
+    versions = sorted(
+        (_root() / 'courses').glob(f'{course_id}.*.json'),
+        key=lambda path: path.stat().st_mtime,
+        reverse=True,
+    )
+    for path in versions:
+        if path.name in keep:
+            continue
+        if len(keep) < KEEP_VERSIONS:
+            keep.add(path.name)
+            continue
+        for variant in (path, path.with_name(path.name + '.gz'), path.with_name(path.name + '.br')):
+            variant.unlink(missing_ok=True)
+
+
+def _version(data):
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def _url_from_disk(course_id):
+    """Кэш другого процесса или перезапуск: версия восстанавливается по последнему бандлу на диске"""
+    key = f'{URL_KEY_PREFIX}{course_id}'
+    latest = _root() / 'courses' / f'{course_id}.json'
+    if not latest.exists():
+        # Пустая строка - "не опубликован": диск не проверяется на каждый запрос списка
+        cache.set(key, '', timeout=MISSING_TIMEOUT)
+        return None
+    url = _url(f'courses/{course_id}.{_version(latest.read_bytes())}.json')
+    cache.set(key, url, timeout=None)
+    return url
+
+
+def bundle_url(course_id):
+    """URL текущего версионированного бандла курса или None, если он не опубликован"""
+    url = cache.get(f'{URL_KEY_PREFIX}{course_id}')
+    if url is None:
+        return _url_from_disk(course_id)
+    return url or None
+
+
+def bundle_urls(course_ids):
+    """URL бандлов нескольких курсов: один запрос к кэшу, диск - только для промахов"""
+    keys = {f'{URL_KEY_PREFIX}{course_id}': course_id for course_id in course_ids}
+    cached = cache.get_many(list(keys))
+    urls = {}
+    for key, course_id in keys.items():
+        url = cached.get(key)
+        urls[course_id] = _url_from_disk(course_id) if url is None else url or None
+    return urls
+
+
+def publish_course(course_id):
+    """Публикует бандл курса. Возвращает URL версии или None, если курса нет"""
+    payload = build_course_payload(course_id)
+    if payload is None:
+        unpublish_course(course_id)
+        return None
+
+    data = _dump(payload)
+    version = _version(data)
+    name = f'{course_id}.{version}.json'
+    courses_dir = _root() / 'courses'
+    if not (courses_dir / name).exists():
+        _write(courses_dir / name, data)
+    _write(courses_dir / f'{course_id}.json', data)
+    _prune(course_id, {name})
+
+    url = _url(f'courses/{name}')
+    cache.set(f'{URL_KEY_PREFIX}{course_id}', url, timeout=None)
+    return url
+
+
+def unpublish_course(course_id):
+    cache.delete(f'{URL_KEY_PREFIX}{course_id}')
+    for path in (_root() / 'courses').glob(f'{course_id}.*'):
+        path.unlink(missing_ok=True)
+
+
+def publish_index():
+    """Список курсов в формате ответа GET /api/courses/ (с пагинацией)"""
+    from .serializers import CourseListSerializer
+
+    page_size = settings.REST_FRAMEWORK.get('PAGE_SIZE') or None
+    count = Course.objects.count()
+    results = CourseListSerializer(Course.objects.all()[:page_size], many=True).data
+    _write(_root() / 'index.json', _dump({
+        'count': count,
+        # Следующие страницы (если курсов больше PAGE_SIZE) отдает API
+        'next': '/api/courses/?page=2' if page_size and count > page_size else None,
+        'previous': None,
+        'results': results,
+    }))
+    return count
+
+
+def publish_all():
+    """Публикует все курсы и индекс. Возвращает число курсов"""
+    course_ids = list(Course.objects.values_list('id', flat=True))
+    for course_id in course_ids:
+        publish_course(course_id)
+    # Удаленные курсы: бандлы без записи в БД
+    for path in (_root() / 'courses').glob('*.json'):
+        if path.name.split('.')[0] not in course_ids:
+            unpublish_course(path.name.split('.')[0])
+    publish_index()
+    return len(course_ids)
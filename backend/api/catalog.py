@@ -0,0 +1,134 @@
+"""
+Кэш каталога курсов.
+
+Курс с уроками и заданиями одинаков для всех учеников, поэтому он
+сериализуется один раз и хранится в общем кэше под версией каталога;
+версия увеличивается при любом изменении Course/Lesson/Challenge.
+Сама версия хранится в таблице CatalogVersion, а общий кэш держит ее
+копию на VERSION_TTL секунд: bump_catalog_version удаляет копию, и все
+воркеры сразу читают новую версию, а потерянный ключ кэша восстанавливается
+из БД, а не начинается заново с 1 (и не возвращает старые payload).
+Поверх общего payload для ученика накладываются только флаги is_locked
+(один-два запроса вместо запросов на каждый урок).
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+
+from .models import CatalogVersion, Course, StudentLesson, UserProgress
+from .singleflight import get_or_build, put
+
+VERSION_KEY = 'catalog:version'
+
+
+def _setting(name, default):
+    return getattr(settings, 'CATALOG_CACHE', {}).get(name, default)
+
+
+def _stored_version():
+    return CatalogVersion.objects.values_list('version', flat=True).first() or 1
+
+
+def catalog_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        version = _stored_version()
+        # add, а не set: не затираем более новую версию от одновременного bump
+        if not cache.add(VERSION_KEY, version, timeout=_setting('VERSION_TTL', 60)):
+            version = cache.get(VERSION_KEY, version)
+    return version
+
+
+def bump_catalog_version():
+    """Все закэшированные payload каталога становятся недействительными (во всех процессах)"""
+    if not CatalogVersion.objects.update(version=F('version') + 1):
+        CatalogVersion.objects.get_or_create(defaults={'version': 2})
+    # Следующий запрос любого процесса прочитает новую версию из БД
+    cache.delete(VERSION_KEY)
+
+
+def build_course_payload(course_id):
+    """Общий payload курса без учета ученика (None, если курса нет)"""
+    from .serializers import CourseSerializer
+
+    course = Course.objects.prefetch_related('lessons', 'lessons__challenge').filter(pk=course_id).first()
+    if course is None:
+        return None
+    # Без request в контексте is_locked берется из поля урока (общий вариант)
+    return CourseSerializer(course).data
+
+
+def _course_key(course_id, version=None):
+    return f'catalog:course:{version or catalog_version()}:{course_id}'
+
+
+def course_detail(course_id):
+    """Общий payload курса (как CourseSerializer) или None, если курса нет"""
+    return get_or_build(
+        _course_key(course_id),
+        lambda: build_course_payload(course_id),
+        ttl=_setting('TTL', 300),
+        stale_ttl=_setting('STALE_TTL', 60),
+    )
+
+
+def prefill():
+    """Собирает payload всех курсов заранее (команда warmup). Возвращает число курсов"""
+    version = catalog_version()
+    course_ids = list(Course.objects.values_list('id', flat=True))
+    for course_id in course_ids:
+        put(
+            _course_key(course_id, version),
+            build_course_payload(course_id),
+            ttl=_setting('TTL', 300),
+            stale_ttl=_setting('STALE_TTL', 60),
+        )
+    return len(course_ids)
+
+
+def lock_states(user, course_id, lessons):
+    """
+    Флаги is_locked уроков курса для ученика, по тем же правилам,
+    что LessonSerializer.get_is_locked, но без запроса на каждый урок.
+    """
+    if not user or not user.is_authenticated:
+        return {lesson['id']: lesson['is_locked'] for lesson in lessons}
+
+    by_order = {lesson['order']: lesson for lesson in lessons}
+    progress = UserProgress.objects.filter(user=user, course_id=course_id).first()
+    states = {}
+    if progress is None:
+        unlocked = dict(
+            StudentLesson.objects.filter(student=user, lesson__course_id=course_id)
+            .values_list('lesson_id', 'is_unlocked')
+        )
+        for lesson in lessons:
+            if lesson['order'] == 1:
+                states[lesson['id']] = False
+            elif lesson['id'] in unlocked:
+                states[lesson['id']] = not unlocked[lesson['id']]
+            else:
+                states[lesson['id']] = True
+        return states
+
+    unlocked_ids = set(progress.unlocked_lesson_ids or [])
+    completed_ids = set(progress.completed_lesson_ids or [])
+    for lesson in lessons:
+        previous = by_order.get(lesson['order'] - 1)
+        if lesson['order'] == 1 or lesson['id'] in unlocked_ids:
+            states[lesson['id']] = False
+        elif previous is None:
+            states[lesson['id']] = lesson['is_locked']
+        else:
+            states[lesson['id']] = previous['id'] not in completed_ids
+    return states
+
+
+def course_for_user(course_id, user):
+    """Payload курса с is_locked для конкретного ученика"""
+    payload = course_detail(course_id)
+    if payload is None:
+        return None
+    states = lock_states(user, course_id, payload['lessons'])
+    lessons = [dict(lesson, is_locked=states[lesson['id']]) for lesson in payload['lessons']]
+    return dict(payload, lessons=lessons)
@@ -0,0 +1,59 @@
+"""
+Проверки конфигурации (manage.py check, а также migrate и run_worker перед запуском).
+Проверки продакшен-окружения (deploy=True) выполняет только manage.py check --deploy:
+тестовый раннер всегда ставит DEBUG=False и не должен падать на настройках разработки.
+"""
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+# Backends, у которых каждый процесс видит только свой кэш
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    В продакшене кэш обязан быть общим для всех процессов: в нем хранятся
+    список отзыва JWT, ведра throttling, ключи Idempotency-Key и версия
+    каталога. С LocMemCache каждый воркер gunicorn видел бы свою копию.
+    """
+    if settings.DEBUG:
+        return []
+    backend = settings.CACHES['default']['BACKEND']
+    if backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [Error(
+        f'CACHES["default"] использует {backend}: кэш не общий для процессов',
+        hint='Задайте CACHE_BACKEND=django.core.cache.backends.redis.RedisCache и CACHE_LOCATION=redis://...',
+        id='api.E001',
+    )]
+
+
+@register(Tags.database)
+def check_replica(app_configs, **kwargs):
+    """Реплика не должна указывать на ту же базу: иначе маршрутизация ничего не проверяет"""
+    from .db_router import replica_alias
+
+    alias = replica_alias()
+    if alias is None:
+        return []
+    primary = settings.DATABASES['default']
+    replica = settings.DATABASES[alias]
+    same_sqlite_file = (
+        primary['ENGINE'] == replica['ENGINE'] == 'django.db.backends.sqlite3'
+        and str(primary['NAME']) == str(replica['NAME'])
+    )
+    same_postgres = (
+        primary['ENGINE'] == replica['ENGINE'] != 'django.db.backends.sqlite3'
+        and (primary.get('HOST'), str(primary.get('PORT'))) == (replica.get('HOST'), str(replica.get('PORT')))
+    )
+    if same_sqlite_file or same_postgres:
+        return [Error(
+            f'DATABASES["{alias}"] указывает на ту же базу, что и default',
+            hint='Для SQLite задайте отдельный SQLITE_REPLICA_NAME и запустите manage.py sync_sqlite_replica',
+            id='api.E002',
+        )]
+    return []
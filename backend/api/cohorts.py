@@ -0,0 +1,120 @@
+"""
+Массовые операции над классом (Cohort).
+
+Разблокировка урока и выдача задания всему классу выполняются постоянным
+числом запросов независимо от числа учеников: bulk_create с обновлением
+при конфликте по (student, lesson) и одно bulk_update для UserProgress
+вместо StudentLesson.save() и синхронизации прогресса на каждого ученика.
+bulk-операции не отправляют сигналы, поэтому события учеников и
+инвалидация вердиктов проверки выполняются здесь явно.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from .events import publish_many, student_channel
+from .grading import bump_challenge_version
+from .models import Lesson, StudentChallenge, StudentLesson, UserProgress
+
+CHALLENGE_FIELDS = ['instructions', 'initial_code', 'expected_output', 'hints']
+
+
+def _add_unlocked(student_ids, lesson, lessons_total, now):
+    """Добавляет урок в существующие прогрессы учеников; возвращает (id учеников с прогрессом, число измененных)"""
+    progress_by_user = {
+        progress.user_id: progress
+        for progress in UserProgress.objects.select_for_update().filter(
+            user_id__in=student_ids, course_id=lesson.course_id,
+        )
+    }
+
+    changed = []
+    for progress in progress_by_user.values():
+        unlocked_ids = progress.unlocked_lesson_ids or []
+        if lesson.id not in unlocked_ids:
+            progress.unlocked_lesson_ids = unlocked_ids + [lesson.id]
+            progress.updated_at = now
+            progress.refresh_counters(lessons_total, now)
+            changed.append(progress)
+    if changed:
+        UserProgress.objects.bulk_update(changed, ['unlocked_lesson_ids', 'updated_at'] + UserProgress.COUNTER_FIELDS)
+    return set(progress_by_user), len(changed)
+
+
+def _sync_unlocked_progress(student_ids, lesson):
+    """Добавляет урок в unlocked_lesson_ids прогресса учеников (как StudentLesson.save)"""
+    now = timezone.now()
+    lessons_total = Lesson.objects.filter(course_id=lesson.course_id).count()
+    existing, updated = _add_unlocked(student_ids, lesson, lessons_total, now)
+
+    missing = [student_id for student_id in student_ids if student_id not in existing]
+    if missing:
+        created = [
+            UserProgress(
+                user_id=student_id,
+                course_id=lesson.course_id,
+                unlocked_lesson_ids=[lesson.id],
+                completed_lesson_ids=[],
+                current_lesson_id=lesson.id,
+            )
+            for student_id in missing
+        ]
+        for progress in created:
+            progress.refresh_counters(lessons_total, now)
+        # Параллельный запрос (например, ученик открыл курс) мог создать прогресс
+        # после нашего чтения: такие строки пропускаем и дополняем уроком отдельно
+        UserProgress.objects.bulk_create(created, ignore_conflicts=True)
+        _add_unlocked(missing, lesson, lessons_total, now)
+    return updated + len(missing)
+
+
+def bulk_unlock(cohort, lesson):
+    """Разблокирует урок всем ученикам класса. Возвращает число учеников"""
+    student_ids = list(cohort.students.values_list('id', flat=True))
+    if not student_ids:
+        return 0
+
+    with transaction.atomic():
+        StudentLesson.objects.bulk_create(
+            [StudentLesson(student_id=student_id, lesson=lesson, is_unlocked=True) for student_id in student_ids],
+            update_conflicts=True,
+            unique_fields=['student', 'lesson'],
+            update_fields=['is_unlocked', 'updated_at'],
+        )
+        _sync_unlocked_progress(student_ids, lesson)
+        publish_many(
+            (student_channel(student_id), 'lesson.unlocked', {'lesson': lesson.id, 'course': lesson.course_id})
+            for student_id in student_ids
+        )
+    return len(student_ids)
+
+
+def bulk_assign_challenge(cohort, lesson, challenge_data):
+    """
+    Выдает (или обновляет) индивидуальное задание урока всем ученикам класса.
+    challenge_data - значения CHALLENGE_FIELDS. Возвращает число учеников.
+    """
+    student_ids = list(cohort.students.values_list('id', flat=True))
+    if not student_ids:
+        return 0
+
+    fields = {name: challenge_data[name] for name in CHALLENGE_FIELDS if name in challenge_data}
+    with transaction.atomic():
+        StudentChallenge.objects.bulk_create(
+            [StudentChallenge(student_id=student_id, lesson=lesson, **fields) for student_id in student_ids],
+            update_conflicts=True,
+            unique_fields=['student', 'lesson'],
+            update_fields=list(fields) + ['updated_at'],
+        )
+        # Ранее выданные задания могли измениться: их вердикты проверки больше не действительны
+        challenges = list(StudentChallenge.objects.filter(lesson=lesson, student_id__in=student_ids).only('pk'))
+
+        def invalidate_verdicts():
+            for challenge in challenges:
+                bump_challenge_version(challenge)
+
+        transaction.on_commit(invalidate_verdicts)
+        publish_many(
+            (student_channel(student_id), 'challenge.assigned', {'lesson': lesson.id, 'course': lesson.course_id})
+            for student_id in student_ids
+        )
+    return len(student_ids)
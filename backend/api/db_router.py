@@ -0,0 +1,112 @@
+"""
+Маршрутизация чтения на реплику базы данных.
+
+Безопасные запросы (GET/HEAD/OPTIONS) к viewset'ам api читают из реплики,
+если она настроена (settings.DATABASE_REPLICA_ALIAS). После записи
+пользователь на REPLICA_STICKY_SECONDS закрепляется за основной базой,
+чтобы сразу видеть свои изменения (read-your-writes).
+"""
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+
+PIN_KEY_PREFIX = 'db:pin:'
+
+_read_alias = ContextVar('read_alias', default=None)
+
+
+def replica_alias():
+    """Алиас реплики, если она есть в DATABASES"""
+    alias = getattr(settings, 'DATABASE_REPLICA_ALIAS', None)
+    if alias and alias in settings.DATABASES:
+        return alias
+    return None
+
+
+def sync_sqlite_replica(alias):
+    """Копирует основную базу SQLite в реплику alias (онлайн-бэкап SQLite)"""
+    primary = connections[DEFAULT_DB_ALIAS]
+    replica = connections[alias]
+    primary.ensure_connection()
+    replica.ensure_connection()
+    primary.connection.backup(replica.connection)
+
+
+def pin_to_primary(user_id):
+    """Закрепляет пользователя за основной базой после записи"""
+    cache.set(f'{PIN_KEY_PREFIX}{user_id}', True, timeout=settings.REPLICA_STICKY_SECONDS)
+
+
+def is_pinned(user_id):
+    return cache.get(f'{PIN_KEY_PREFIX}{user_id}', False)
+
+
+def route_reads_for(request):
+    """Включает чтение из реплики для текущего запроса, если это безопасно"""
+    alias = replica_alias()
+    if alias is None or request.method not in SAFE_METHODS:
+        return
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated and is_pinned(user.pk):
+        return
+    _read_alias.set(alias)
+
+
+def reset_routing():
+    _read_alias.set(None)
+
+
+class ReplicaRouter:
+    """Чтение - из реплики (если включено для запроса), запись - всегда в основную базу"""
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплика содержит те же данные, что и основная база
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схема попадает на реплику через репликацию
+        return db != replica_alias()
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Закрепляет пользователя за основной базой после успешного изменяющего запроса
+    и сбрасывает маршрутизацию чтения в конце каждого запроса.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            response = self.get_response(request)
+        finally:
+            reset_routing()
+
+        user = getattr(request, 'user', None)
+        if (
+            replica_alias() is not None
+            and request.method not in SAFE_METHODS
+            and response.status_code < 400
+            and user is not None
+            and user.is_authenticated
+        ):
+            pin_to_primary(user.pk)
+        return response
+
+
+class ReplicaReadMixin:
+    """Mixin для viewset'ов: после аутентификации направляет чтение на реплику"""
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        route_reads_for(request)
@@ -0,0 +1,361 @@
+"""
+События в реальном времени (Server-Sent Events).
+
+Событие записывается в таблицу Event (это журнал для возобновления потока
+по Last-Event-ID), после чего ожидающие потоки будятся:
+- на Postgres через NOTIFY, который в каждом процессе слушает один фоновый
+  поток с отдельным подключением (LISTEN);
+- на SQLite и других базах - только внутри процесса.
+
+Потоки клиентов не держат собственных подключений LISTEN: они ждут
+общий сигнал процесса и дочитывают новые события из таблицы.
+
+id события выдается до коммита, поэтому событие с меньшим id может стать
+видимым позже большего. Поток читает журнал с позиции SSE_REPLAY_SECONDS
+секунд назад и пропускает уже отправленные id (StreamCursor), а при
+возобновлении перечитывает такое же окно до Last-Event-ID; клиент
+отбрасывает повторы по id.
+
+Браузер подключается с коротким билетом ?ticket= (StreamTicketAuthentication),
+а не с JWT в URL: токен не попадает в журналы доступа. Билет живет
+SSE_TICKET_SECONDS, поэтому после закрытия потока клиент получает новый
+билет и переподключается с last_event_id.
+
+В продакшене потоки обслуживает отдельный ASGI процесс (сервис events в
+docker-compose.prod.yml, nginx направляет туда /api/events/): там поток -
+это корутина astream_events, и ожидание событий не занимает ни потока, ни
+подключения к БД. Под WSGI (runserver, запасной вариант) используется
+синхронный stream_events, который держит поток воркера. На SQLite сигнал
+не выходит за пределы процесса, поэтому отдельный процесс потоков там
+видит новые события только по таймауту HEARTBEAT_SECONDS.
+"""
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+from collections import deque
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+
+from .models import Event
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_CHANNEL = 'api_events'
+SUBMISSIONS_CHANNEL = 'submissions'
+HEARTBEAT_SECONDS = 15
+BATCH_SIZE = 100
+
+
+class EventBus:
+    """Сигнал внутри процесса: счетчик версий + Condition (и futures для корутин)"""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._seq = 0
+        self._waiters = set()
+
+    @property
+    def seq(self):
+        return self._seq
+
+    def notify(self):
+        with self._condition:
+            self._seq += 1
+            self._condition.notify_all()
+            waiters = list(self._waiters)
+        # notify вызывается из других потоков (LISTEN, запросы), futures будим в их цикле событий
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_wake, future)
+
+    def wait(self, seen_seq, timeout):
+        """Ждет новых событий после seen_seq, возвращает текущую версию"""
+        with self._condition:
+            self._condition.wait_for(lambda: self._seq != seen_seq, timeout=timeout)
+            return self._seq
+
+    async def wait_async(self, seen_seq, timeout):
+        """wait для корутин: ждет future, не занимая поток"""
+        loop = asyncio.get_running_loop()
+        waiter = (loop, loop.create_future())
+        with self._condition:
+            if self._seq != seen_seq:
+                return self._seq
+            self._waiters.add(waiter)
+        try:
+            await asyncio.wait_for(waiter[1], timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._condition:
+                self._waiters.discard(waiter)
+        return self._seq
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+
+bus = EventBus()
+
+_listener_lock = threading.Lock()
+_listener_started = False
+
+
+def _uses_postgres():
+    return connection.vendor == 'postgresql'
+
+
+def _listen_forever():
+    """Фоновый поток процесса: LISTEN на отдельном подключении Postgres"""
+    import psycopg2
+
+    while True:
+        try:
+            conn = psycopg2.connect(**connection.get_connection_params())
+            conn.set_isolation_level(0)  # autocommit
+            with conn.cursor() as cursor:
+                cursor.execute(f'LISTEN {NOTIFY_CHANNEL};')
+            while True:
+                if select.select([conn], [], [], HEARTBEAT_SECONDS) == ([], [], []):
+                    continue
+                conn.poll()
+                if conn.notifies:
+                    conn.notifies.clear()
+                    bus.notify()
+        except Exception:
+            logger.exception('Подключение LISTEN потеряно, переподключение')
+            time.sleep(1)
+
+
+def ensure_listener():
+    """Запускает поток LISTEN в текущем процессе (один раз)"""
+    global _listener_started
+    if _listener_started or not _uses_postgres():
+        return
+    with _listener_lock:
+        if not _listener_started:
+            threading.Thread(target=_listen_forever, name='events-listener', daemon=True).start()
+            _listener_started = True
+
+
+def _publish_now(channel, event_type, payload):
+    event = Event.objects.create(channel=channel, event_type=event_type, payload=payload)
+    if _uses_postgres():
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [NOTIFY_CHANNEL, str(event.id)])
+    else:
+        bus.notify()
+    return event
+
+
+def publish(channel, event_type, payload):
+    """Публикует событие после коммита текущей транзакции"""
+    transaction.on_commit(lambda: _publish_now(channel, event_type, payload))
+
+
+def _publish_many_now(events):
+    created = Event.objects.bulk_create([
+        Event(channel=channel, event_type=event_type, payload=payload)
+        for channel, event_type, payload in events
+    ])
+    if _uses_postgres():
+        # Потоки дочитывают все новые события из таблицы, одного уведомления достаточно
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [NOTIFY_CHANNEL, str(created[-1].id)])
+    else:
+        bus.notify()
+    return created
+
+
+def publish_many(events):
+    """Публикует список (channel, event_type, payload) одним INSERT после коммита"""
+    events = list(events)
+    if events:
+        transaction.on_commit(lambda: _publish_many_now(events))
+
+
+def student_channel(student_id):
+    return f'student:{student_id}'
+
+
+def notify_student(student_id, event_type, payload):
+    """Событие в личный поток ученика (проверка задания, разблокировка, XP)"""
+    publish(student_channel(student_id), event_type, payload)
+
+
+def submission_payload(submission):
+    """Короткое описание отправки для событий (без кода и вывода)"""
+    return {
+        'id': submission.id,
+        # Только id: имя ученика потребовало бы запроса на каждое сохранение отправки
+        'student': submission.student_id,
+        'lesson': submission.lesson_id,
+        'status': submission.status,
+        'passed_auto_check': submission.passed_auto_check,
+        'reviewed_by': submission.reviewed_by_id,
+        'submitted_at': submission.submitted_at,
+        'updated_at': submission.updated_at,
+    }
+
+
+def prune_events(days=None):
+    """Удаляет события старше срока хранения: возобновить поток можно только в его пределах"""
+    if days is None:
+        days = settings.SSE_EVENT_RETENTION_DAYS
+    deleted, _ = Event.objects.filter(created_at__lt=timezone.now() - timedelta(days=days)).delete()
+    return deleted
+
+
+def latest_event_id(channels):
+    return (
+        Event.objects.filter(channel__in=channels)
+        .order_by('-id')
+        .values_list('id', flat=True)
+        .first()
+    ) or 0
+
+
+def resume_position(channels, last_event_id):
+    """
+    С какого id перечитать журнал при возобновлении: события, созданные за
+    SSE_REPLAY_SECONDS до последнего полученного клиентом, могли закоммититься
+    уже после него.
+    """
+    created_at = Event.objects.filter(pk=last_event_id).values_list('created_at', flat=True).first()
+    if created_at is None:
+        return last_event_id
+    return (
+        Event.objects.filter(
+            channel__in=channels,
+            id__lt=last_event_id,
+            created_at__lt=created_at - timedelta(seconds=settings.SSE_REPLAY_SECONDS),
+        )
+        .order_by('-id')
+        .values_list('id', flat=True)
+        .first()
+    ) or 0
+
+
+def parse_last_event_id(request, channels):
+    """
+    Позиция, с которой продолжить поток: заголовок Last-Event-ID (переподключение
+    браузера) или параметр last_event_id, с окном перечитывания. Новый поток
+    начинается с текущих событий.
+    """
+    raw = request.META.get('HTTP_LAST_EVENT_ID') or request.GET.get('last_event_id')
+    try:
+        return resume_position(channels, int(raw))
+    except (TypeError, ValueError):
+        return latest_event_id(channels)
+
+
+def format_event(event):
+    data = json.dumps(event.payload, ensure_ascii=False, default=str)
+    return f'id: {event.id}\nevent: {event.event_type}\ndata: {data}\n\n'
+
+
+class StreamCursor:
+    """Позиция потока: окно перечитывания SSE_REPLAY_SECONDS и уже отправленные id"""
+
+    def __init__(self, position):
+        self.sent = set()
+        self.history = deque([(time.monotonic(), position)])
+
+    def floor(self):
+        """Позиция, которую поток прочитал SSE_REPLAY_SECONDS назад: с нее читаем снова"""
+        horizon = time.monotonic() - settings.SSE_REPLAY_SECONDS
+        while len(self.history) > 1 and self.history[1][0] <= horizon:
+            self.history.popleft()
+        floor = self.history[0][1]
+        self.sent = {event_id for event_id in self.sent if event_id > floor}
+        return floor
+
+    def take(self, events):
+        """Еще не отправленные события из прочитанных"""
+        fresh = [event for event in events if event.id not in self.sent]
+        if fresh:
+            self.sent.update(event.id for event in fresh)
+            position = max(event.id for event in fresh)
+            if position > self.history[-1][1]:
+                self.history.append((time.monotonic(), position))
+        return fresh
+
+
+def _read_events(channels, last_event_id):
+    return list(Event.objects.filter(channel__in=channels, id__gt=last_event_id).order_by('id')[:BATCH_SIZE])
+
+
+def _read_events_closing(channels, last_event_id):
+    try:
+        return _read_events(channels, last_event_id)
+    finally:
+        # Поток пула общий для всех корутин: подключение закрывается по CONN_MAX_AGE, как после запроса
+        close_old_connections()
+
+
+# Короткий запрос в пуле потоков, а не в общем потоке thread_sensitive: потоки не ждут друг друга
+read_events_async = sync_to_async(_read_events_closing, thread_sensitive=False)
+
+
+def stream_events(channels, last_event_id):
+    """
+    Генератор SSE для StreamingHttpResponse под WSGI.
+
+    Поток ограничен по времени (SSE_MAX_STREAM_SECONDS): браузер переподключится
+    сам и передаст Last-Event-ID, поэтому воркер не занят бесконечно.
+    """
+    ensure_listener()
+    deadline = time.monotonic() + settings.SSE_MAX_STREAM_SECONDS
+    cursor = StreamCursor(last_event_id)
+    seen_seq = bus.seq
+    yield 'retry: 3000\n\n'
+    try:
+        while time.monotonic() < deadline:
+            after = cursor.floor()
+            while True:
+                events = _read_events(channels, after)
+                for event in cursor.take(events):
+                    yield format_event(event)
+                if len(events) < BATCH_SIZE:
+                    break
+                after = events[-1].id
+
+            new_seq = bus.wait(seen_seq, timeout=HEARTBEAT_SECONDS)
+            if new_seq == seen_seq:
+                # Комментарий SSE не дает прокси закрыть простаивающее соединение
+                yield ': ping\n\n'
+            seen_seq = new_seq
+    finally:
+        close_old_connections()
+
+
+async def astream_events(channels, last_event_id):
+    """Генератор SSE для ASGI: то же, что stream_events, но ожидание - корутина"""
+    ensure_listener()
+    deadline = time.monotonic() + settings.SSE_MAX_STREAM_SECONDS
+    cursor = StreamCursor(last_event_id)
+    seen_seq = bus.seq
+    yield 'retry: 3000\n\n'
+    while time.monotonic() < deadline:
+        after = cursor.floor()
+        while True:
+            events = await read_events_async(channels, after)
+            for event in cursor.take(events):
+                yield format_event(event)
+            if len(events) < BATCH_SIZE:
+                break
+            after = events[-1].id
+
+        new_seq = await bus.wait_async(seen_seq, timeout=HEARTBEAT_SECONDS)
+        if new_seq == seen_seq:
+            yield ': ping\n\n'
+        seen_seq = new_seq
+
@@ -0,0 +1,129 @@
+"""
+Проверка вывода кода и кэш вердиктов.
+
+Код выполняется в браузере ученика, сервер сравнивает присланный вывод с
+ожидаемым. Вердикт запоминается по ключу (версия задания, хэш expected_output,
+хэш нормализованного кода, хэш нормализованного вывода): одинаковые решения,
+отличающиеся только пробелами и комментариями, с тем же выводом получают
+готовый вердикт без повторной проверки, а другой вывод - всегда новый ключ.
+Версия задания увеличивается при любом изменении Challenge/StudentChallenge,
+поэтому устаревший вердикт не может быть выдан.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import metrics
+from .similarity import lua_tokens
+from .user_cache import LocalUserCache
+
+VERSION_KEY_PREFIX = 'grading:version:'
+VERDICT_KEY_PREFIX = 'grading:verdict:'
+
+
+def _setting(name, default):
+    return getattr(settings, 'GRADING_CACHE', {}).get(name, default)
+
+
+local_verdicts = LocalUserCache(
+    maxsize=_setting('LOCAL_MAXSIZE', 4096),
+    ttl=_setting('LOCAL_TTL', 300),
+)
+
+
+def normalize_code(code):
+    """Код без комментариев, с одним пробелом между токенами (имена и строки не меняются)"""
+    return ' '.join(text for _, text in lua_tokens(code))
+
+
+def _challenge_ref(challenge):
+    kind = 'student' if challenge._meta.model_name == 'studentchallenge' else 'lesson'
+    return f'{kind}:{challenge.pk}'
+
+
+def challenge_version(challenge):
+    key = f'{VERSION_KEY_PREFIX}{_challenge_ref(challenge)}'
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, 1, timeout=None)
+        version = cache.get(key, 1)
+    return version
+
+
+def bump_challenge_version(challenge):
+    """Делает недействительными все вердикты задания (во всех процессах)"""
+    key = f'{VERSION_KEY_PREFIX}{_challenge_ref(challenge)}'
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 2, timeout=None)
+
+
+def normalize_output(output):
+    """Вывод (список строк или строка) в том виде, в каком он сравнивается; None для других типов"""
+    if isinstance(output, list):
+        # Объединяем все строки вывода в одну строку через пробел
+        return ' '.join(str(line).strip() for line in output if line).strip()
+    if isinstance(output, str):
+        return output.strip()
+    return None
+
+
+def _digest(value):
+    return hashlib.sha256(value.encode()).hexdigest()
+
+
+def verdict_key(challenge, code, output):
+    expected = _digest(str(challenge.expected_output).strip())[:16]
+    actual = normalize_output(output)
+    # Неподдерживаемый тип вывода не совпадает ни с какой строкой
+    output_hash = _digest(actual) if actual is not None else 'invalid'
+    code_hash = _digest(normalize_code(code))
+    return (
+        f'{VERDICT_KEY_PREFIX}{_challenge_ref(challenge)}:{challenge_version(challenge)}'
+        f':{expected}:{code_hash}:{output_hash}'
+    )
+
+
+def compare_output(expected_output, output):
+    """Совпадает ли вывод (список строк или строка) с ожидаемым"""
+    actual = normalize_output(output)
+    return actual is not None and actual == str(expected_output).strip()
+
+
+def grade(challenge, code, output):
+    """
+    Вердикт для кода по заданию с expected_output.
+    Возвращает (passed, cached): cached=True, если вердикт взят из кэша.
+    """
+    key = verdict_key(challenge, code, output)
+    passed = local_verdicts.get(key)
+    if passed is None:
+        passed = cache.get(key)
+        if passed is not None:
+            local_verdicts.set(key, passed)
+    if passed is not None:
+        metrics.incr('grading.hits')
+        return passed, True
+
+    metrics.incr('grading.misses')
+    passed = compare_output(challenge.expected_output, output)
+    cache.set(key, passed, timeout=_setting('SHARED_TTL', 86400))
+    local_verdicts.set(key, passed)
+    return passed, False
+
+
+def grading_metrics():
+    hits = metrics.get('grading.hits')
+    misses = metrics.get('grading.misses')
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / total, 4) if total else None,
+        'local_size': len(local_verdicts),
+    }
+
+
+metrics.register('grading', grading_metrics)
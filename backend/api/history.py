@@ -0,0 +1,169 @@
+"""
+История попыток отправки с дельта-сжатием кода.
+
+Каждая новая версия кода отправки записывается как SubmissionAttempt.
+Код хранится в CodeBlob по sha256: повторная отправка того же кода не
+занимает места, а измененный код сохраняется как дельта к предыдущей
+попытке ученика (диапазоны строк базовой версии + вставленный текст).
+Цепочка дельт ограничена MAX_DEPTH: дальше сохраняется полный текст,
+поэтому восстановление любой попытки читает не больше MAX_DEPTH записей,
+а восстановленный текст кэшируется (версии неизменяемы).
+"""
+import difflib
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Max
+
+from .models import CodeBlob, SubmissionAttempt
+
+MAX_DEPTH = 16
+# Дельта, которая не меньше этой доли полного текста, не выгодна
+MAX_DELTA_RATIO = 0.8
+CODE_CACHE_PREFIX = 'history:code:'
+CODE_CACHE_TTL = 24 * 60 * 60
+# Строка без перевода строки в конце кода (внутренняя метка) и ее вид в diff
+NO_EOL = '\x00\n'
+NO_EOL_MARKER = '\n\\ No newline at end of file\n'
+
+
+def code_hash(code):
+    return hashlib.sha256(code.encode()).hexdigest()
+
+
+def make_delta(base, code):
+    """Дельта code относительно base: [[начало, конец] строк base | "текст", ...]"""
+    base_lines = base.splitlines(keepends=True)
+    lines = code.splitlines(keepends=True)
+    delta = []
+    matcher = difflib.SequenceMatcher(None, base_lines, lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            delta.append([i1, i2])
+        elif j2 > j1:
+            # replace и insert: новые строки; delete ничего не добавляет
+            delta.append(''.join(lines[j1:j2]))
+    return delta
+
+
+def apply_delta(base, delta):
+    base_lines = base.splitlines(keepends=True)
+    parts = []
+    for op in delta:
+        if isinstance(op, str):
+            parts.append(op)
+        else:
+            parts.extend(base_lines[op[0]:op[1]])
+    return ''.join(parts)
+
+
+def store_code(code, base_hash=None):
+    """CodeBlob для кода: существующий по хэшу или новый (дельта к base_hash, если выгодно)"""
+    digest = code_hash(code)
+    blob = CodeBlob.objects.filter(pk=digest).first()
+    if blob is not None:
+        return blob
+
+    blob = CodeBlob(hash=digest, content=code, size=len(code))
+    base = CodeBlob.objects.filter(pk=base_hash).only('hash', 'depth').first() if base_hash else None
+    if base is not None and base.depth < MAX_DEPTH:
+        delta = make_delta(load_code(base.hash), code)
+        if len(json.dumps(delta, ensure_ascii=False)) < len(code) * MAX_DELTA_RATIO:
+            blob.base = base
+            blob.depth = base.depth + 1
+            blob.delta = delta
+            blob.content = ''
+    try:
+        with transaction.atomic():
+            blob.save(force_insert=True)
+    except IntegrityError:
+        # Тот же код сохранил параллельный запрос
+        blob = CodeBlob.objects.get(pk=digest)
+    cache.set(CODE_CACHE_PREFIX + digest, code, CODE_CACHE_TTL)
+    return blob
+
+
+def load_code(digest):
+    """Восстанавливает текст версии по хэшу"""
+    code = cache.get(CODE_CACHE_PREFIX + digest)
+    if code is not None:
+        return code
+
+    # Идем по цепочке дельт до ближайшей версии с полным текстом (или из кэша)
+    chain = []
+    current = digest
+    while True:
+        blob = CodeBlob.objects.only('hash', 'base_id', 'content', 'delta').get(pk=current)
+        if blob.base_id is None:
+            code = blob.content
+            break
+        chain.append(blob)
+        cached = cache.get(CODE_CACHE_PREFIX + blob.base_id)
+        if cached is not None:
+            code = cached
+            break
+        current = blob.base_id
+
+    for blob in reversed(chain):
+        code = apply_delta(code, blob.delta)
+    cache.set(CODE_CACHE_PREFIX + digest, code, CODE_CACHE_TTL)
+    return code
+
+
+def record_attempt(submission):
+    """Записывает текущий код отправки как очередную попытку ученика по уроку"""
+    previous = (
+        SubmissionAttempt.objects.filter(student_id=submission.student_id, lesson_id=submission.lesson_id)
+        .order_by('-number')
+        .values('number', 'code_id')
+        .first()
+    )
+    blob = store_code(submission.code or '', base_hash=previous['code_id'] if previous else None)
+    number = previous['number'] + 1 if previous else 1
+    for _ in range(3):
+        try:
+            with transaction.atomic():
+                return SubmissionAttempt.objects.create(
+                    student_id=submission.student_id,
+                    lesson_id=submission.lesson_id,
+                    submission=submission,
+                    number=number,
+                    code=blob,
+                    output=submission.output,
+                    error=submission.error,
+                    passed_auto_check=submission.passed_auto_check,
+                )
+        except IntegrityError:
+            # Номер занят параллельной попыткой: берем следующий свободный
+            number = (
+                SubmissionAttempt.objects.filter(student_id=submission.student_id, lesson_id=submission.lesson_id)
+                .aggregate(last=Max('number'))['last'] or 0
+            ) + 1
+    return None
+
+
+def _diff_lines(code):
+    """
+    Строки для difflib, каждая с переводом строки. Последняя строка без перевода
+    получает метку: она отличается от той же строки с переводом, как в git diff
+    """
+    lines = code.splitlines(keepends=True)
+    if lines and not lines[-1].endswith(('\n', '\r')):
+        lines[-1] += NO_EOL
+    return lines
+
+
+def attempt_diff(from_attempt, to_attempt, context=3):
+    """Unified diff кода между двумя попытками"""
+    before = load_code(from_attempt.code_id)
+    after = load_code(to_attempt.code_id)
+    diff = difflib.unified_diff(
+        _diff_lines(before),
+        _diff_lines(after),
+        fromfile=f'attempt {from_attempt.number}',
+        tofile=f'attempt {to_attempt.number}',
+        n=context,
+    )
+    return ''.join(line.replace(NO_EOL, NO_EOL_MARKER) for line in diff)
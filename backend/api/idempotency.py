@@ -0,0 +1,158 @@
+"""
+Поддержка заголовка Idempotency-Key для изменяющих запросов.
+
+Первый запрос с ключом выполняется и его ответ сохраняется в таблице
+IdempotencyKey на IDEMPOTENCY['TTL'] секунд; повтор с тем же ключом
+(потерянный ответ на плохом Wi-Fi) получает сохраненный ответ без
+повторного выполнения, на каком бы воркере он ни оказался. Уникальный
+индекс по ключу делает захват атомарным, а запись не пропадает при
+перезапуске или вытеснении кэша.
+Пока первый запрос выполняется, повтор ждет его результата до
+IDEMPOTENCY['WAIT_SECONDS'] секунд, затем получает 409. Запрос, который
+не завершился за IDEMPOTENCY['LOCK_TTL'] секунд, считается оборванным.
+Ключ с другим телом запроса - ошибка клиента (422).
+Просроченные записи удаляет prune_expired (обслуживание в run_worker).
+"""
+import functools
+import hashlib
+import json
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from . import metrics
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+POLL_SECONDS = 0.1
+
+
+def _setting(name, default):
+    return getattr(settings, 'IDEMPOTENCY', {}).get(name, default)
+
+
+def _record_key(request, key):
+    owner = request.user.pk if request.user and request.user.is_authenticated else request.META.get('REMOTE_ADDR')
+    scope = f'{owner}:{request.method}:{request.path}:{key}'
+    return hashlib.sha256(scope.encode()).hexdigest()
+
+
+def _fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def _replay(stored, fingerprint):
+    if stored.fingerprint != fingerprint:
+        return Response(
+            {'error': f'{HEADER} уже использован с другим телом запроса'},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+    metrics.incr('idempotency.replayed')
+    response = Response(stored.data, status=stored.status_code)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _claim(record_key, fingerprint):
+    """Создает запись in_flight; False, если ключ уже занят действующей записью"""
+    now = timezone.now()
+    # Просроченный ответ или оборванное выполнение освобождают ключ
+    IdempotencyKey.objects.filter(
+        Q(expires_at__lt=now) | Q(state='in_flight', locked_until__lt=now), key=record_key
+    ).delete()
+    try:
+        with transaction.atomic():
+            IdempotencyKey.objects.create(
+                key=record_key,
+                fingerprint=fingerprint,
+                locked_until=now + timedelta(seconds=_setting('LOCK_TTL', 60)),
+                expires_at=now + timedelta(seconds=_setting('TTL', 86400)),
+            )
+    except IntegrityError:
+        return False
+    return True
+
+
+def _wait_for_result(record_key):
+    deadline = time.monotonic() + _setting('WAIT_SECONDS', 5)
+    while time.monotonic() < deadline:
+        time.sleep(POLL_SECONDS)
+        stored = IdempotencyKey.objects.filter(key=record_key).first()
+        if stored is None or stored.state == 'done':
+            return stored
+    return IdempotencyKey.objects.filter(key=record_key).first()
+
+
+def prune_expired():
+    """Удаляет просроченные записи. Возвращает их число"""
+    deleted, _ = IdempotencyKey.objects.filter(expires_at__lt=timezone.now()).delete()
+    return deleted
+
+
+def idempotent(view_func):
+    """
+    Декоратор для функции-представления или action ViewSet.
+    Без заголовка Idempotency-Key запрос выполняется как обычно.
+    """
+    @functools.wraps(view_func)
+    def wrapper(*args, **kwargs):
+        request = next(arg for arg in args if isinstance(arg, Request))
+        key = request.headers.get(HEADER)
+        if not key:
+            return view_func(*args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response(
+                {'error': f'{HEADER} длиннее {MAX_KEY_LENGTH} символов'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        record_key = _record_key(request, key)
+        fingerprint = _fingerprint(request)
+
+        # Уникальный индекс: только один из одновременных дублей станет исполнителем
+        if not _claim(record_key, fingerprint):
+            stored = IdempotencyKey.objects.filter(key=record_key).first()
+            if stored is not None and stored.state == 'in_flight' and stored.fingerprint == fingerprint:
+                stored = _wait_for_result(record_key)
+            if stored is None:
+                # Исполнитель упал с ошибкой и освободил ключ: клиент может повторить
+                return Response(
+                    {'error': 'Предыдущий запрос с этим ключом не завершился, повторите'},
+                    status=status.HTTP_409_CONFLICT,
+                    headers={'Retry-After': '1'}
+                )
+            if stored.state == 'in_flight' and stored.fingerprint == fingerprint:
+                return Response(
+                    {'error': 'Запрос с этим ключом еще выполняется'},
+                    status=status.HTTP_409_CONFLICT,
+                    headers={'Retry-After': '1'}
+                )
+            return _replay(stored, fingerprint)
+
+        try:
+            response = view_func(*args, **kwargs)
+        except Exception:
+            IdempotencyKey.objects.filter(key=record_key).delete()
+            raise
+
+        if response.status_code >= 500:
+            # Серверную ошибку не запоминаем: повтор должен выполниться заново
+            IdempotencyKey.objects.filter(key=record_key).delete()
+        else:
+            IdempotencyKey.objects.filter(key=record_key).update(
+                state='done',
+                status_code=response.status_code,
+                data=response.data,
+            )
+        return response
+
+    return wrapper
@@ -0,0 +1,237 @@
+"""
+Рейтинг учеников по XP.
+
+Каждый процесс держит отсортированные таблицы рейтинга (общую и по курсам)
+и поддерживает их инкрементально по журналу XPTransaction: запоминается
+последний примененный id, новые записи дочитываются одним индексным запросом
+и меняют только затронутых учеников. Ключи хранятся в SortedList
+(sortedcontainers): изменение XP ученика, его позиция и топ-N - за
+O(log n), без ORDER BY xp по всей таблице пользователей. Строки для полной
+перестройки читаются из базы до захвата блокировки таблиц, поэтому
+остальные запросы процесса ждут только замену таблицы в памяти.
+
+id журнала выдаются до коммита, поэтому транзакция с меньшим id может
+закоммититься позже большего. Дочитывание поэтому начинается не с
+последнего id, а с позиции LATE_COMMIT_SECONDS секунд назад: значения
+ставятся абсолютные, и повторное применение записи безопасно.
+
+Таблицы курсов строятся по запросу (только для существующих курсов) и
+вытесняются по LRU сверх MAX_COURSE_BOARDS. Рейтинг класса (Cohort) - это
+участники класса в общем или курсовом рейтинге.
+"""
+import threading
+import time
+from collections import OrderedDict, deque
+
+from django.core.cache import cache
+from django.db.models import Sum
+from sortedcontainers import SortedList
+
+from .models import User, XPTransaction
+
+LEDGER_SEQ_KEY = 'leaderboard:ledger-seq'
+# Полная перестройка раз в REBUILD_SECONDS исправляет изменения XP в обход журнала (админка)
+REBUILD_SECONDS = 3600
+# Сколько секунд транзакция может коммититься после получения id записи журнала
+LATE_COMMIT_SECONDS = 60
+MAX_COURSE_BOARDS = 64
+
+
+class RankedBoard:
+    """Упорядоченный список ключей (-xp, user_id) + текущие значения по ученикам"""
+
+    def __init__(self, rows=()):
+        """rows - тройки (user_id, xp, имя) для начального заполнения"""
+        self._scores = {}
+        self.names = {}
+        for user_id, xp, name in rows:
+            self._scores[user_id] = xp
+            self.names[user_id] = name
+        self._keys = SortedList((-xp, user_id) for user_id, xp in self._scores.items())
+
+    def __len__(self):
+        return len(self._keys)
+
+    def set(self, user_id, xp, name=None):
+        if name is not None:
+            self.names[user_id] = name
+        old = self._scores.get(user_id)
+        if old == xp:
+            return
+        if old is not None:
+            self._keys.remove((-old, user_id))
+        self._keys.add((-xp, user_id))
+        self._scores[user_id] = xp
+
+    def score(self, user_id):
+        return self._scores.get(user_id)
+
+    def rank(self, user_id):
+        """Место ученика (с 1) или None, если его нет в рейтинге"""
+        xp = self._scores.get(user_id)
+        if xp is None:
+            return None
+        # Ученики с равным XP делят место: считаем только тех, у кого XP больше
+        return self._keys.bisect_left((-xp, -1)) + 1
+
+    def subset(self, user_ids):
+        """Таблица только из указанных учеников (например, класса)"""
+        return RankedBoard(
+            (user_id, self._scores[user_id], self.names.get(user_id))
+            for user_id in set(user_ids) if user_id in self._scores
+        )
+
+    def top(self, limit):
+        result = []
+        for neg_xp, user_id in self._keys.islice(0, limit):
+            result.append({
+                'rank': self._keys.bisect_left((neg_xp, -1)) + 1,
+                'user_id': user_id,
+                'username': self.names.get(user_id, ''),
+                'xp': -neg_xp,
+            })
+        return result
+
+
+class Leaderboards:
+    """Все таблицы рейтинга процесса"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.global_board = RankedBoard()
+        self.course_boards = OrderedDict()
+        self.cursor = 0
+        # (время, cursor): откуда перечитывать журнал с учетом поздних коммитов
+        self.cursor_history = deque()
+        self.seen_seq = None
+        self.built_at = 0
+
+    def _needs_rebuild(self):
+        return not self.built_at or time.monotonic() - self.built_at > REBUILD_SECONDS
+
+    @staticmethod
+    def _load_global():
+        """Снимок для полной перестройки; читается без блокировки"""
+        seq = cache.get(LEDGER_SEQ_KEY)
+        # Курсор читается до учеников: записи между ними будут дочитаны повторно
+        cursor = XPTransaction.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        students = User.objects.filter(role='student').values_list('id', 'xp', 'username')
+        return seq, cursor, list(students.iterator(chunk_size=2000))
+
+    @staticmethod
+    def _load_course(course_id):
+        totals = (
+            XPTransaction.objects.filter(course_id=course_id, user__role='student')
+            .values('user_id', 'user__username')
+            .annotate(total=Sum('amount'))
+            .values_list('user_id', 'total', 'user__username')
+        )
+        return list(totals.iterator(chunk_size=2000))
+
+    def _build(self, snapshot):
+        self._reset()
+        self.seen_seq, self.cursor, students = snapshot
+        self.global_board = RankedBoard(students)
+        self.built_at = time.monotonic()
+        self.cursor_history.append((self.built_at, self.cursor))
+
+    def _course_board(self, course_id, rows=None):
+        board = self.course_boards.get(course_id)
+        if board is not None:
+            self.course_boards.move_to_end(course_id)
+            return board
+
+        board = RankedBoard(self._load_course(course_id) if rows is None else rows)
+        self.course_boards[course_id] = board
+        if len(self.course_boards) > MAX_COURSE_BOARDS:
+            self.course_boards.popitem(last=False)
+        return board
+
+    def _replay_from(self):
+        """Cursor LATE_COMMIT_SECONDS секунд назад: записи после него могли закоммититься не по порядку"""
+        horizon = time.monotonic() - LATE_COMMIT_SECONDS
+        while len(self.cursor_history) > 1 and self.cursor_history[1][0] <= horizon:
+            self.cursor_history.popleft()
+        return self.cursor_history[0][1]
+
+    def _apply_new_entries(self):
+        """Дочитывает новые записи журнала и обновляет только затронутых учеников"""
+        # Без изменений журнала запрос не нужен; без ключа в кэше читаем всегда
+        seq = cache.get(LEDGER_SEQ_KEY)
+        if seq is not None and seq == self.seen_seq:
+            return
+        self.seen_seq = seq
+
+        entries = list(
+            XPTransaction.objects.filter(id__gt=self._replay_from())
+            .order_by('id')
+            .values_list('id', 'user_id', 'course_id')
+        )
+        if not entries:
+            return
+
+        user_ids = {user_id for _, user_id, _ in entries}
+        # Абсолютные значения вместо прибавления дельт: повторное применение безопасно
+        for user_id, xp, username in User.objects.filter(id__in=user_ids, role='student').values_list('id', 'xp', 'username'):
+            self.global_board.set(user_id, xp, username)
+
+        touched_courses = {course_id for _, _, course_id in entries if course_id in self.course_boards}
+        for course_id in touched_courses:
+            totals = (
+                XPTransaction.objects.filter(course_id=course_id, user_id__in=user_ids, user__role='student')
+                .values('user_id', 'user__username')
+                .annotate(total=Sum('amount'))
+            )
+            for row in totals:
+                self.course_boards[course_id].set(row['user_id'], row['total'], row['user__username'])
+
+        if entries[-1][0] > self.cursor:
+            self.cursor = entries[-1][0]
+            self.cursor_history.append((time.monotonic(), self.cursor))
+
+    def _board(self, course_id=None, snapshot=None, course_rows=None):
+        if self._needs_rebuild():
+            self._build(snapshot or self._load_global())
+        else:
+            self._apply_new_entries()
+        if course_id:
+            return self._course_board(course_id, course_rows)
+        return self.global_board
+
+    def payload(self, user, limit, course_id=None, student_ids=None):
+        """
+        Топ-N и позиция текущего пользователя (общий рейтинг или по курсу).
+        student_ids ограничивает рейтинг учениками класса. Курс должен существовать:
+        проверка - на стороне view.
+        """
+        # Тяжелые запросы перестройки - до блокировки; если другой поток успел раньше, снимок не нужен
+        snapshot = self._load_global() if self._needs_rebuild() else None
+        course_rows = None
+        if course_id and (snapshot is not None or course_id not in self.course_boards):
+            course_rows = self._load_course(course_id)
+        with self._lock:
+            board = self._board(course_id, snapshot, course_rows)
+            if student_ids is not None:
+                board = board.subset(student_ids)
+            payload = {'top': board.top(limit), 'me': None}
+            if user is not None and user.is_authenticated:
+                payload['me'] = {
+                    'rank': board.rank(user.pk),
+                    'xp': board.score(user.pk),
+                    'total': len(board),
+                }
+            return payload
+
+
+leaderboards = Leaderboards()
+
+
+def ledger_changed():
+    """Сообщает всем процессам, что в журнале XP появилась новая запись"""
+    try:
+        cache.incr(LEDGER_SEQ_KEY)
+    except ValueError:
+        cache.add(LEDGER_SEQ_KEY, 1, timeout=None)
@@ -0,0 +1,85 @@
+"""
+Бенчмарк: одновременные запросы курса при холодном кэше каталога
+"""
+import statistics
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+
+from api import metrics
+from api.catalog import bump_catalog_version
+from api.models import Course
+
+
+class Command(BaseCommand):
+    help = 'Запускает N одновременных запросов /api/courses/<id>/ с холодным кэшем и считает запросы к БД'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', help='id курса (по умолчанию первый)')
+        parser.add_argument('--clients', type=int, default=30, help='Одновременных клиентов')
+
+    def handle(self, *args, **options):
+        course_id = options['course'] or Course.objects.values_list('id', flat=True).first()
+        if course_id is None:
+            raise CommandError('Нет курсов, загрузите данные (load_initial_data)')
+
+        for title, enabled in (('без single-flight', False), ('с single-flight', True)):
+            single_flight = dict(getattr(settings, 'SINGLE_FLIGHT', {}), ENABLED=enabled)
+            with override_settings(SINGLE_FLIGHT=single_flight):
+                self.report(title, self.stampede(course_id, options['clients']))
+
+    def stampede(self, course_id, clients):
+        bump_catalog_version()  # Холодный кэш: старые ключи больше не используются
+        builds_before = metrics.get('singleflight.builds')
+        start = threading.Barrier(clients)
+        lock = threading.Lock()
+        queries = []
+        timings = []
+
+        def count_queries(execute, sql, params, many, context):
+            with lock:
+                queries.append(sql)
+            return execute(sql, params, many, context)
+
+        def client_thread():
+            client = Client(HTTP_HOST=settings.ALLOWED_HOSTS[0])
+            try:
+                with connection.execute_wrapper(count_queries):
+                    start.wait()
+                    started = time.perf_counter()
+                    response = client.get(f'/api/courses/{course_id}/')
+                    elapsed = (time.perf_counter() - started) * 1000
+                with lock:
+                    timings.append(elapsed if response.status_code == 200 else None)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=client_thread) for _ in range(clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        failed = sum(1 for timing in timings if timing is None)
+        timings = sorted(timing for timing in timings if timing is not None)
+        return {
+            'builds': metrics.get('singleflight.builds') - builds_before,
+            'queries': len(queries),
+            'failed': failed,
+            'timings': timings,
+        }
+
+    def report(self, title, result):
+        timings = result['timings']
+        latency = (
+            f'mean={statistics.mean(timings):.2f}ms p95={timings[max(int(len(timings) * 0.95) - 1, 0)]:.2f}ms'
+            if timings else 'нет успешных ответов'
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'{title}: сборок payload {result["builds"]}, запросов к БД {result["queries"]}, '
+            f'ошибок {result["failed"]}, {latency}'
+        ))
@@ -0,0 +1,53 @@
+"""
+Бенчмарк: задержка небольших запросов с постоянными подключениями к БД и без них
+"""
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+from django.test import Client
+
+from api import metrics
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает задержку запросов при CONN_MAX_AGE=0 и с постоянными подключениями'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/api/courses/', help='Запрашиваемый URL')
+        parser.add_argument('--requests', type=int, default=200, help='Количество запросов на прогон')
+        parser.add_argument('--max-age', type=int, default=60, help='CONN_MAX_AGE для второго прогона')
+
+    def handle(self, *args, **options):
+        client = Client(HTTP_HOST=settings.ALLOWED_HOSTS[0])
+        conn = connections['default']
+        self.stdout.write(f'База: {conn.vendor}, URL: {options["path"]}, запросов: {options["requests"]}')
+
+        for max_age in (0, options['max_age']):
+            conn.close()
+            conn.settings_dict['CONN_MAX_AGE'] = max_age
+            opened_before = metrics.get('db.connections_opened.default')
+
+            timings = []
+            for _ in range(options['requests']):
+                started = time.perf_counter()
+                response = client.get(options['path'])
+                # Тестовый клиент не закрывает подключения сам, повторяем
+                # поведение WSGI обработчика в конце запроса
+                close_old_connections()
+                timings.append((time.perf_counter() - started) * 1000)
+                if response.status_code >= 400:
+                    self.stderr.write(f'Ответ {response.status_code}, прогон остановлен')
+                    return
+
+            timings.sort()
+            opened = metrics.get('db.connections_opened.default') - opened_before
+            self.stdout.write(self.style.SUCCESS(
+                f'CONN_MAX_AGE={max_age}: '
+                f'mean={statistics.mean(timings):.2f}ms '
+                f'p50={timings[len(timings) // 2]:.2f}ms '
+                f'p95={timings[int(len(timings) * 0.95) - 1]:.2f}ms '
+                f'подключений открыто: {opened}'
+            ))
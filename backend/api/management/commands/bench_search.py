@@ -0,0 +1,97 @@
+"""
+Бенчмарк полнотекстового поиска на синтетических документах
+"""
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from api.models import Course, Lesson, SearchDocument
+from api.search import SEARCHERS, backend_name, parse_query, search
+
+BENCH_COURSE = 'bench-search'
+QUERIES = ['while true', 'coroutine wrap', 'GetService', 'TweenService Create', '"local part"', 'Touched Connect', 'humanoid']
+WORDS = [
+    'local', 'function', 'end', 'if', 'then', 'else', 'for', 'in', 'pairs', 'do', 'return', 'print',
+    'part', 'player', 'humanoid', 'game', 'workspace', 'Instance', 'new', 'Vector3', 'CFrame', 'wait',
+    'GetService', 'TweenService', 'Create', 'Touched', 'Connect', 'Parent', 'Name', 'Position', 'Color',
+] + [f'var{i}' for i in range(500)]
+
+
+def _fake_code(rng):
+    lines = []
+    for _ in range(rng.randint(5, 40)):
+        lines.append(' '.join(rng.choice(WORDS) for _ in range(rng.randint(3, 9))))
+    if rng.random() < 0.02:
+        lines.insert(rng.randrange(len(lines)), 'while true do wait(1) end')
+    if rng.random() < 0.001:
+        lines.insert(rng.randrange(len(lines)), 'coroutine.wrap(function() end)()')
+    return '\n'.join(lines)
+
+
+class Command(BaseCommand):
+    help = 'Заполняет SearchDocument синтетическим кодом и измеряет задержку поиска (p50/p95)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=200000, help='Число синтетических документов')
+        parser.add_argument('--batch', type=int, default=5000, help='Размер bulk_create')
+        parser.add_argument('--repeat', type=int, default=20, help='Повторов каждого запроса')
+        parser.add_argument('--compare-like', action='store_true', help='Сравнить с icontains (медленно)')
+        parser.add_argument('--keep', action='store_true', help='Не удалять синтетические документы')
+
+    def handle(self, *args, **options):
+        course, _ = Course.objects.get_or_create(id=BENCH_COURSE, defaults={'title': 'Bench search', 'description': ''})
+        lesson, _ = Lesson.objects.get_or_create(
+            id=BENCH_COURSE, defaults={'course': course, 'title': 'Bench', 'description': '', 'order': 1, 'content': ''}
+        )
+        try:
+            self.fill(lesson, options['rows'], options['batch'])
+            self.stdout.write(f'Движок: {backend_name()}, документов: {SearchDocument.objects.count()}')
+            self.measure('index', lambda query: search(query, course_id=BENCH_COURSE), options['repeat'])
+            if options['compare_like']:
+                self.measure('icontains', self.like_search, max(1, options['repeat'] // 10))
+        finally:
+            if not options['keep']:
+                # Документы удаляются каскадом вместе с курсом
+                course.delete()
+
+    def fill(self, lesson, rows, batch):
+        existing = SearchDocument.objects.filter(lesson=lesson, kind='submission').count()
+        rng = random.Random(42)
+        started = time.perf_counter()
+        for offset in range(existing, rows, batch):
+            SearchDocument.objects.bulk_create([
+                SearchDocument(
+                    kind='submission', object_id=f'bench-{number}', course_id=lesson.course_id,
+                    lesson=lesson, title='', body=_fake_code(rng),
+                )
+                for number in range(offset, min(offset + batch, rows))
+            ])
+            self.stdout.write(f'Вставлено: {min(offset + batch, rows)}')
+        if rows > existing:
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f'Заполнение: {rows - existing} документов за {elapsed:.1f}s')
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(f'ANALYZE {SearchDocument._meta.db_table}')
+
+    def like_search(self, query):
+        # Тот же запрос через запасной вариант без индекса (icontains)
+        return SEARCHERS['like'](parse_query(query), None, BENCH_COURSE, 20, 'default')
+
+    def measure(self, title, run, repeat):
+        self.stdout.write(self.style.MIGRATE_HEADING(title))
+        for query in QUERIES:
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                results = run(query)
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+            self.stdout.write(
+                f'  {query!r:24} результатов: {len(results):3}  '
+                f'p50: {statistics.median(timings):8.2f}ms  p95: {p95:8.2f}ms'
+            )
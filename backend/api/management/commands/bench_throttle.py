@@ -0,0 +1,116 @@
+"""
+Нагрузочный тест: злоупотребляющий клиент против обычного ученика на check_code
+"""
+import statistics
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+from django.test import Client, override_settings
+
+from api.authentication import issue_tokens
+from api.models import Lesson, User
+from api.throttling import KEY_PREFIX, parse_rate
+
+ABUSER_IP = '10.255.0.1'
+VICTIM_IP = '10.255.0.2'
+
+UNLIMITED = {
+    scope: {kind: (10 ** 9, '1000000/s') for kind in limits}
+    for scope, limits in settings.THROTTLE_BUCKETS.items()
+}
+
+
+class Command(BaseCommand):
+    help = 'Запускает "шумного" клиента на check_code и измеряет задержку для обычного ученика'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help='Потоков у шумного клиента')
+        parser.add_argument('--seconds', type=float, default=15, help='Длительность прогона')
+        parser.add_argument('--compare', action='store_true', help='Дополнительно прогнать без лимитов')
+
+    def handle(self, *args, **options):
+        lesson = Lesson.objects.first()
+        if lesson is None:
+            raise CommandError('Нет уроков, загрузите данные (load_initial_data)')
+
+        abuser, _ = User.objects.get_or_create(username='bench_abuser', defaults={'role': 'student'})
+        victim, _ = User.objects.get_or_create(username='bench_victim', defaults={'role': 'student'})
+        # Обычный ученик отправляет чуть реже устойчивого лимита на пользователя
+        options['interval'] = 1.2 / parse_rate(settings.THROTTLE_BUCKETS['check_code']['user'][1])
+        try:
+            runs = [('с лимитами', None)]
+            if options['compare']:
+                runs.append(('без лимитов', UNLIMITED))
+            for title, buckets in runs:
+                self.reset_buckets(abuser, victim)
+                if buckets is None:
+                    result = self.run(lesson, abuser, victim, options)
+                else:
+                    with override_settings(THROTTLE_BUCKETS=buckets):
+                        result = self.run(lesson, abuser, victim, options)
+                self.report(title, result)
+        finally:
+            abuser.delete()
+            victim.delete()
+
+    def reset_buckets(self, *users):
+        keys = []
+        for scope in settings.THROTTLE_BUCKETS:
+            keys += [f'{KEY_PREFIX}{scope}:user:{user.pk}' for user in users]
+            keys += [f'{KEY_PREFIX}{scope}:ip:{ip}' for ip in (ABUSER_IP, VICTIM_IP)]
+        cache.delete_many(keys)
+
+    def run(self, lesson, abuser, victim, options):
+        # Неверный вывод: check_code не создает отправок, нагрузка только на проверку
+        body = {'lesson_id': lesson.id, 'code': 'print("bench")', 'output': ['bench']}
+        deadline = time.monotonic() + options['seconds']
+        statuses = {}
+        lock = threading.Lock()
+
+        def abuse():
+            client = Client(
+                HTTP_HOST=settings.ALLOWED_HOSTS[0], REMOTE_ADDR=ABUSER_IP,
+                HTTP_AUTHORIZATION=f'Bearer {issue_tokens(abuser)[1]}',
+            )
+            try:
+                while time.monotonic() < deadline:
+                    response = client.post('/api/check_code/', body, content_type='application/json')
+                    close_old_connections()
+                    with lock:
+                        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=abuse) for _ in range(options['threads'])]
+        for thread in threads:
+            thread.start()
+
+        client = Client(
+            HTTP_HOST=settings.ALLOWED_HOSTS[0], REMOTE_ADDR=VICTIM_IP,
+            HTTP_AUTHORIZATION=f'Bearer {issue_tokens(victim)[1]}',
+        )
+        timings = []
+        victim_statuses = {}
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            response = client.post('/api/check_code/', body, content_type='application/json')
+            close_old_connections()
+            timings.append((time.perf_counter() - started) * 1000)
+            victim_statuses[response.status_code] = victim_statuses.get(response.status_code, 0) + 1
+            time.sleep(options['interval'])
+
+        for thread in threads:
+            thread.join()
+        return statuses, victim_statuses, sorted(timings)
+
+    def report(self, title, result):
+        statuses, victim_statuses, timings = result
+        self.stdout.write(self.style.SUCCESS(
+            f'{title}: шумный клиент {statuses}, обычный ученик {victim_statuses}, '
+            f'задержка mean={statistics.mean(timings):.2f}ms '
+            f'p95={timings[max(int(len(timings) * 0.95) - 1, 0)]:.2f}ms'
+        ))
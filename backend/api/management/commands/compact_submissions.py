@@ -0,0 +1,54 @@
+"""
+Применение ограничений размера к существующим отправкам
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.models import Submission
+from api.payloads import compact, store
+
+
+class Command(BaseCommand):
+    help = 'Обрезает код, вывод и ошибку старых отправок до лимитов и переносит большие в SubmissionPayload'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk', type=int, default=200, help='Размер порции')
+        parser.add_argument('--dry-run', action='store_true', help='Только посчитать отправки, которые изменятся')
+
+    def handle(self, *args, **options):
+        submissions = Submission.objects.filter(has_payload=False).only(
+            'id', 'code', 'output', 'error', 'has_payload'
+        ).order_by('id')
+
+        checked = 0
+        compacted = 0
+        last_id = 0
+        while True:
+            chunk = list(submissions.filter(id__gt=last_id)[:options['chunk']])
+            if not chunk:
+                break
+            last_id = chunk[-1].id
+            checked += len(chunk)
+
+            changed = []
+            for submission in chunk:
+                before = (submission.code, submission.output, submission.error)
+                payload = compact(submission)
+                if (submission.code, submission.output, submission.error) != before:
+                    changed.append((submission, payload))
+            compacted += len(changed)
+            if not changed or options['dry_run']:
+                continue
+
+            # bulk_update без сигналов и без изменения updated_at: отправка не считается обновленной
+            with transaction.atomic():
+                Submission.objects.bulk_update(
+                    [submission for submission, _ in changed], ['code', 'output', 'error', 'has_payload']
+                )
+                for submission, payload in changed:
+                    if payload is not None:
+                        store(submission, payload)
+            self.stdout.write(f'Проверено: {checked}, сжато: {compacted}')
+
+        verb = 'будет сжато' if options['dry_run'] else 'сжато'
+        self.stdout.write(self.style.SUCCESS(f'Готово, проверено отправок: {checked}, {verb}: {compacted}'))
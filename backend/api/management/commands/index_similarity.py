@@ -0,0 +1,52 @@
+"""
+Индексация исторических отправок для поиска похожих решений
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.models import SimilarityBucket, Submission, SubmissionFingerprint
+from api.similarity import build_index_rows
+
+
+class Command(BaseCommand):
+    help = 'Строит MinHash-подписи и корзины LSH для отправок, порциями по --chunk'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lesson', help='Индексировать только отправки этого урока')
+        parser.add_argument('--chunk', type=int, default=500, help='Размер порции')
+        parser.add_argument('--reindex', action='store_true', help='Пересчитать уже проиндексированные отправки')
+
+    def handle(self, *args, **options):
+        submissions = Submission.objects.only('id', 'lesson_id', 'student_id', 'code').order_by('id')
+        if options['lesson']:
+            submissions = submissions.filter(lesson_id=options['lesson'])
+        if not options['reindex']:
+            submissions = submissions.filter(fingerprint__isnull=True)
+
+        indexed = 0
+        last_id = 0
+        while True:
+            # Постраничный проход по первичному ключу: память не зависит от числа отправок
+            chunk = list(submissions.filter(id__gt=last_id)[:options['chunk']])
+            if not chunk:
+                break
+            last_id = chunk[-1].id
+
+            fingerprints = []
+            buckets = []
+            for submission in chunk:
+                fingerprint, submission_buckets = build_index_rows(submission)
+                fingerprints.append(fingerprint)
+                buckets.extend(submission_buckets)
+
+            ids = [submission.id for submission in chunk]
+            with transaction.atomic():
+                SimilarityBucket.objects.filter(submission_id__in=ids).delete()
+                SubmissionFingerprint.objects.filter(submission_id__in=ids).delete()
+                SubmissionFingerprint.objects.bulk_create(fingerprints)
+                SimilarityBucket.objects.bulk_create(buckets)
+
+            indexed += len(chunk)
+            self.stdout.write(f'Проиндексировано: {indexed}')
+
+        self.stdout.write(self.style.SUCCESS(f'Готово, отправок проиндексировано: {indexed}'))
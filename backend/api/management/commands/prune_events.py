@@ -0,0 +1,20 @@
+"""
+Команда для очистки журнала событий SSE (воркер делает то же раз в час задачей prune_event_log)
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.events import prune_events
+
+
+class Command(BaseCommand):
+    help = 'Удаляет старые события SSE (возобновление потока возможно только в пределах срока хранения)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.SSE_EVENT_RETENTION_DAYS, help='Сколько дней хранить события'
+        )
+
+    def handle(self, *args, **options):
+        deleted = prune_events(options['days'])
+        self.stdout.write(self.style.SUCCESS(f'Удалено событий: {deleted}'))
@@ -0,0 +1,26 @@
+"""
+Публикация статических бандлов каталога в MEDIA_ROOT/catalog
+"""
+from django.core.management.base import BaseCommand
+
+from api.bundles import brotli, publish_all, publish_course, publish_index
+
+
+class Command(BaseCommand):
+    help = 'Пишет версионированные JSON-бандлы курсов (+ .gz и .br) для раздачи через nginx'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', help='Опубликовать только этот курс')
+
+    def handle(self, *args, **options):
+        if brotli is None:
+            self.stdout.write(self.style.WARNING('brotli не установлен, публикуются только .gz'))
+
+        if options['course']:
+            url = publish_course(options['course'])
+            publish_index()
+            self.stdout.write(self.style.SUCCESS(f'{options["course"]}: {url or "курс не найден, бандл удален"}'))
+            return
+
+        count = publish_all()
+        self.stdout.write(self.style.SUCCESS(f'Опубликовано курсов: {count}'))
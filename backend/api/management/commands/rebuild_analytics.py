@@ -0,0 +1,17 @@
+"""
+Полный пересчет роллапов аналитики (LessonStats) по урокам
+"""
+from django.core.management.base import BaseCommand
+
+from api.analytics import reconcile_all
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает аналитику уроков с нуля (по одному уроку в транзакции)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', help='Пересчитать только уроки этого курса')
+
+    def handle(self, *args, **options):
+        rebuilt = reconcile_all(options['course'])
+        self.stdout.write(self.style.SUCCESS(f'Пересчитано уроков: {rebuilt}'))
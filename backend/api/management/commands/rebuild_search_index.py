@@ -0,0 +1,41 @@
+"""
+Полная пересборка документов полнотекстового поиска
+"""
+from django.core.management.base import BaseCommand
+
+from api.models import Challenge, Lesson, SearchDocument, Submission
+from api.search import index_challenge, index_lesson, index_submission_code
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает SearchDocument для уроков, заданий и отправок (порциями по --chunk)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk', type=int, default=500, help='Размер порции отправок')
+        parser.add_argument('--kind', choices=['lesson', 'challenge', 'submission'], help='Только документы этого типа')
+
+    def handle(self, *args, **options):
+        kinds = [options['kind']] if options['kind'] else ['lesson', 'challenge', 'submission']
+
+        if 'lesson' in kinds:
+            for lesson in Lesson.objects.all():
+                index_lesson(lesson)
+        if 'challenge' in kinds:
+            for challenge in Challenge.objects.all():
+                index_challenge(challenge)
+        if 'submission' in kinds:
+            submissions = Submission.objects.only('id', 'lesson_id', 'student_id', 'code').order_by('id')
+            indexed = 0
+            last_id = 0
+            while True:
+                chunk = list(submissions.filter(id__gt=last_id)[:options['chunk']])
+                if not chunk:
+                    break
+                last_id = chunk[-1].id
+                for submission in chunk:
+                    index_submission_code(submission)
+                indexed += len(chunk)
+                self.stdout.write(f'Отправок проиндексировано: {indexed}')
+
+        counts = {kind: SearchDocument.objects.filter(kind=kind).count() for kind in kinds}
+        self.stdout.write(self.style.SUCCESS(f'Готово: {counts}'))
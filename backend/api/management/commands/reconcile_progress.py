@@ -0,0 +1,34 @@
+"""
+Сверка StudentLesson и UserProgress
+"""
+import json
+
+from django.core.management.base import BaseCommand
+
+from api.reconcile import reconcile
+
+
+class Command(BaseCommand):
+    help = 'Находит и исправляет расхождения между StudentLesson и UserProgress (порциями по --chunk)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk', type=int, default=500, help='Размер порции')
+        parser.add_argument('--course', help='Только прогресс этого курса')
+        parser.add_argument('--user', type=int, help='Только прогресс этого ученика')
+        parser.add_argument('--dry-run', action='store_true', help='Только показать расхождения')
+        parser.add_argument('--verbose-changes', action='store_true', help='Вывести изменения по ученикам')
+
+    def handle(self, *args, **options):
+        report = reconcile(
+            chunk=options['chunk'],
+            dry_run=options['dry_run'],
+            course_id=options['course'],
+            user_id=options['user'],
+        )
+        changes = report.pop('changes')
+        if options['verbose_changes']:
+            for change in changes:
+                self.stdout.write(json.dumps(change, ensure_ascii=False))
+
+        verb = 'будет исправлено' if options['dry_run'] else 'исправлено'
+        self.stdout.write(self.style.SUCCESS(f'Готово, {verb}: {json.dumps(report, ensure_ascii=False)}'))
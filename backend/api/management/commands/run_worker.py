@@ -0,0 +1,113 @@
+"""
+Воркер фоновых задач (api/tasks.py)
+"""
+import os
+import signal
+import socket
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, close_old_connections, connection
+
+from api.idempotency import prune_expired
+from api.tasks import claim, execute, heartbeat, prune_done, requeue_stale, schedule_periodic
+
+HOUSEKEEPING_SECONDS = 60
+
+
+class Command(BaseCommand):
+    help = 'Выполняет фоновые задачи из таблицы Task'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=2, help='Число потоков')
+        parser.add_argument('--poll', type=float, default=1.0, help='Пауза при пустой очереди, секунды')
+        parser.add_argument('--once', action='store_true', help='Выполнить готовые задачи и завершиться')
+
+    def handle(self, *args, **options):
+        self.stop = threading.Event()
+        self.done = 0
+        self.failed = 0
+        self.counter_lock = threading.Lock()
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, lambda *_: self.stop.set())
+            signal.signal(signal.SIGINT, lambda *_: self.stop.set())
+
+        name = f'{socket.gethostname()}:{os.getpid()}'
+        requeued = requeue_stale()
+        if requeued:
+            self.stdout.write(f'Возвращено в очередь зависших задач: {requeued}')
+        # Соединение главного потока не нужно на время работы потоков
+        connection.close()
+
+        worker_ids = [f'{name}:{i}' for i in range(options['concurrency'])]
+        threads = [
+            threading.Thread(target=self.work, args=(worker_id, options), daemon=True)
+            for worker_id in worker_ids
+        ]
+        for thread in threads:
+            thread.start()
+        self.stdout.write(f'Воркер {name} запущен, потоков: {len(threads)}')
+
+        heartbeat_seconds = settings.TASKS.get('HEARTBEAT_SECONDS', 60)
+        last_housekeeping = last_heartbeat = time.monotonic()
+        while any(thread.is_alive() for thread in threads):
+            if self.stop.wait(1):
+                break
+            if time.monotonic() - last_heartbeat >= heartbeat_seconds:
+                last_heartbeat = time.monotonic()
+                try:
+                    # Долгая задача не должна считаться зависшей, пока воркер жив
+                    heartbeat(worker_ids)
+                except DatabaseError as error:
+                    self.stderr.write(f'Продление блокировок задач не удалось: {error}')
+                finally:
+                    close_old_connections()
+            if time.monotonic() - last_housekeeping >= HOUSEKEEPING_SECONDS:
+                last_housekeeping = time.monotonic()
+                try:
+                    requeue_stale()
+                    prune_done()
+                    prune_expired()
+                    schedule_periodic()
+                except DatabaseError as error:
+                    self.stderr.write(f'Обслуживание очереди не удалось: {error}')
+                finally:
+                    close_old_connections()
+        for thread in threads:
+            thread.join()
+        connection.close()
+        self.stdout.write(self.style.SUCCESS(f'Воркер остановлен, выполнено: {self.done}, с ошибкой: {self.failed}'))
+
+    def work(self, worker_id, options):
+        try:
+            while not self.stop.is_set():
+                try:
+                    claimed = claim(worker_id)
+                except DatabaseError as error:
+                    # Например, database is locked на SQLite: пробуем снова после паузы
+                    self.stderr.write(f'{worker_id}: не удалось взять задачу: {error}')
+                    close_old_connections()
+                    self.stop.wait(options['poll'])
+                    continue
+                if claimed is None:
+                    if options['once']:
+                        return
+                    close_old_connections()
+                    self.stop.wait(options['poll'])
+                    continue
+                try:
+                    succeeded = execute(claimed)
+                except DatabaseError as error:
+                    # Результат не записан: задачу вернет в очередь requeue_stale
+                    self.stderr.write(f'{worker_id}: не удалось записать результат задачи #{claimed.pk}: {error}')
+                    close_old_connections()
+                    succeeded = False
+                with self.counter_lock:
+                    if succeeded:
+                        self.done += 1
+                    else:
+                        self.failed += 1
+        finally:
+            connection.close()
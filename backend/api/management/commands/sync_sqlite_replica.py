@@ -0,0 +1,25 @@
+"""
+Копирование основной базы SQLite в файл локальной реплики (SQLITE_REPLICA)
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.db_router import replica_alias, sync_sqlite_replica
+
+
+class Command(BaseCommand):
+    help = 'Копирует db.sqlite3 в файл реплики (онлайн-бэкап SQLite); между запусками реплика отстает'
+
+    def handle(self, *args, **options):
+        alias = replica_alias()
+        primary = settings.DATABASES['default']
+        replica = settings.DATABASES.get(alias) if alias else None
+        if replica is None or not (
+            primary['ENGINE'] == replica['ENGINE'] == 'django.db.backends.sqlite3'
+        ):
+            raise CommandError('Реплика SQLite не настроена (SQLITE_REPLICA=True при SQLite в default)')
+        if str(primary['NAME']) == str(replica['NAME']):
+            raise CommandError('Файл реплики совпадает с основной базой: задайте другой SQLITE_REPLICA_NAME')
+
+        sync_sqlite_replica(alias)
+        self.stdout.write(self.style.SUCCESS(f'Реплика обновлена: {replica["NAME"]}'))
@@ -0,0 +1,21 @@
+"""
+Прогрев приложения и кэшей после деплоя
+"""
+from django.core.management.base import BaseCommand
+
+from api.warmup import warm_caches, warm_process
+
+
+class Command(BaseCommand):
+    help = 'Заполняет кэш каталога и прогревает импорты, URL резолвер и сериализаторы'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--no-caches', action='store_true', help='Только прогрев процесса, без обращения к БД')
+
+    def handle(self, *args, **options):
+        steps = warm_process()
+        if not options['no_caches']:
+            steps += warm_caches()
+        for name, elapsed in steps:
+            self.stdout.write(f'{name}: {elapsed:.1f}ms')
+        self.stdout.write(self.style.SUCCESS('Прогрев завершен'))
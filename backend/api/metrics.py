@@ -0,0 +1,59 @@
+"""
+Метрики процесса (воркера gunicorn).
+
+Счетчики хранятся в памяти процесса; модули регистрируют провайдеров,
+которые добавляют свои разделы в снимок метрик (см. metrics_snapshot).
+"""
+import os
+import threading
+from collections import defaultdict
+
+_lock = threading.Lock()
+_counters = defaultdict(int)
+_providers = {}
+
+
+def incr(name, value=1):
+    with _lock:
+        _counters[name] += value
+
+
+def get(name):
+    with _lock:
+        return _counters.get(name, 0)
+
+
+def register(name, provider):
+    """Регистрирует функцию, возвращающую словарь метрик раздела `name`"""
+    _providers[name] = provider
+
+
+def metrics_snapshot():
+    with _lock:
+        counters = dict(_counters)
+    snapshot = {'pid': os.getpid(), 'counters': counters}
+    for name, provider in _providers.items():
+        snapshot[name] = provider()
+    return snapshot
+
+
+def db_metrics():
+    """Состояние постоянных подключений к БД в этом процессе"""
+    from django.db import connections
+
+    requests = get('http.requests')
+    result = {}
+    for alias in connections:
+        conn = connections[alias]
+        opened = get(f'db.connections_opened.{alias}')
+        result[alias] = {
+            'conn_max_age': conn.settings_dict.get('CONN_MAX_AGE'),
+            'health_checks': conn.settings_dict.get('CONN_HEALTH_CHECKS'),
+            'connections_opened': opened,
+            # Доля запросов, обслуженных без открытия нового подключения
+            'reuse_ratio': round(1 - opened / requests, 4) if requests else None,
+        }
+    return result
+
+
+register('db', db_metrics)
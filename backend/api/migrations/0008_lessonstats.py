@@ -0,0 +1,39 @@
+# Generated by Django 5.0.1 on 2026-10-19 16:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_xptransaction'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LessonStats',
+            fields=[
+                ('lesson', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='api.lesson')),
+                ('submissions_count', models.IntegerField(default=0)),
+                ('pending_count', models.IntegerField(default=0)),
+                ('approved_count', models.IntegerField(default=0)),
+                ('rejected_count', models.IntegerField(default=0)),
+                ('students_attempted', models.IntegerField(default=0)),
+                ('students_completed', models.IntegerField(default=0)),
+                ('attempts_histogram', models.JSONField(default=dict)),
+                ('review_count', models.IntegerField(default=0)),
+                ('review_seconds_total', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['lesson', 'student'], name='api_submiss_lesson__f7aebb_idx'),
+        ),
+        migrations.AddField(
+            model_name='lessonstats',
+            name='course',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lesson_stats', to='api.course'),
+        ),
+    ]
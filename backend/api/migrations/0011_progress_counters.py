@@ -0,0 +1,64 @@
+# Generated by Django 5.0.1 on 2026-10-19 16:41
+
+from django.db import migrations, models
+
+
+def fill_counters(apps, schema_editor):
+    """Счетчики для существующего прогресса (активность - по updated_at)"""
+    Lesson = apps.get_model('api', 'Lesson')
+    UserProgress = apps.get_model('api', 'UserProgress')
+    totals = {}
+    batch = []
+    for progress in UserProgress.objects.iterator(chunk_size=500):
+        if progress.course_id not in totals:
+            totals[progress.course_id] = Lesson.objects.filter(course_id=progress.course_id).count()
+        total = totals[progress.course_id]
+        progress.completed_count = len(set(progress.completed_lesson_ids or []))
+        progress.unlocked_count = len(set(progress.unlocked_lesson_ids or []))
+        progress.percent_complete = min(100, progress.completed_count * 100 // total) if total else 0
+        progress.last_activity_at = progress.updated_at
+        batch.append(progress)
+        if len(batch) >= 500:
+            UserProgress.objects.bulk_update(batch, ['completed_count', 'unlocked_count', 'percent_complete', 'last_activity_at'])
+            batch = []
+    if batch:
+        UserProgress.objects.bulk_update(batch, ['completed_count', 'unlocked_count', 'percent_complete', 'last_activity_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_cohort'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprogress',
+            name='completed_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userprogress',
+            name='last_activity_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='userprogress',
+            name='percent_complete',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userprogress',
+            name='unlocked_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='userprogress',
+            index=models.Index(fields=['course', 'completed_count', 'last_activity_at'], name='api_userpro_course__c89c0e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userprogress',
+            index=models.Index(fields=['course', 'percent_complete'], name='api_userpro_course__03c9fd_idx'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.0.1 on 2026-10-19 16:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_progress_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CodeBlob',
+            fields=[
+                ('hash', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('depth', models.PositiveSmallIntegerField(default=0)),
+                ('content', models.TextField(blank=True)),
+                ('delta', models.JSONField(blank=True, null=True)),
+                ('size', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('base', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='api.codeblob')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SubmissionAttempt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField()),
+                ('output', models.JSONField(default=list)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('passed_auto_check', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('code', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='attempts', to='api.codeblob')),
+                ('lesson', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='submission_attempts', to='api.lesson')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='submission_attempts', to=settings.AUTH_USER_MODEL)),
+                ('submission', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='attempts', to='api.submission')),
+            ],
+            options={
+                'ordering': ['student', 'lesson', 'number'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='submissionattempt',
+            constraint=models.UniqueConstraint(fields=('student', 'lesson', 'number'), name='unique_attempt_number'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.0.1 on 2026-10-19 16:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_submission_history'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubmissionPayload',
+            fields=[
+                ('submission', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='payload', serialize=False, to='api.submission')),
+                ('codec', models.CharField(choices=[('zlib', 'zlib'), ('zstd', 'zstd')], default='zlib', max_length=10)),
+                ('data', models.BinaryField()),
+                ('raw_size', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='has_payload',
+            field=models.BooleanField(default=False),
+        ),
+    ]
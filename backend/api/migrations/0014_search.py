@@ -0,0 +1,109 @@
+# Generated by Django 5.0.1 on 2026-10-19 16:48
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import DatabaseError, migrations, models, transaction
+
+TABLE = 'api_searchdocument'
+
+POSTGRES_FORWARD = [
+    f"""
+    ALTER TABLE {TABLE} ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(title, '')), 'A')
+        || setweight(to_tsvector('simple', coalesce(body, '')), 'B')
+    ) STORED
+    """,
+    f'CREATE INDEX {TABLE}_vector_idx ON {TABLE} USING GIN (search_vector)',
+]
+POSTGRES_BACKWARD = [
+    f'DROP INDEX IF EXISTS {TABLE}_vector_idx',
+    f'ALTER TABLE {TABLE} DROP COLUMN IF EXISTS search_vector',
+]
+
+# Внешний контент FTS5: текст хранится только в основной таблице, триггеры
+# поддерживают индекс. Пересоздание таблицы в будущих миграциях удалит триггеры -
+# после такой миграции их нужно создать заново
+SQLITE_FORWARD = [
+    f"""
+    CREATE VIRTUAL TABLE {TABLE}_fts USING fts5(
+        title, body, content='{TABLE}', content_rowid='id', tokenize="unicode61 tokenchars '_'"
+    )
+    """,
+    f"""
+    CREATE TRIGGER {TABLE}_ai AFTER INSERT ON {TABLE} BEGIN
+        INSERT INTO {TABLE}_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END
+    """,
+    f"""
+    CREATE TRIGGER {TABLE}_ad AFTER DELETE ON {TABLE} BEGIN
+        INSERT INTO {TABLE}_fts({TABLE}_fts, rowid, title, body) VALUES ('delete', old.id, old.title, old.body);
+    END
+    """,
+    f"""
+    CREATE TRIGGER {TABLE}_au AFTER UPDATE ON {TABLE} BEGIN
+        INSERT INTO {TABLE}_fts({TABLE}_fts, rowid, title, body) VALUES ('delete', old.id, old.title, old.body);
+        INSERT INTO {TABLE}_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END
+    """,
+]
+SQLITE_BACKWARD = [
+    f'DROP TRIGGER IF EXISTS {TABLE}_au',
+    f'DROP TRIGGER IF EXISTS {TABLE}_ad',
+    f'DROP TRIGGER IF EXISTS {TABLE}_ai',
+    f'DROP TABLE IF EXISTS {TABLE}_fts',
+]
+
+
+def _has_fts5(connection):
+    """SQLite может быть собран без FTS5: проверяем, создается ли виртуальная таблица"""
+    try:
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            cursor.execute('CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x)')
+            cursor.execute('DROP TABLE temp.fts5_probe')
+    except DatabaseError:
+        return False
+    return True
+
+
+def _run(statements_by_vendor):
+    def run(apps, schema_editor):
+        connection = schema_editor.connection
+        if connection.vendor == 'sqlite' and not _has_fts5(connection):
+            # Без таблицы FTS5 api/search.py ищет через icontains
+            return
+        for statement in statements_by_vendor.get(connection.vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_submission_payload'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('lesson', 'Lesson'), ('challenge', 'Challenge'), ('submission', 'Submission')], max_length=20)),
+                ('object_id', models.CharField(max_length=100)),
+                ('title', models.CharField(max_length=300)),
+                ('body', models.TextField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_documents', to='api.course')),
+                ('lesson', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_documents', to='api.lesson')),
+                ('student', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='search_documents', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='searchdocument',
+            constraint=models.UniqueConstraint(fields=('kind', 'object_id'), name='unique_search_document'),
+        ),
+        # Индекс полнотекстового поиска зависит от базы (см. api/search.py)
+        migrations.RunPython(
+            _run({'postgresql': POSTGRES_FORWARD, 'sqlite': SQLITE_FORWARD}),
+            _run({'postgresql': POSTGRES_BACKWARD, 'sqlite': SQLITE_BACKWARD}),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.1 on 2026-10-19 17:02
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_task'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='result',
+            field=models.JSONField(blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True),
+        ),
+    ]
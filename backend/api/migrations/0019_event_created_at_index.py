@@ -0,0 +1,17 @@
+# Generated by Django 5.0.1 on 2026-10-19 17:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0018_catalogversion'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['created_at'], name='api_event_created_cb70e1_idx'),
+        ),
+    ]
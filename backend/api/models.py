@@ -1,5 +1,9 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.db.models import F, Value
+from django.db.models.functions import Least
 from django.contrib.auth.models import AbstractUser
+from django.utils import timezone
 
 
 class User(AbstractUser):
@@ -163,14 +167,49 @@ class Submission(models.Model):
     admin_comment = models.TextField(blank=True, null=True)  # Комментарий админа
     reviewed_by = models.ForeignKey(User, related_name='reviewed_submissions', on_delete=models.SET_NULL, null=True, blank=True, limit_choices_to={'role__in': ['admin', 'teacher']})
     reviewed_at = models.DateTimeField(blank=True, null=True)
+    has_payload = models.BooleanField(default=False)  # Полные вывод и ошибка - в SubmissionPayload
     submitted_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['-submitted_at']
+        indexes = [models.Index(fields=['lesson', 'student'])]
     
     def __str__(self):
         return f"Submission by {self.student.username} for {self.lesson.title} ({self.status})"
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Статус на момент загрузки: по нему сигналы определяют переходы pending -> approved/rejected
+        instance._loaded_status = instance.__dict__.get('status')
+        instance._loaded_reviewed_at = instance.__dict__.get('reviewed_at')
+        # Ссылки на загруженные значения (без копий): по ним сигналы определяют изменения
+        instance._loaded_code = instance.__dict__.get('code')
+        instance._loaded_output = instance.__dict__.get('output')
+        instance._loaded_error = instance.__dict__.get('error')
+        return instance
+    
+    def code_changed(self, created=False):
+        """Код изменился с момента загрузки (для новой записи - всегда)"""
+        return created or self.code != getattr(self, '_loaded_code', None)
+    
+    def payload_changed(self):
+        """Код, вывод или ошибка присвоены заново с момента загрузки"""
+        return (
+            self._state.adding
+            or self.code_changed()
+            # Список вывода сравнивается по ссылке: check_code присваивает новый
+            or self.output is not getattr(self, '_loaded_output', None)
+            or self.error != getattr(self, '_loaded_error', None)
+        )
+    
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Сигналы post_save уже отработали: следующее сохранение сравнивает с сохраненным
+        self._loaded_code = self.code
+        self._loaded_output = self.output
+        self._loaded_error = self.error
 
 
 class UserProgress(models.Model):
@@ -180,11 +219,330 @@ class UserProgress(models.Model):
     completed_lesson_ids = models.JSONField(default=list)  # Список ID завершенных уроков
     unlocked_lesson_ids = models.JSONField(default=list)  # Список ID разблокированных уроков (из StudentLesson)
     current_lesson_id = models.CharField(max_length=100, blank=True, null=True)
+    # Счетчики по спискам выше: пересчитываются в save() и пишутся тем же UPDATE
+    completed_count = models.PositiveIntegerField(default=0)
+    unlocked_count = models.PositiveIntegerField(default=0)
+    percent_complete = models.PositiveSmallIntegerField(default=0)  # 0-100 от числа уроков курса
+    last_activity_at = models.DateTimeField(blank=True, null=True)  # Последнее завершение или смена текущего урока
     updated_at = models.DateTimeField(auto_now=True)
     
+    COUNTER_FIELDS = ['completed_count', 'unlocked_count', 'percent_complete', 'last_activity_at']
+    
     class Meta:
         unique_together = [['user', 'course']]
+        indexes = [
+            # Обзор класса и "застрявшие на уроке N": фильтр по курсу и числу завершенных уроков
+            models.Index(fields=['course', 'completed_count', 'last_activity_at']),
+            models.Index(fields=['course', 'percent_complete']),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.course.title}"
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Состояние на момент загрузки: по нему save() определяет активность ученика
+        instance._loaded_activity = instance._activity_state()
+        return instance
+    
+    def _activity_state(self):
+        return (frozenset(self.__dict__.get('completed_lesson_ids') or []), self.__dict__.get('current_lesson_id'))
+    
+    def refresh_counters(self, lessons_total=None, now=None):
+        """
+        Пересчитывает счетчики (lessons_total - число уроков курса, если уже известно).
+        Без lessons_total процент пересчитывается только при смене числа завершенных уроков:
+        смену числа уроков курса учитывает refresh_course_percent.
+        """
+        completed_count = len(set(self.completed_lesson_ids or []))
+        if not completed_count:
+            self.percent_complete = 0
+        elif lessons_total is not None or self._state.adding or completed_count != self.completed_count:
+            if lessons_total is None:
+                lessons_total = Lesson.objects.filter(course_id=self.course_id).count()
+            self.percent_complete = min(100, completed_count * 100 // lessons_total) if lessons_total else 0
+        self.completed_count = completed_count
+        self.unlocked_count = len(set(self.unlocked_lesson_ids or []))
+        
+        state = self._activity_state()
+        if state != getattr(self, '_loaded_activity', (frozenset(), None)):
+            self.last_activity_at = now or timezone.now()
+            self._loaded_activity = state
+    
+    @classmethod
+    def refresh_course_percent(cls, course_id):
+        """Пересчитывает percent_complete всего курса одним UPDATE (после добавления или удаления урока)"""
+        lessons_total = Lesson.objects.filter(course_id=course_id).count()
+        if lessons_total:
+            percent = Least(F('completed_count') * 100 / lessons_total, 100)
+        else:
+            percent = Value(0)
+        return cls.objects.filter(course_id=course_id).update(percent_complete=percent)
+    
+    def save(self, *args, **kwargs):
+        self.refresh_counters()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | set(self.COUNTER_FIELDS)
+        super().save(*args, **kwargs)
+
 
+class Cohort(models.Model):
+    """Класс (группа учеников) учителя: разблокировка уроков и выдача заданий сразу всем"""
+    name = models.CharField(max_length=200)
+    teacher = models.ForeignKey(User, related_name='cohorts_taught', on_delete=models.CASCADE, limit_choices_to={'role__in': ['admin', 'teacher']})
+    students = models.ManyToManyField(User, related_name='cohorts', blank=True, limit_choices_to={'role': 'student'})
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['name']
+    
+    def __str__(self):
+        return f"{self.name} ({self.teacher.username})"
+
+
+class Event(models.Model):
+    """Событие для потоков Server-Sent Events (журнал для возобновления по Last-Event-ID)"""
+    channel = models.CharField(max_length=100)  # Например: submissions, student:42
+    event_type = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['channel', 'id']),
+            models.Index(fields=['created_at']),  # Ежечасная очистка журнала (prune_events)
+        ]
+    
+    def __str__(self):
+        return f"{self.channel}: {self.event_type} #{self.id}"
+
+
+class XPTransaction(models.Model):
+    """Начисление опыта (журнал). Один урок начисляет XP ученику только один раз"""
+    REASON_CHOICES = [
+        ('lesson', 'Lesson approved'),  # Задание урока одобрено
+    ]
+    
+    user = models.ForeignKey(User, related_name='xp_transactions', on_delete=models.CASCADE)
+    lesson = models.ForeignKey(Lesson, related_name='xp_transactions', on_delete=models.SET_NULL, null=True, blank=True)
+    course = models.ForeignKey(Course, related_name='xp_transactions', on_delete=models.SET_NULL, null=True, blank=True)
+    submission = models.ForeignKey(Submission, related_name='xp_transactions', on_delete=models.SET_NULL, null=True, blank=True)
+    amount = models.IntegerField()
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES, default='lesson')
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'lesson', 'reason'], name='unique_xp_per_lesson'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user.username} +{self.amount} XP ({self.reason})"
+
+
+class LessonStats(models.Model):
+    """Предрасчитанная аналитика по уроку (обновляется инкрементально, периодически сверяется пересчетом)"""
+    lesson = models.OneToOneField(Lesson, related_name='stats', on_delete=models.CASCADE, primary_key=True)
+    course = models.ForeignKey(Course, related_name='lesson_stats', on_delete=models.CASCADE)
+    submissions_count = models.IntegerField(default=0)
+    pending_count = models.IntegerField(default=0)
+    approved_count = models.IntegerField(default=0)
+    rejected_count = models.IntegerField(default=0)
+    students_attempted = models.IntegerField(default=0)  # Ученики, отправившие хотя бы одно задание
+    students_completed = models.IntegerField(default=0)  # Ученики, у которых задание одобрено
+    attempts_histogram = models.JSONField(default=dict)  # {число попыток: число учеников}
+    review_count = models.IntegerField(default=0)
+    review_seconds_total = models.BigIntegerField(default=0)  # Сумма времени от отправки до проверки
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Stats for {self.lesson_id}"
+
+
+class SubmissionFingerprint(models.Model):
+    """MinHash-подпись кода отправки для поиска похожих решений"""
+    submission = models.OneToOneField(Submission, related_name='fingerprint', on_delete=models.CASCADE, primary_key=True)
+    lesson = models.ForeignKey(Lesson, related_name='fingerprints', on_delete=models.CASCADE)
+    student = models.ForeignKey(User, related_name='fingerprints', on_delete=models.CASCADE)
+    signature = models.JSONField(default=list)  # Минимальные хэши по каждой перестановке
+    shingle_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"Fingerprint of {self.submission_id}"
+
+
+class SimilarityBucket(models.Model):
+    """Корзина LSH: отправки урока с одинаковой полосой (band) подписи"""
+    lesson = models.ForeignKey(Lesson, related_name='similarity_buckets', on_delete=models.CASCADE)
+    band = models.SmallIntegerField()
+    bucket = models.CharField(max_length=16)  # Хэш значений полосы
+    submission = models.ForeignKey(Submission, related_name='similarity_buckets', on_delete=models.CASCADE)
+    
+    class Meta:
+        indexes = [models.Index(fields=['lesson', 'band', 'bucket'])]
+        constraints = [
+            models.UniqueConstraint(fields=['submission', 'band'], name='unique_bucket_per_band'),
+        ]
+    
+    def __str__(self):
+        return f"{self.lesson_id}:{self.band}:{self.bucket}"
+
+
+class SubmissionPayload(models.Model):
+    """Полные вывод и ошибка отправки (сжатый JSON), если они не помещаются в строку Submission"""
+    CODEC_CHOICES = [
+        ('zlib', 'zlib'),
+        ('zstd', 'zstd'),
+    ]
+    
+    submission = models.OneToOneField(Submission, related_name='payload', on_delete=models.CASCADE, primary_key=True)
+    codec = models.CharField(max_length=10, choices=CODEC_CHOICES, default='zlib')
+    data = models.BinaryField()  # {"output": [...], "error": "..."}
+    raw_size = models.PositiveIntegerField(default=0)  # Размер JSON до сжатия, байт
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Payload of {self.submission_id} ({self.codec}, {len(self.data)} bytes)"
+
+
+class CodeBlob(models.Model):
+    """
+    Версия кода, адресуемая по sha256: полный текст или дельта к базовой версии.
+    Одинаковый код хранится один раз, близкие версии - как правки к предыдущей.
+    """
+    hash = models.CharField(max_length=64, primary_key=True)
+    base = models.ForeignKey('self', related_name='+', on_delete=models.PROTECT, blank=True, null=True)
+    depth = models.PositiveSmallIntegerField(default=0)  # Число дельт до полного текста
+    content = models.TextField(blank=True)  # Полный текст (если base пуст)
+    delta = models.JSONField(blank=True, null=True)  # [[начало, конец] строк base | "вставленный текст", ...]
+    size = models.PositiveIntegerField(default=0)  # Длина восстановленного текста
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.hash[:12]} ({'delta' if self.base_id else 'full'})"
+
+
+class SubmissionAttempt(models.Model):
+    """Попытка ученика по уроку: история версий кода отправки"""
+    student = models.ForeignKey(User, related_name='submission_attempts', on_delete=models.CASCADE)
+    lesson = models.ForeignKey(Lesson, related_name='submission_attempts', on_delete=models.CASCADE)
+    submission = models.ForeignKey(Submission, related_name='attempts', on_delete=models.SET_NULL, blank=True, null=True)
+    number = models.PositiveIntegerField()  # Номер попытки ученика по уроку (с 1)
+    code = models.ForeignKey(CodeBlob, related_name='attempts', on_delete=models.PROTECT)
+    output = models.JSONField(default=list)
+    error = models.TextField(blank=True, null=True)
+    passed_auto_check = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['student', 'lesson', 'number']
+        constraints = [
+            models.UniqueConstraint(fields=['student', 'lesson', 'number'], name='unique_attempt_number'),
+        ]
+    
+    def __str__(self):
+        return f"{self.student.username} - {self.lesson.title} #{self.number}"
+
+
+class SearchDocument(models.Model):
+    """
+    Документ полнотекстового поиска (урок, задание или код отправки).
+    Индекс поверх таблицы создается миграцией: tsvector + GIN на Postgres, FTS5 на SQLite.
+    """
+    KIND_CHOICES = [
+        ('lesson', 'Lesson'),
+        ('challenge', 'Challenge'),
+        ('submission', 'Submission'),
+    ]
+    
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.CharField(max_length=100)
+    course = models.ForeignKey(Course, related_name='search_documents', on_delete=models.CASCADE)
+    lesson = models.ForeignKey(Lesson, related_name='search_documents', on_delete=models.CASCADE)
+    student = models.ForeignKey(User, related_name='search_documents', on_delete=models.CASCADE, blank=True, null=True)
+    title = models.CharField(max_length=300)
+    body = models.TextField()
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='unique_search_document'),
+        ]
+    
+    def __str__(self):
+        return f"{self.kind}:{self.object_id}"
+
+
+class Task(models.Model):
+    """
+    Фоновая задача (api/tasks.py). Выполняется командой run_worker; после
+    max_attempts неудачных попыток остается со статусом dead для разбора.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),  # Ожидает выполнения (в том числе повтора)
+        ('running', 'Running'),  # Взята воркером
+        ('done', 'Done'),
+        ('dead', 'Dead'),  # Попытки исчерпаны
+    ]
+    
+    name = models.CharField(max_length=200)  # Путь к функции: api.tasks.publish_course_bundle
+    kwargs = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True, default='')
+    locked_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True, default='')
+    result = models.JSONField(blank=True, null=True, encoder=DjangoJSONEncoder)  # Что вернула задача (отчет)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-id']
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='task_status_run_after_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+
+class IdempotencyKey(models.Model):
+    """
+    Запрос с заголовком Idempotency-Key (api/idempotency.py). Уникальный key
+    гарантирует, что из одновременных дублей на любых воркерах выполнится один.
+    """
+    STATE_CHOICES = [
+        ('in_flight', 'In flight'),  # Первый запрос еще выполняется
+        ('done', 'Done'),  # Ответ сохранен для повторов
+    ]
+    
+    key = models.CharField(max_length=64, unique=True)  # sha256 от владельца, метода, пути и ключа
+    fingerprint = models.CharField(max_length=64)  # sha256 тела запроса
+    state = models.CharField(max_length=20, choices=STATE_CHOICES, default='in_flight')
+    status_code = models.IntegerField(blank=True, null=True)
+    data = models.JSONField(blank=True, null=True, encoder=DjangoJSONEncoder)
+    locked_until = models.DateTimeField()  # Выполнение дольше считается оборванным
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.key[:12]} ({self.state})"
+
+
+class CatalogVersion(models.Model):
+    """
+    Версия каталога курсов (api/catalog.py): одна строка. Общий кэш хранит
+    только ее копию, поэтому после перезапуска или вытеснения кэша версия не
+    откатывается к старым ключам.
+    """
+    version = models.PositiveIntegerField(default=1)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"catalog v{self.version}"
@@ -0,0 +1,143 @@
+"""
+Ограничение размера и сжатое хранение кода, вывода и ошибки отправок.
+
+Перед сохранением Submission (сигнал pre_save) код, вывод и ошибка
+обрезаются до SUBMISSION_LIMITS с явной пометкой в конце. Если вывод или
+ошибка больше лимитов INLINE_*, в строке Submission остается только их
+начало (с пометкой), а полные значения сохраняются сжатыми в
+SubmissionPayload (zstd, если установлен zstandard, иначе zlib). Списки и
+проверка отправок читают только небольшие строки Submission; полный
+вывод отдает SubmissionViewSet.payload.
+"""
+import json
+import zlib
+
+from django.conf import settings
+
+from .models import SubmissionPayload
+
+try:
+    import zstandard
+except ImportError:  # zstandard необязателен: без него используется zlib
+    zstandard = None
+
+
+def _setting(name, default):
+    return getattr(settings, 'SUBMISSION_LIMITS', {}).get(name, default)
+
+
+def cap_code(code):
+    limit = _setting('CODE_MAX_CHARS', 50000)
+    if code is None or len(code) <= limit:
+        return code
+    return f'{code[:limit]}\n-- [код обрезан сервером: отброшено {len(code) - limit} символов]'
+
+
+def cap_error(error, limit=None):
+    limit = limit or _setting('ERROR_MAX_CHARS', 20000)
+    if error is None or len(error) <= limit:
+        return error
+    return f'{error[:limit]}\n… [ошибка обрезана: отброшено {len(error) - limit} символов]'
+
+
+def _cap_lines(output, max_lines, max_chars, marker):
+    """Первые строки вывода в пределах max_lines и max_chars (с пометкой, если что-то отброшено)"""
+    line_limit = _setting('OUTPUT_LINE_MAX_CHARS', 1000)
+    kept = []
+    total = 0
+    for line in output[:max_lines]:
+        if isinstance(line, str) and len(line) > line_limit:
+            line = line[:line_limit] + '…'
+        total += len(str(line))
+        if total > max_chars:
+            break
+        kept.append(line)
+    if len(kept) < len(output):
+        kept.append(marker.format(shown=len(kept), total=len(output)))
+    return kept
+
+
+def cap_output(output):
+    if isinstance(output, str):
+        return cap_error(output, _setting('OUTPUT_MAX_CHARS', 200000))
+    if not isinstance(output, list):
+        return output
+    return _cap_lines(
+        output,
+        _setting('OUTPUT_MAX_LINES', 5000),
+        _setting('OUTPUT_MAX_CHARS', 200000),
+        '… [вывод обрезан сервером: сохранено {shown} из {total} строк]',
+    )
+
+
+def _inline_output(output):
+    if isinstance(output, str):
+        return cap_error(output, _setting('INLINE_OUTPUT_CHARS', 4000))
+    if not isinstance(output, list):
+        return output
+    return _cap_lines(
+        output,
+        _setting('INLINE_OUTPUT_LINES', 50),
+        _setting('INLINE_OUTPUT_CHARS', 4000),
+        '… [показано {shown} из {total} строк, полный вывод: payload]',
+    )
+
+
+def compact(submission):
+    """
+    Обрезает код, вывод и ошибку отправки до лимитов и оставляет в строке только
+    их начало. Возвращает полные {"output", "error"} для SubmissionPayload или None.
+    """
+    submission.code = cap_code(submission.code)
+    output = cap_output(submission.output)
+    error = cap_error(submission.error)
+
+    inline_output = _inline_output(output)
+    inline_error = cap_error(error, _setting('INLINE_ERROR_CHARS', 2000))
+    submission.output = inline_output
+    submission.error = inline_error
+    submission.has_payload = inline_output != output or inline_error != error
+    if submission.has_payload:
+        return {'output': output, 'error': error}
+    return None
+
+
+def encode(payload):
+    """(codec, сжатые данные, размер JSON)"""
+    raw = json.dumps(payload, ensure_ascii=False).encode()
+    if zstandard is not None:
+        return 'zstd', zstandard.ZstdCompressor(level=10).compress(raw), len(raw)
+    return 'zlib', zlib.compress(raw, 6), len(raw)
+
+
+def decode(codec, data):
+    data = bytes(data)
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError('Для чтения payload нужен пакет zstandard')
+        raw = zstandard.ZstdDecompressor().decompress(data)
+    else:
+        raw = zlib.decompress(data)
+    return json.loads(raw)
+
+
+def store(submission, payload):
+    """Сохраняет (или удаляет, если payload пуст) полные вывод и ошибку отправки"""
+    if payload is None:
+        SubmissionPayload.objects.filter(submission_id=submission.pk).delete()
+        return None
+    codec, data, raw_size = encode(payload)
+    row, _ = SubmissionPayload.objects.update_or_create(
+        submission_id=submission.pk,
+        defaults={'codec': codec, 'data': data, 'raw_size': raw_size},
+    )
+    return row
+
+
+def full_payload(submission):
+    """Полные вывод и ошибка отправки (из SubmissionPayload или из самой строки)"""
+    if submission.has_payload:
+        row = SubmissionPayload.objects.filter(submission_id=submission.pk).first()
+        if row is not None:
+            return decode(row.codec, row.data)
+    return {'output': submission.output, 'error': submission.error}
@@ -0,0 +1,17 @@
+from rest_framework.permissions import BasePermission
+
+
+class IsAdminRole(BasePermission):
+    """Доступ только для админов (роль admin или is_staff)"""
+
+    def has_permission(self, request, view):
+        user = request.user
+        return bool(user and user.is_authenticated and (user.role == 'admin' or user.is_staff))
+
+
+class IsTeacherOrAdmin(BasePermission):
+    """Доступ для учителей и админов"""
+
+    def has_permission(self, request, view):
+        user = request.user
+        return bool(user and user.is_authenticated and user.role in ['admin', 'teacher'])
@@ -0,0 +1,280 @@
+"""
+Сверка StudentLesson и UserProgress.
+
+Списки UserProgress.unlocked_lesson_ids/completed_lesson_ids обновляются
+побочными эффектами StudentLesson.save() и действий complete. QuerySet.update(),
+массовые действия админки и сбои этот путь обходят, и данные расходятся.
+
+Сверка идет порциями по id (keyset), без длинных блокировок. Для порции
+прогрессов читаются StudentLesson тех же учеников и курсов, а расхождения
+считаются в памяти. Затем короткая транзакция блокирует только строки,
+которые нужно изменить, пересчитывает по ним расхождения заново (ученик
+мог успеть что-то сделать) и исправляет их массовыми запросами.
+
+Правила те же, что у save():
+- урок разблокирован или завершен в StudentLesson -> он есть в unlocked_lesson_ids;
+- StudentLesson есть, но урок закрыт и не завершен -> его нет в unlocked_lesson_ids;
+- урок завершен в StudentLesson -> он есть в completed_lesson_ids;
+- урок есть в completed_lesson_ids -> его StudentLesson (если есть) завершен,
+  завершение не отменяется;
+- id уроков, которых больше нет в курсе, убираются из обоих списков;
+- счетчики completed_count/unlocked_count/percent_complete пересчитываются.
+Если у StudentLesson нет UserProgress по курсу, прогресс создается.
+"""
+from collections import defaultdict, namedtuple
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Lesson, StudentLesson, UserProgress
+
+# Сколько изменений попадает в отчет поименно (счетчики считаются всегда)
+REPORT_LIMIT = 100
+
+# Строки StudentLesson читаются кортежами: на миллионах строк создание моделей дороже самой сверки
+StudentLessonRow = namedtuple('StudentLessonRow', ['pk', 'is_unlocked', 'is_completed'])
+
+_PROGRESS_FIELDS = [
+    'id', 'user_id', 'course_id', 'completed_lesson_ids', 'unlocked_lesson_ids', 'current_lesson_id',
+    'completed_count', 'unlocked_count', 'percent_complete', 'last_activity_at',
+]
+_TOTALS = [
+    'progress_checked', 'progress_changed', 'progress_created', 'unlocked_added', 'unlocked_removed',
+    'completed_added', 'unknown_removed', 'counters_fixed', 'lessons_completed',
+]
+
+
+class Report:
+    """Итоги сверки: счетчики и первые REPORT_LIMIT измененных прогрессов"""
+
+    def __init__(self):
+        self.totals = dict.fromkeys(_TOTALS, 0)
+        self.changes = []
+
+    def add(self, change):
+        for name in _TOTALS:
+            if name in change:
+                value = change[name]
+                self.totals[name] += len(value) if isinstance(value, list) else value
+        if len(self.changes) < REPORT_LIMIT:
+            self.changes.append(change)
+
+    def as_dict(self):
+        return {**self.totals, 'changes': self.changes}
+
+
+def _dedupe(ids, valid):
+    seen = set()
+    result = []
+    for lesson_id in ids or []:
+        if lesson_id in valid and lesson_id not in seen:
+            seen.add(lesson_id)
+            result.append(lesson_id)
+    return result
+
+
+def _diff(progress, student_lessons, course_lessons):
+    """
+    Исправляет progress в памяти по StudentLesson ученика в курсе ({lesson_id: StudentLesson}).
+    Возвращает описание изменений (пустое, если расхождений нет) и id StudentLesson для завершения.
+    """
+    original = list(progress.completed_lesson_ids or []), list(progress.unlocked_lesson_ids or [])
+    completed = _dedupe(original[0], course_lessons)
+    unlocked = _dedupe(original[1], course_lessons)
+    unknown = sorted({lesson_id for lesson_id in original[0] + original[1] if lesson_id not in course_lessons}, key=str)
+
+    completed_added = []
+    for lesson_id, student_lesson in student_lessons.items():
+        if student_lesson.is_completed and lesson_id not in completed:
+            completed.append(lesson_id)
+            completed_added.append(lesson_id)
+    completed_set = set(completed)
+
+    unlocked_added = []
+    unlocked_removed = []
+    to_complete = []
+    for lesson_id, student_lesson in student_lessons.items():
+        is_completed = student_lesson.is_completed or lesson_id in completed_set
+        if not student_lesson.is_completed and is_completed:
+            to_complete.append(student_lesson.pk)
+        if (student_lesson.is_unlocked or is_completed) and lesson_id not in unlocked:
+            unlocked.append(lesson_id)
+            unlocked_added.append(lesson_id)
+        elif not student_lesson.is_unlocked and not is_completed and lesson_id in unlocked:
+            unlocked.remove(lesson_id)
+            unlocked_removed.append(lesson_id)
+
+    counters = (progress.completed_count, progress.unlocked_count, progress.percent_complete)
+    progress.completed_lesson_ids = completed
+    progress.unlocked_lesson_ids = unlocked
+    # Сверка - не активность ученика: last_activity_at не трогаем
+    progress._loaded_activity = progress._activity_state()
+    progress.refresh_counters(len(course_lessons))
+    counters_fixed = counters != (progress.completed_count, progress.unlocked_count, progress.percent_complete)
+
+    change = {}
+    if (completed, unlocked) != original or counters_fixed or to_complete:
+        change = {
+            'user': progress.user_id,
+            'course': progress.course_id,
+            'unlocked_added': unlocked_added,
+            'unlocked_removed': unlocked_removed,
+            'completed_added': completed_added,
+            'unknown_removed': unknown,
+            'counters_fixed': int(counters_fixed),
+            'lessons_completed': len(to_complete),
+        }
+    return change, to_complete
+
+
+class Lessons:
+    """Уроки курсов в памяти: их немного по сравнению с прогрессами"""
+
+    def __init__(self, course_ids=None):
+        lessons = Lesson.objects.all()
+        if course_ids is not None:
+            lessons = lessons.filter(course_id__in=course_ids)
+        self.course_of = {}
+        self.order_of = {}
+        self.by_course = defaultdict(set)
+        for lesson_id, course_id, order in lessons.values_list('id', 'course_id', 'order'):
+            self.course_of[lesson_id] = course_id
+            self.order_of[lesson_id] = order
+            self.by_course[course_id].add(lesson_id)
+
+    def student_lessons(self, pairs):
+        """{(student_id, course_id): {lesson_id: StudentLesson}} для пар ученик-курс"""
+        lesson_ids = set().union(*(self.by_course[course_id] for _, course_id in pairs))
+        rows = StudentLesson.objects.filter(
+            student_id__in={student_id for student_id, _ in pairs}, lesson_id__in=lesson_ids,
+        ).values_list('id', 'student_id', 'lesson_id', 'is_unlocked', 'is_completed')
+        result = defaultdict(dict)
+        for pk, student_id, lesson_id, is_unlocked, is_completed in rows:
+            key = (student_id, self.course_of[lesson_id])
+            if key in pairs:
+                result[key][lesson_id] = StudentLessonRow(pk, is_unlocked, is_completed)
+        return result
+
+
+class Reconciler:
+    def __init__(self, chunk=500, dry_run=False, course_id=None, user_id=None):
+        self.chunk = chunk
+        self.dry_run = dry_run
+        self.course_id = course_id
+        self.user_id = user_id
+        self.report = Report()
+        self.lessons = Lessons()
+
+    def create_missing_progress(self):
+        """StudentLesson (разблокированные или завершенные) без UserProgress по курсу"""
+        opened = StudentLesson.objects.filter(Q(is_unlocked=True) | Q(is_completed=True))
+        if self.user_id:
+            opened = opened.filter(student_id=self.user_id)
+        if self.course_id:
+            opened = opened.filter(lesson__course_id=self.course_id)
+        opened = opened.order_by('id').values_list('id', 'student_id', 'lesson_id')
+
+        last_id = 0
+        while True:
+            chunk = list(opened.filter(id__gt=last_id)[:self.chunk])
+            if not chunk:
+                break
+            last_id = chunk[-1][0]
+            # Урок, созданный после начала сверки, попадет в следующий запуск
+            pairs = {
+                (student_id, self.lessons.course_of[lesson_id])
+                for _, student_id, lesson_id in chunk if lesson_id in self.lessons.course_of
+            }
+            existing = set(UserProgress.objects.filter(
+                user_id__in={student_id for student_id, _ in pairs},
+                course_id__in={course_id for _, course_id in pairs},
+            ).values_list('user_id', 'course_id'))
+            missing = pairs - existing
+            if not missing:
+                continue
+
+            created = []
+            for key, student_lessons in self.lessons.student_lessons(missing).items():
+                progress = UserProgress(user_id=key[0], course_id=key[1], completed_lesson_ids=[], unlocked_lesson_ids=[])
+                change, _ = _diff(progress, student_lessons, self.lessons.by_course[key[1]])
+                unlocked = progress.unlocked_lesson_ids
+                progress.current_lesson_id = max(unlocked, key=self.lessons.order_of.get) if unlocked else None
+                created.append(progress)
+                self.report.add({**change, 'progress_created': 1})
+            if created and not self.dry_run:
+                # Параллельный запрос мог создать прогресс сам: его сверит основной проход
+                UserProgress.objects.bulk_create(created, ignore_conflicts=True)
+
+    def _apply(self, changed_ids):
+        """Повторная сверка изменяемых строк под блокировкой и запись исправлений"""
+        with transaction.atomic():
+            progresses = list(UserProgress.objects.select_for_update().filter(pk__in=changed_ids).only(*_PROGRESS_FIELDS))
+            pairs = {(progress.user_id, progress.course_id) for progress in progresses}
+            # Свежий список уроков: урок, добавленный во время сверки, не должен считаться удаленным
+            lessons = Lessons({course_id for _, course_id in pairs})
+            student_lessons = lessons.student_lessons(pairs)
+            now = timezone.now()
+            changed = []
+            to_complete = []
+            for progress in progresses:
+                key = (progress.user_id, progress.course_id)
+                change, complete_ids = _diff(progress, student_lessons.get(key, {}), lessons.by_course[progress.course_id])
+                if not change:
+                    continue
+                progress.updated_at = now
+                changed.append(progress)
+                to_complete.extend(complete_ids)
+                self.report.add({**change, 'progress_changed': 1})
+            if changed:
+                UserProgress.objects.bulk_update(
+                    changed, ['completed_lesson_ids', 'unlocked_lesson_ids', 'updated_at'] + UserProgress.COUNTER_FIELDS,
+                )
+            if to_complete:
+                # Условие is_completed=False: не трогаем completed_at уже завершенных уроков
+                StudentLesson.objects.filter(pk__in=to_complete, is_completed=False).update(
+                    is_completed=True, completed_at=now, updated_at=now,
+                )
+
+    def reconcile_progress(self):
+        progresses = UserProgress.objects.only(*_PROGRESS_FIELDS).order_by('id')
+        if self.user_id:
+            progresses = progresses.filter(user_id=self.user_id)
+        if self.course_id:
+            progresses = progresses.filter(course_id=self.course_id)
+
+        last_id = 0
+        while True:
+            chunk = list(progresses.filter(id__gt=last_id)[:self.chunk])
+            if not chunk:
+                break
+            last_id = chunk[-1].id
+            self.report.totals['progress_checked'] += len(chunk)
+
+            student_lessons = self.lessons.student_lessons({(progress.user_id, progress.course_id) for progress in chunk})
+            changed_ids = []
+            for progress in chunk:
+                key = (progress.user_id, progress.course_id)
+                change, _ = _diff(progress, student_lessons.get(key, {}), self.lessons.by_course[progress.course_id])
+                if not change:
+                    continue
+                if self.dry_run:
+                    self.report.add({**change, 'progress_changed': 1})
+                else:
+                    changed_ids.append(progress.pk)
+            if changed_ids:
+                self._apply(changed_ids)
+
+    def run(self):
+        self.create_missing_progress()
+        self.reconcile_progress()
+        return {**self.report.as_dict(), 'dry_run': self.dry_run}
+
+
+def reconcile(chunk=500, dry_run=False, course_id=None, user_id=None):
+    """
+    Сверяет StudentLesson и UserProgress (все или одного курса/ученика).
+    Возвращает отчет: счетчики исправлений и первые REPORT_LIMIT изменений.
+    """
+    reconciler = Reconciler(chunk=chunk, dry_run=dry_run, course_id=course_id, user_id=user_id)
+    return reconciler.run()
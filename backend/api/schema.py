@@ -0,0 +1,56 @@
+"""
+Готовая схема OpenAPI для продакшена.
+
+Схема генерируется один раз при сборке образа
+(SCHEMA_LIVE=True python manage.py spectacular --file schema/openapi.yaml)
+и отдается с диска, без интроспекции ViewSet и сериализаторов на запросе
+и без загрузки drf_spectacular в воркерах. В разработке (SCHEMA_LIVE)
+используются живые представления drf_spectacular.
+"""
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse
+from django.views.decorators.http import require_GET
+
+FILES = {
+    'yaml': ('openapi.yaml', 'application/vnd.oai.openapi'),
+    'json': ('openapi.json', 'application/vnd.oai.openapi+json'),
+}
+
+SWAGGER_UI_DIST = 'https://cdn.jsdelivr.net/npm/swagger-ui-dist@5'
+
+DOCS_HTML = """<!DOCTYPE html>
+<html>
+<head>
+  <title>{title}</title>
+  <meta charset="utf-8">
+  <link rel="stylesheet" href="{dist}/swagger-ui.css">
+</head>
+<body>
+  <div id="swagger-ui"></div>
+  <script src="{dist}/swagger-ui-bundle.js"></script>
+  <script>SwaggerUIBundle({{url: "{schema_url}", dom_id: "#swagger-ui"}})</script>
+</body>
+</html>
+"""
+
+
+@require_GET
+def schema_file(request):
+    """Схема с диска (?format=json для JSON, по умолчанию YAML)"""
+    name, content_type = FILES.get(request.GET.get('format'), FILES['yaml'])
+    path = settings.SCHEMA_DIR / name
+    if not path.exists():
+        raise Http404('Схема не собрана: выполните manage.py spectacular --file')
+    response = FileResponse(open(path, 'rb'), content_type=content_type)
+    response['Cache-Control'] = 'public, max-age=300'
+    return response
+
+
+@require_GET
+def schema_docs(request):
+    """Swagger UI поверх готовой схемы"""
+    return HttpResponse(DOCS_HTML.format(
+        title=settings.SPECTACULAR_SETTINGS.get('TITLE', 'API'),
+        dist=SWAGGER_UI_DIST,
+        schema_url=request.build_absolute_uri('/api/schema/'),
+    ))
@@ -0,0 +1,194 @@
+"""
+Полнотекстовый поиск по урокам, заданиям и коду отправок.
+
+Документы (SearchDocument) обновляются сигналами после сохранения уроков,
+заданий и отправок. Сам индекс строит база данных (миграция 0014_search):
+- Postgres: генерируемая колонка search_vector (tsvector, конфигурация
+  simple - без стемминга, чтобы имена из кода Lua искались как есть)
+  и GIN индекс, ранжирование ts_rank_cd;
+- SQLite: таблица FTS5 с внешним содержимым и триггерами, ранжирование bm25.
+На остальных базах (или без FTS5) поиск выполняется через icontains.
+
+Запрос: слова ищутся все вместе (AND), текст в кавычках - как фраза:
+"while true" находит именно цикл while true.
+"""
+import re
+
+from django.db import connections, router
+
+from .models import Lesson, SearchDocument
+
+TABLE = SearchDocument._meta.db_table
+FTS_TABLE = f'{TABLE}_fts'
+MAX_TERMS = 10
+SNIPPET_MARK = '**'
+
+_TERM_RE = re.compile(r'"([^"]*)"|(\w+)', re.UNICODE)
+_fts_tables = {}
+
+
+def parse_query(query):
+    """Список групп слов: фраза из кавычек - одна группа, отдельное слово - группа из одного"""
+    groups = []
+    for phrase, word in _TERM_RE.findall(query or ''):
+        words = re.findall(r'\w+', phrase, re.UNICODE) if phrase else [word]
+        if words:
+            groups.append([w.lower() for w in words])
+    return groups[:MAX_TERMS]
+
+
+def _to_tsquery(groups):
+    # Слова состоят только из \w, экранирование кавычками защищает от синтаксиса tsquery
+    return ' & '.join(' <-> '.join(f"'{word}'" for word in words) for words in groups)
+
+
+def _to_fts5(groups):
+    return ' '.join('"' + ' '.join(words) + '"' for words in groups)
+
+
+def _backend(alias):
+    connection = connections[alias]
+    if connection.vendor == 'postgresql':
+        return 'postgres'
+    if connection.vendor == 'sqlite':
+        if alias not in _fts_tables:
+            _fts_tables[alias] = FTS_TABLE in connection.introspection.table_names()
+        if _fts_tables[alias]:
+            return 'fts5'
+    return 'like'
+
+
+def _filters(kinds, course_id, params):
+    sql = ''
+    if kinds:
+        sql += f' AND d.kind IN ({", ".join(["%s"] * len(kinds))})'
+        params.extend(kinds)
+    if course_id:
+        sql += ' AND d.course_id = %s'
+        params.append(course_id)
+    return sql
+
+
+_FIELDS = ['id', 'kind', 'object_id', 'course_id', 'lesson_id', 'student_id', 'title']
+_COLUMNS = ', '.join(f'd.{field}' for field in _FIELDS)
+
+
+def _search_postgres(groups, kinds, course_id, limit, alias):
+    tsquery = _to_tsquery(groups)
+    params = [tsquery, tsquery]
+    where = _filters(kinds, course_id, params)
+    params.append(limit)
+    hit_columns = ', '.join(f'hits.{field}' for field in _FIELDS)
+    # ts_headline дорогой: считается только для отобранных limit строк
+    return SearchDocument.objects.using(alias).raw(
+        f"""
+        SELECT {hit_columns}, hits.score,
+            ts_headline('simple', d.body, to_tsquery('simple', %s),
+                'StartSel={SNIPPET_MARK}, StopSel={SNIPPET_MARK}, MaxFragments=2, MinWords=5, MaxWords=15') AS snippet
+        FROM (
+            SELECT {_COLUMNS}, ts_rank_cd(d.search_vector, query) AS score
+            FROM {TABLE} d, to_tsquery('simple', %s) query
+            WHERE d.search_vector @@ query{where}
+            ORDER BY score DESC, d.id DESC
+            LIMIT %s
+        ) hits
+        JOIN {TABLE} d ON d.id = hits.id
+        ORDER BY hits.score DESC, hits.id DESC
+        """,
+        params,
+    )
+
+
+def _search_fts5(groups, kinds, course_id, limit, alias):
+    params = [_to_fts5(groups)]
+    where = _filters(kinds, course_id, params)
+    params.append(limit)
+    # bm25: чем меньше, тем лучше; совпадение в заголовке весит больше
+    return SearchDocument.objects.using(alias).raw(
+        f"""
+        SELECT {_COLUMNS}, -bm25({FTS_TABLE}, 10.0, 1.0) AS score,
+            snippet({FTS_TABLE}, 1, '{SNIPPET_MARK}', '{SNIPPET_MARK}', '…', 12) AS snippet
+        FROM {FTS_TABLE}
+        JOIN {TABLE} d ON d.id = {FTS_TABLE}.rowid
+        WHERE {FTS_TABLE} MATCH %s{where}
+        ORDER BY bm25({FTS_TABLE}, 10.0, 1.0), d.id DESC
+        LIMIT %s
+        """,
+        params,
+    )
+
+
+def _search_like(groups, kinds, course_id, limit, alias):
+    queryset = SearchDocument.objects.using(alias).defer('body')
+    for words in groups:
+        queryset = queryset.filter(body__icontains=' '.join(words))
+    if kinds:
+        queryset = queryset.filter(kind__in=kinds)
+    if course_id:
+        queryset = queryset.filter(course_id=course_id)
+    results = list(queryset.order_by('-updated_at')[:limit])
+    for document in results:
+        document.score = 0.0
+        document.snippet = ''
+    return results
+
+
+SEARCHERS = {
+    'postgres': _search_postgres,
+    'fts5': _search_fts5,
+    'like': _search_like,
+}
+
+
+def search(query, kinds=None, course_id=None, limit=20):
+    """Ранжированный список SearchDocument (с атрибутами score и snippet)"""
+    groups = parse_query(query)
+    if not groups:
+        return []
+    alias = router.db_for_read(SearchDocument) or 'default'
+    return list(SEARCHERS[_backend(alias)](groups, kinds, course_id, limit, alias))
+
+
+def backend_name():
+    return _backend(router.db_for_read(SearchDocument) or 'default')
+
+
+# Индексация
+
+def _upsert(kind, object_id, **fields):
+    SearchDocument.objects.update_or_create(kind=kind, object_id=str(object_id), defaults=fields)
+
+
+def index_lesson(lesson):
+    _upsert(
+        'lesson', lesson.pk,
+        course_id=lesson.course_id, lesson=lesson, title=lesson.title,
+        body=f'{lesson.description}\n{lesson.content}',
+    )
+    # Заголовок документа задания - название урока
+    SearchDocument.objects.filter(kind='challenge', lesson=lesson).exclude(title=lesson.title).update(title=lesson.title)
+
+
+def index_challenge(challenge):
+    lesson = Lesson.objects.only('id', 'course_id', 'title').get(pk=challenge.lesson_id)
+    hints = '\n'.join(str(hint) for hint in challenge.hints or [])
+    _upsert(
+        'challenge', challenge.pk,
+        course_id=lesson.course_id, lesson=lesson, title=lesson.title,
+        body=f'{challenge.instructions}\n{hints}',
+    )
+
+
+def index_submission_code(submission):
+    course_id = Lesson.objects.filter(pk=submission.lesson_id).values_list('course_id', flat=True).first()
+    if course_id is None:
+        return
+    _upsert(
+        'submission', submission.pk,
+        course_id=course_id, lesson_id=submission.lesson_id, student_id=submission.student_id,
+        title='', body=submission.code or '',
+    )
+
+
+def remove_document(kind, object_id):
+    SearchDocument.objects.filter(kind=kind, object_id=str(object_id)).delete()
@@ -1,8 +1,11 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from django.db import models
+from .analytics import summarize
+from .bundles import bundle_url, bundle_urls
 from .models import (
     Course, Lesson, Challenge, UserProgress,
-    StudentLesson, StudentChallenge, Submission
+    StudentLesson, StudentChallenge, Submission, LessonStats, Cohort, SubmissionAttempt, Task
 )
 
 User = get_user_model()
@@ -145,13 +148,31 @@ class CourseSerializer(serializers.ModelSerializer):
         return LessonSerializer(lessons, many=True, context=self.context).data
 
 
+class CourseListListSerializer(serializers.ListSerializer):
+    """Список курсов: URL бандлов всей страницы находятся одним запросом к кэшу"""
+    
+    def to_representation(self, data):
+        courses = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        self.context['bundle_urls'] = bundle_urls([course.id for course in courses])
+        return super().to_representation(courses)
+
+
 class CourseListSerializer(serializers.ModelSerializer):
     """Упрощенный сериализатор для списка курсов"""
     lessons_count = serializers.IntegerField(source='lessons.count', read_only=True)
+    bundle_url = serializers.SerializerMethodField()
     
     class Meta:
         model = Course
-        fields = ['id', 'title', 'description', 'thumbnail_url', 'lessons_count']
+        fields = ['id', 'title', 'description', 'thumbnail_url', 'lessons_count', 'bundle_url']
+        list_serializer_class = CourseListListSerializer
+    
+    def get_bundle_url(self, obj):
+        """Статический бандл курса (отдается nginx без обращения к API)"""
+        urls = self.context.get('bundle_urls')
+        if urls is not None and obj.id in urls:
+            return urls[obj.id]
+        return bundle_url(obj.id)
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -171,9 +192,12 @@ class UserProgressSerializer(serializers.ModelSerializer):
         model = UserProgress
         fields = [
             'id', 'user', 'course', 'course_title', 
-            'completed_lesson_ids', 'unlocked_lesson_ids', 'current_lesson_id', 'updated_at'
+            'completed_lesson_ids', 'unlocked_lesson_ids', 'current_lesson_id',
+            'completed_count', 'unlocked_count', 'percent_complete', 'last_activity_at', 'updated_at'
+        ]
+        read_only_fields = [
+            'id', 'completed_count', 'unlocked_count', 'percent_complete', 'last_activity_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'updated_at']
 
 
 class UserProgressCreateUpdateSerializer(serializers.ModelSerializer):
@@ -247,11 +271,11 @@ class SubmissionSerializer(serializers.ModelSerializer):
         model = Submission
         fields = [
             'id', 'student', 'student_username', 'lesson', 'lesson_title',
-            'code', 'output', 'error', 'passed_auto_check',
+            'code', 'output', 'error', 'has_payload', 'passed_auto_check',
             'status', 'admin_comment', 'reviewed_by', 'reviewed_by_username',
             'reviewed_at', 'submitted_at', 'updated_at'
         ]
-        read_only_fields = ['submitted_at', 'updated_at']
+        read_only_fields = ['has_payload', 'submitted_at', 'updated_at']
 
 
 class SubmissionCreateSerializer(serializers.ModelSerializer):
@@ -262,3 +286,60 @@ class SubmissionCreateSerializer(serializers.ModelSerializer):
             'student', 'lesson', 'code', 'output', 'error', 'passed_auto_check'
         ]
 
+
+class LessonStatsSerializer(serializers.ModelSerializer):
+    """Сериализатор для LessonStats (сырые счетчики + производные показатели)"""
+    lesson_title = serializers.CharField(source='lesson.title', read_only=True)
+    lesson_order = serializers.IntegerField(source='lesson.order', read_only=True)
+    summary = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = LessonStats
+        fields = [
+            'lesson', 'lesson_title', 'lesson_order', 'course',
+            'submissions_count', 'pending_count', 'approved_count', 'rejected_count',
+            'students_attempted', 'students_completed', 'attempts_histogram',
+            'summary', 'updated_at'
+        ]
+        read_only_fields = fields
+    
+    def get_summary(self, obj):
+        return summarize([obj])
+
+
+class SubmissionAttemptSerializer(serializers.ModelSerializer):
+    """Сериализатор для SubmissionAttempt (код - только по запросу, см. SubmissionViewSet.attempts)"""
+    code_hash = serializers.CharField(source='code_id', read_only=True)
+    code_size = serializers.IntegerField(source='code.size', read_only=True)
+    
+    class Meta:
+        model = SubmissionAttempt
+        fields = [
+            'id', 'number', 'submission', 'code_hash', 'code_size',
+            'output', 'error', 'passed_auto_check', 'created_at'
+        ]
+        read_only_fields = fields
+
+
+class CohortSerializer(serializers.ModelSerializer):
+    """Сериализатор для Cohort (учитель - текущий пользователь при создании)"""
+    teacher_username = serializers.CharField(source='teacher.username', read_only=True)
+    students = serializers.PrimaryKeyRelatedField(
+        many=True, required=False, queryset=User.objects.filter(role='student')
+    )
+    
+    class Meta:
+        model = Cohort
+        fields = ['id', 'name', 'teacher', 'teacher_username', 'students', 'created_at', 'updated_at']
+        read_only_fields = ['teacher', 'created_at', 'updated_at']
+
+
+class TaskSerializer(serializers.ModelSerializer):
+    """Сериализатор для фоновой задачи (только чтение)"""
+    class Meta:
+        model = Task
+        fields = [
+            'id', 'name', 'kwargs', 'status', 'attempts', 'max_attempts', 'run_after',
+            'locked_by', 'locked_at', 'last_error', 'result', 'created_at', 'updated_at'
+        ]
+        read_only_fields = fields
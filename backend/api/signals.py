@@ -0,0 +1,176 @@
+"""
+Сигналы приложения api
+"""
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from . import metrics
+from .analytics import record_submission, record_submission_deleted
+from .authentication import forget_token
+from .catalog import bump_catalog_version
+from .events import SUBMISSIONS_CHANNEL, notify_student, publish, submission_payload
+from .grading import bump_challenge_version
+from .history import record_attempt
+from .payloads import compact, store
+from .search import remove_document
+from .models import Challenge, Course, Lesson, StudentChallenge, Submission, UserProgress
+from .tasks import build_similarity_index, enqueue, index_search_document, publish_course_bundle
+from .user_cache import invalidate_user
+
+
+@receiver([post_save, post_delete], sender=settings.AUTH_USER_MODEL)
+def invalidate_cached_user(sender, instance, **kwargs):
+    """Сбрасываем кэш аутентификации при любом изменении пользователя (роль, пароль и т.д.)"""
+    invalidate_user(instance.pk)
+
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(sender, instance, **kwargs):
+    """Удаленный токен больше не должен находиться через кэш"""
+    forget_token(instance.key)
+
+
+@receiver(connection_created)
+def count_connection(sender, connection, **kwargs):
+    metrics.incr(f'db.connections_opened.{connection.alias}')
+
+
+@receiver(request_finished)
+def count_request(sender, **kwargs):
+    metrics.incr('http.requests')
+
+
+@receiver(pre_save, sender=Submission)
+def compact_submission(sender, instance, update_fields=None, **kwargs):
+    """Ограничиваем размер кода, вывода и ошибки; большие вывод и ошибка уходят в SubmissionPayload"""
+    if update_fields is not None and not {'code', 'output', 'error'} & set(update_fields):
+        return
+    if instance.payload_changed():
+        instance._pending_payload = compact(instance)
+
+
+@receiver(post_save, sender=Submission)
+def store_submission_payload(sender, instance, created, **kwargs):
+    if not hasattr(instance, '_pending_payload'):
+        return
+    payload = instance.__dict__.pop('_pending_payload')
+    if payload is not None or not created:
+        store(instance, payload)
+
+
+@receiver(post_save, sender=Submission)
+def publish_submission_event(sender, instance, created, **kwargs):
+    """Уведомляем учителей о новых, обновленных и проверенных отправках"""
+    if created:
+        event_type = 'submission.created'
+    elif instance.status in ['approved', 'rejected']:
+        event_type = 'submission.reviewed'
+    else:
+        event_type = 'submission.updated'
+    publish(SUBMISSIONS_CHANNEL, event_type, submission_payload(instance))
+
+    if event_type == 'submission.reviewed':
+        notify_student(instance.student_id, event_type, {
+            'id': instance.id,
+            'lesson': instance.lesson_id,
+            'status': instance.status,
+            'admin_comment': instance.admin_comment,
+            'reviewed_at': instance.reviewed_at,
+        })
+
+
+@receiver(post_save, sender=Submission)
+def update_lesson_stats(sender, instance, created, **kwargs):
+    """Инкрементально обновляем роллап аналитики урока (после коммита)"""
+    record_submission(instance, created)
+
+
+@receiver(post_delete, sender=Submission)
+def remove_from_lesson_stats(sender, instance, **kwargs):
+    record_submission_deleted(instance)
+
+
+@receiver(post_save, sender=Submission)
+def index_submission_similarity(sender, instance, created, update_fields=None, **kwargs):
+    """Подпись для поиска похожих решений строим в фоне для новой отправки или измененного кода"""
+    if instance.code_changed(created) or (update_fields is not None and 'code' in update_fields):
+        enqueue(build_similarity_index, submission_id=instance.pk)
+
+
+@receiver(post_save, sender=Submission)
+def record_submission_attempt(sender, instance, created, **kwargs):
+    """Каждая новая версия кода отправки попадает в историю попыток"""
+    if instance.code_changed(created):
+        transaction.on_commit(lambda: record_attempt(instance))
+
+
+@receiver([post_save, post_delete], sender=Challenge)
+@receiver([post_save, post_delete], sender=StudentChallenge)
+def invalidate_grading_verdicts(sender, instance, **kwargs):
+    """Изменение задания делает недействительными закэшированные вердикты"""
+    bump_challenge_version(instance)
+
+
+@receiver([post_save, post_delete], sender=Course)
+@receiver([post_save, post_delete], sender=Lesson)
+@receiver([post_save, post_delete], sender=Challenge)
+def invalidate_catalog(sender, **kwargs):
+    """Любое изменение курсов, уроков или заданий делает кэш каталога устаревшим"""
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver([post_save, post_delete], sender=Course)
+@receiver([post_save, post_delete], sender=Lesson)
+@receiver([post_save, post_delete], sender=Challenge)
+def republish_course_bundle(sender, instance, **kwargs):
+    """Перепубликуем статический бандл измененного курса (в фоне)"""
+    if sender is Course:
+        course_id = instance.pk
+    elif sender is Lesson:
+        course_id = instance.course_id
+    else:
+        course_id = Lesson.objects.filter(pk=instance.lesson_id).values_list('course_id', flat=True).first()
+        if course_id is None:
+            # Урок удаляется вместе с заданием: курс перепубликует сигнал урока
+            return
+    enqueue(publish_course_bundle, course_id=course_id)
+
+
+@receiver(post_save, sender=Lesson)
+@receiver(post_delete, sender=Lesson)
+def refresh_progress_percent(sender, instance, signal, created=False, **kwargs):
+    """Число уроков курса изменилось: пересчитываем percent_complete учеников"""
+    if signal is post_save and not created:
+        return
+    course_id = instance.course_id
+    transaction.on_commit(lambda: UserProgress.refresh_course_percent(course_id))
+
+
+@receiver(post_save, sender=Lesson)
+def index_lesson_search(sender, instance, **kwargs):
+    """Документы поиска обновляются в фоне (удаление урока удаляет их каскадом)"""
+    enqueue(index_search_document, kind='lesson', object_id=instance.pk)
+
+
+@receiver(post_save, sender=Challenge)
+def index_challenge_search(sender, instance, **kwargs):
+    enqueue(index_search_document, kind='challenge', object_id=instance.pk)
+
+
+@receiver(post_save, sender=Submission)
+def index_submission_search(sender, instance, created, **kwargs):
+    if instance.code_changed(created):
+        enqueue(index_search_document, kind='submission', object_id=instance.pk)
+
+
+@receiver(post_delete, sender=Challenge)
+@receiver(post_delete, sender=Submission)
+def remove_search_document(sender, instance, **kwargs):
+    kind = 'challenge' if sender is Challenge else 'submission'
+    object_id = instance.pk
+    transaction.on_commit(lambda: remove_document(kind, object_id))
@@ -0,0 +1,190 @@
+"""
+Поиск похожих решений (списывание) среди отправок одного урока.
+
+Код Lua разбивается на токены: комментарии и пробелы отбрасываются, имена
+переменных и функций заменяются на ID, строки и числа - на STR и NUM, поэтому
+переименование переменных и переформатирование не скрывают копию.
+Из токенов строятся шинглы (n-граммы), по ним MinHash-подпись; подпись
+делится на полосы (LSH), и кандидаты ищутся по совпадающим полосам через
+индекс (lesson, band, bucket), а не попарным сравнением всех отправок.
+"""
+import hashlib
+import re
+
+from django.db import transaction
+from django.db.models import Q
+
+from .models import SimilarityBucket, Submission, SubmissionFingerprint
+
+SHINGLE_SIZE = 5
+BANDS = 16
+ROWS_PER_BAND = 4
+NUM_HASHES = BANDS * ROWS_PER_BAND
+# Порог по умолчанию близок к точке перегиба LSH: (1 / BANDS) ** (1 / ROWS_PER_BAND) ~ 0.5
+DEFAULT_THRESHOLD = 0.5
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def _hash_params():
+    # Фиксированные коэффициенты: подписи должны совпадать между процессами и запусками
+    params = []
+    for i in range(NUM_HASHES):
+        digest = hashlib.blake2b(f'minhash-{i}'.encode(), digest_size=16).digest()
+        a = int.from_bytes(digest[:8], 'big') % (_MERSENNE_PRIME - 1) + 1
+        b = int.from_bytes(digest[8:], 'big') % _MERSENNE_PRIME
+        params.append((a, b))
+    return params
+
+
+_HASH_PARAMS = _hash_params()
+
+LUA_KEYWORDS = {
+    'and', 'break', 'do', 'else', 'elseif', 'end', 'false', 'for', 'function', 'goto', 'if',
+    'in', 'local', 'nil', 'not', 'or', 'repeat', 'return', 'then', 'true', 'until', 'while',
+}
+# Имена стандартной библиотеки не нормализуются: они несут смысл решения
+LUA_BUILTINS = {
+    'print', 'pairs', 'ipairs', 'tostring', 'tonumber', 'type', 'select', 'next', 'error',
+    'assert', 'pcall', 'unpack', 'string', 'table', 'math', 'os', 'io',
+}
+
+_TOKEN_RE = re.compile(r'''
+    (?P<comment>--\[(?P<ceq>=*)\[.*?\](?P=ceq)\]|--[^\n]*)
+  | (?P<longstr>\[(?P<seq>=*)\[.*?\](?P=seq)\])
+  | (?P<str>"(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*')
+  | (?P<num>0[xX][0-9a-fA-F]+|\d+\.?\d*(?:[eE][+-]?\d+)?|\.\d+(?:[eE][+-]?\d+)?)
+  | (?P<name>[A-Za-z_][A-Za-z0-9_]*)
+  | (?P<op>\.\.\.|\.\.|==|~=|<=|>=|::|//|[-+*/%^\#&~|<>=(){}\[\];:,.])
+  | (?P<space>\s+)
+''', re.VERBOSE | re.DOTALL)
+
+
+def lua_tokens(code):
+    """Токены кода Lua как пары (вид, текст), без комментариев и пробелов"""
+    for match in _TOKEN_RE.finditer(code or ''):
+        # lastgroup здесь не подходит: у комментариев и длинных строк есть вложенные группы
+        if match.group('comment') is not None or match.group('space') is not None:
+            continue
+        for kind in ('longstr', 'str', 'num', 'name', 'op'):
+            if match.group(kind) is not None:
+                yield kind, match.group(kind)
+                break
+
+
+def tokenize(code):
+    """Нормализованные токены кода Lua"""
+    tokens = []
+    for kind, text in lua_tokens(code):
+        if kind in ('longstr', 'str'):
+            tokens.append('STR')
+        elif kind == 'num':
+            tokens.append('NUM')
+        elif kind == 'name':
+            tokens.append(text if text in LUA_KEYWORDS or text in LUA_BUILTINS else 'ID')
+        else:
+            tokens.append(text)
+    return tokens
+
+
+def shingles(tokens):
+    if len(tokens) < SHINGLE_SIZE:
+        return {' '.join(tokens)} if tokens else set()
+    return {' '.join(tokens[i:i + SHINGLE_SIZE]) for i in range(len(tokens) - SHINGLE_SIZE + 1)}
+
+
+def minhash(shingle_set):
+    """Подпись из NUM_HASHES минимальных значений (пустой код - пустая подпись)"""
+    if not shingle_set:
+        return []
+    values = [
+        int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=8).digest(), 'big')
+        for shingle in shingle_set
+    ]
+    return [
+        min((a * value + b) % _MERSENNE_PRIME for value in values) & _MAX_HASH
+        for a, b in _HASH_PARAMS
+    ]
+
+
+def band_buckets(signature):
+    """Ключи корзин LSH: (номер полосы, хэш значений полосы)"""
+    buckets = []
+    for band in range(BANDS):
+        rows = signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        digest = hashlib.blake2b(','.join(map(str, rows)).encode(), digest_size=8).hexdigest()
+        buckets.append((band, digest))
+    return buckets
+
+
+def estimate_similarity(left, right):
+    """Оценка коэффициента Жаккара по доле совпавших позиций подписи"""
+    if not left or not right:
+        return 0.0
+    return sum(1 for x, y in zip(left, right) if x == y) / NUM_HASHES
+
+
+def build_index_rows(submission):
+    """Подпись и корзины для одной отправки (без записи в БД)"""
+    shingle_set = shingles(tokenize(submission.code))
+    signature = minhash(shingle_set)
+    fingerprint = SubmissionFingerprint(
+        submission_id=submission.id,
+        lesson_id=submission.lesson_id,
+        student_id=submission.student_id,
+        signature=signature,
+        shingle_count=len(shingle_set),
+    )
+    buckets = [
+        SimilarityBucket(lesson_id=submission.lesson_id, band=band, bucket=bucket, submission_id=submission.id)
+        for band, bucket in (band_buckets(signature) if signature else [])
+    ]
+    return fingerprint, buckets
+
+
+def index_submission(submission):
+    """Создает или обновляет подпись и корзины отправки"""
+    fingerprint, buckets = build_index_rows(submission)
+    with transaction.atomic():
+        SimilarityBucket.objects.filter(submission_id=submission.id).delete()
+        SubmissionFingerprint.objects.filter(submission_id=submission.id).delete()
+        fingerprint.save(force_insert=True)
+        SimilarityBucket.objects.bulk_create(buckets)
+    return fingerprint
+
+
+def find_similar(submission, threshold=DEFAULT_THRESHOLD, limit=20):
+    """
+    Похожие отправки других учеников по тому же уроку.
+    Возвращает список (оценка сходства, отправка), по убыванию сходства.
+    """
+    fingerprint = SubmissionFingerprint.objects.filter(submission_id=submission.id).first()
+    if fingerprint is None:
+        fingerprint = index_submission(submission)
+    if not fingerprint.signature:
+        return []
+
+    band_filter = Q()
+    for band, bucket in band_buckets(fingerprint.signature):
+        band_filter |= Q(band=band, bucket=bucket)
+    candidate_ids = (
+        SimilarityBucket.objects.filter(band_filter, lesson_id=submission.lesson_id)
+        .exclude(submission_id=submission.id)
+        .values_list('submission_id', flat=True)
+        .distinct()
+    )
+
+    scored = []
+    candidates = SubmissionFingerprint.objects.filter(submission_id__in=candidate_ids).exclude(
+        student_id=submission.student_id
+    ).values_list('submission_id', 'signature')
+    for candidate_id, signature in candidates:
+        score = estimate_similarity(fingerprint.signature, signature)
+        if score >= threshold:
+            scored.append((score, candidate_id))
+    scored.sort(reverse=True)
+    scored = scored[:limit]
+
+    submissions = Submission.objects.select_related('student').defer('code', 'output', 'error').in_bulk([candidate_id for _, candidate_id in scored])
+    return [(score, submissions[candidate_id]) for score, candidate_id in scored if candidate_id in submissions]
@@ -0,0 +1,145 @@
+"""
+Single-flight: одна пересборка значения на ключ кэша.
+
+При промахе кэша (например, каталог истек к началу урока, и весь класс
+открыл курс одновременно) значение собирает только один поток процесса,
+остальные ждут и получают его результат. Между воркерами сборку
+согласует блокировка в общем кэше (cache.add). С включенным
+stale-while-revalidate устаревшее значение отдается сразу, а свежее
+собирается в фоне.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+LOCK_PREFIX = 'singleflight:lock:'
+POLL_SECONDS = 0.05
+
+
+def _setting(name, default):
+    return getattr(settings, 'SINGLE_FLIGHT', {}).get(name, default)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    """Объединение одновременных вызовов с одним ключом внутри процесса"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            metrics.incr('singleflight.coalesced')
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = fn()
+        except Exception as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.value
+
+    def in_flight(self, key):
+        with self._lock:
+            return key in self._calls
+
+
+group = SingleFlight()
+
+
+def put(key, value, ttl, stale_ttl=0):
+    """Записывает значение в формате get_or_build (для прогрева кэша)"""
+    cache.set(key, {'value': value, 'fresh_until': time.time() + ttl}, timeout=ttl + stale_ttl)
+
+
+def _build_with_shared_lock(key, builder, ttl, stale_ttl):
+    """Сборка с блокировкой между воркерами; без блокировки ждем чужой результат"""
+    lock_key = LOCK_PREFIX + key
+    if not _setting('CROSS_WORKER_LOCK', True) or cache.add(lock_key, 1, timeout=_setting('LOCK_TTL', 30)):
+        try:
+            metrics.incr('singleflight.builds')
+            value = builder()
+            put(key, value, ttl, stale_ttl)
+            return value
+        finally:
+            if _setting('CROSS_WORKER_LOCK', True):
+                cache.delete(lock_key)
+
+    deadline = time.monotonic() + _setting('WAIT_SECONDS', 5)
+    while time.monotonic() < deadline:
+        time.sleep(POLL_SECONDS)
+        entry = cache.get(key)
+        if entry is not None and entry['fresh_until'] > time.time():
+            metrics.incr('singleflight.coalesced')
+            return entry['value']
+    # Другой воркер не успел (или упал): собираем сами, чтобы не отказывать клиенту
+    metrics.incr('singleflight.builds')
+    value = builder()
+    put(key, value, ttl, stale_ttl)
+    return value
+
+
+def _refresh_in_background(key, builder, ttl, stale_ttl):
+    def run():
+        try:
+            group.do(key, lambda: _build_with_shared_lock(key, builder, ttl, stale_ttl))
+        except Exception:
+            logger.exception('Фоновое обновление %s не удалось', key)
+        finally:
+            connection.close()
+
+    threading.Thread(target=run, name=f'refresh:{key}', daemon=True).start()
+
+
+def get_or_build(key, builder, ttl, stale_ttl=0):
+    """
+    Значение из кэша или результат builder(), собранный одним потоком.
+    stale_ttl > 0 включает stale-while-revalidate: после ttl значение еще
+    stale_ttl секунд отдается как есть, пока в фоне собирается новое.
+    """
+    entry = cache.get(key)
+    now = time.time()
+    if entry is not None:
+        if entry['fresh_until'] > now:
+            return entry['value']
+        if stale_ttl:
+            metrics.incr('singleflight.stale_served')
+            if not group.in_flight(key):
+                _refresh_in_background(key, builder, ttl, stale_ttl)
+            return entry['value']
+
+    if not _setting('ENABLED', True):
+        metrics.incr('singleflight.builds')
+        value = builder()
+        put(key, value, ttl, stale_ttl)
+        return value
+
+    return group.do(key, lambda: _build_with_shared_lock(key, builder, ttl, stale_ttl))
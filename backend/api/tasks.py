@@ -0,0 +1,304 @@
+"""
+Фоновые задачи без внешнего брокера: очередь - таблица Task.
+
+enqueue() записывает задачу в текущей транзакции, поэтому воркер видит ее
+только после коммита основной записи, а при откате она исчезает вместе с
+ней. Команда run_worker забирает задачи (SELECT ... FOR UPDATE SKIP LOCKED
+на Postgres, условный UPDATE на остальных базах), выполняет их в нескольких
+потоках и при ошибке откладывает повтор с экспоненциальной задержкой.
+Периодические задачи (schedule_periodic) воркер ставит в очередь сам: метка
+в общем кэше пропускает повтор от других воркеров до конца интервала.
+Пока задача выполняется, воркер каждые HEARTBEAT_SECONDS продлевает
+locked_at: в очередь возвращаются только задачи упавших воркеров, а не
+долгие (например, reconcile_progress).
+После max_attempts попыток задача получает статус dead и остается в
+админке и в /api/tasks/?status=dead, откуда ее можно перезапустить.
+
+В режиме TASKS['EAGER'] (по умолчанию при DEBUG) задачи выполняются сразу
+после коммита в том же процессе, и для разработки воркер не нужен.
+
+Задачи принимают только JSON-значения (идентификаторы, а не объекты) и
+должны быть идемпотентны: после падения воркера задача выполняется снова.
+"""
+import logging
+import random
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from . import metrics
+from .analytics import reconcile_all, reconcile_interval
+from .bundles import publish_course, publish_index
+from .events import notify_student, prune_events
+from .reconcile import reconcile
+from .models import Challenge, Lesson, StudentLesson, Submission, Task
+from .search import index_challenge, index_lesson, index_submission_code
+from .similarity import index_submission
+
+logger = logging.getLogger(__name__)
+
+
+def _setting(name, default):
+    return getattr(settings, 'TASKS', {}).get(name, default)
+
+
+def is_eager():
+    return _setting('EAGER', settings.DEBUG)
+
+
+def task(func):
+    """Регистрирует функцию как фоновую задачу: по имени из таблицы выполняются только такие"""
+    func.task_name = f'{func.__module__}.{func.__name__}'
+    return func
+
+
+def enqueue(func, delay=0, max_attempts=None, **kwargs):
+    """Ставит задачу func(**kwargs) в очередь; выполнится после коммита текущей транзакции"""
+    if is_eager():
+        transaction.on_commit(lambda: _run_eager(func, kwargs))
+        return None
+    return Task.objects.create(
+        name=func.task_name,
+        kwargs=kwargs,
+        max_attempts=max_attempts or _setting('MAX_ATTEMPTS', 5),
+        run_after=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+def _run_eager(func, kwargs):
+    try:
+        func(**kwargs)
+        metrics.incr('tasks.done')
+    except Exception:
+        # Как и в воркере, ошибка задачи не должна ломать запрос
+        metrics.incr('tasks.failed')
+        logger.exception('Фоновая задача %s завершилась ошибкой', func.task_name)
+
+
+def resolve(name):
+    func = import_string(name)
+    if getattr(func, 'task_name', None) != name:
+        raise ValueError(f'{name} не зарегистрирована как фоновая задача')
+    return func
+
+
+def backoff(attempts):
+    """Задержка перед повтором: BASE * 2^(attempts-1), не больше MAX, плюс до 20% случайного разброса"""
+    delay = min(_setting('BACKOFF_BASE', 5) * 2 ** (attempts - 1), _setting('BACKOFF_MAX', 3600))
+    return delay * (1 + random.random() * 0.2)
+
+
+# Воркер
+
+def claim(worker_id):
+    """Забирает одну готовую к выполнению задачу или возвращает None"""
+    now = timezone.now()
+    ready = Task.objects.filter(status='pending', run_after__lte=now).order_by('run_after', 'id')
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            claimed = ready.select_for_update(skip_locked=True).first()
+            if claimed is None:
+                return None
+            Task.objects.filter(pk=claimed.pk).update(
+                status='running', locked_by=worker_id, locked_at=now, attempts=F('attempts') + 1
+            )
+    else:
+        # Без SKIP LOCKED: из нескольких кандидатов задачу получает тот, чей UPDATE сработал
+        candidates = list(ready.values_list('id', flat=True)[:10])
+        random.shuffle(candidates)
+        for task_id in candidates:
+            if Task.objects.filter(pk=task_id, status='pending').update(
+                status='running', locked_by=worker_id, locked_at=now, attempts=F('attempts') + 1
+            ):
+                break
+        else:
+            return None
+        claimed = Task(pk=task_id)
+    claimed.refresh_from_db()
+    return claimed
+
+
+def execute(claimed):
+    """Выполняет взятую задачу и записывает результат: done, повтор или dead"""
+    # Задачу, которую уже вернули в очередь и взял другой воркер, не трогаем
+    owned = Task.objects.filter(pk=claimed.pk, status='running', locked_by=claimed.locked_by)
+    try:
+        result = resolve(claimed.name)(**claimed.kwargs)
+    except Exception:
+        error = traceback.format_exc()
+        if claimed.attempts >= claimed.max_attempts:
+            logger.error('Фоновая задача %s #%s исчерпала попытки:\n%s', claimed.name, claimed.pk, error)
+            fields = {'status': 'dead'}
+            metrics.incr('tasks.dead')
+        else:
+            fields = {'status': 'pending', 'run_after': timezone.now() + timedelta(seconds=backoff(claimed.attempts))}
+            metrics.incr('tasks.retried')
+        owned.update(
+            last_error=error[-10000:], locked_by='', locked_at=None, updated_at=timezone.now(), **fields
+        )
+        return False
+    owned.update(
+        status='done', result=result, locked_by='', locked_at=None, updated_at=timezone.now()
+    )
+    metrics.incr('tasks.done')
+    return True
+
+
+def heartbeat(worker_ids):
+    """Продлевает блокировку задач, которые выполняют потоки этого воркера"""
+    return Task.objects.filter(status='running', locked_by__in=worker_ids).update(locked_at=timezone.now())
+
+
+def requeue_stale():
+    """Возвращает в очередь задачи воркеров, которые упали, не завершив их"""
+    cutoff = timezone.now() - timedelta(seconds=_setting('LOCK_TIMEOUT', 600))
+    return Task.objects.filter(status='running', locked_at__lt=cutoff).update(
+        status='pending', locked_by='', locked_at=None, run_after=timezone.now()
+    )
+
+
+def prune_done():
+    cutoff = timezone.now() - timedelta(seconds=_setting('KEEP_DONE_SECONDS', 24 * 60 * 60))
+    deleted, _ = Task.objects.filter(status='done', updated_at__lt=cutoff).delete()
+    return deleted
+
+
+def retry(queryset):
+    """Перезапускает задачи (обычно dead) с новым счетчиком попыток"""
+    return queryset.exclude(status='running').update(
+        status='pending', attempts=0, run_after=timezone.now(), locked_by='', locked_at=None
+    )
+
+
+def task_metrics():
+    counts = dict(Task.objects.values_list('status').annotate(count=Count('id')).order_by())
+    return {
+        'eager': is_eager(),
+        'pending': counts.get('pending', 0),
+        'running': counts.get('running', 0),
+        'dead': counts.get('dead', 0),
+        'done': metrics.get('tasks.done'),
+        'retried': metrics.get('tasks.retried'),
+        'failed': metrics.get('tasks.failed') + metrics.get('tasks.dead'),
+    }
+
+
+metrics.register('tasks', task_metrics)
+
+
+# Задачи
+
+@task
+def publish_course_bundle(course_id):
+    publish_course(course_id)
+    publish_index()
+
+
+@task
+def build_similarity_index(submission_id):
+    submission = Submission.objects.filter(pk=submission_id).defer('output', 'error').first()
+    if submission is not None:
+        index_submission(submission)
+
+
+@task
+def index_search_document(kind, object_id):
+    model, index = {
+        'lesson': (Lesson, index_lesson),
+        'challenge': (Challenge, index_challenge),
+        'submission': (Submission, index_submission_code),
+    }[kind]
+    instance = model.objects.filter(pk=object_id).first()
+    if instance is not None:
+        index(instance)
+
+
+@task
+def reconcile_lesson_analytics():
+    """Периодическая сверка инкрементальных роллапов аналитики с полным пересчетом"""
+    return {'lessons': reconcile_all()}
+
+
+@task
+def complete_approved_lesson(submission_id):
+    """Одобренная отправка: урок завершен, следующий урок курса разблокирован"""
+    submission = (
+        Submission.objects.select_related('lesson').defer('code', 'output', 'error')
+        .filter(pk=submission_id).first()
+    )
+    if submission is None or submission.status != 'approved':
+        return
+    lesson = submission.lesson
+
+    next_lesson = Lesson.objects.filter(course_id=lesson.course_id, order=lesson.order + 1).first()
+    if next_lesson:
+        student_lesson, created = StudentLesson.objects.get_or_create(
+            student_id=submission.student_id,
+            lesson=next_lesson,
+            defaults={'is_unlocked': True}
+        )
+        unlocked = created
+        if not created and not student_lesson.is_unlocked:
+            student_lesson.is_unlocked = True
+            student_lesson.save()
+            unlocked = True
+        # Повтор задачи или повторное одобрение ничего не меняют: уведомлять не о чем
+        if unlocked:
+            notify_student(submission.student_id, 'lesson.unlocked', {
+                'lesson': next_lesson.id,
+                'course': lesson.course_id,
+            })
+
+    student_lesson_current, _ = StudentLesson.objects.get_or_create(
+        student_id=submission.student_id,
+        lesson=lesson
+    )
+    if not student_lesson_current.is_completed:
+        student_lesson_current.is_completed = True
+        student_lesson_current.completed_at = timezone.now()
+        student_lesson_current.save()
+        notify_student(submission.student_id, 'lesson.completed', {
+            'lesson': lesson.id,
+            'course': lesson.course_id,
+        })
+
+
+@task
+def reconcile_progress(**options):
+    """Сверка StudentLesson и UserProgress; отчет сохраняется в Task.result"""
+    return reconcile(**options)
+
+
+@task
+def prune_event_log():
+    return {'deleted': prune_events()}
+
+
+# Периодические задачи
+
+PERIODIC_KEY = 'tasks:periodic:{}'
+EVENT_PRUNE_SECONDS = 60 * 60
+
+
+def periodic_tasks():
+    """Задачи без аргументов и интервалы между их запусками, секунды"""
+    return [
+        (reconcile_lesson_analytics, reconcile_interval()),
+        (prune_event_log, EVENT_PRUNE_SECONDS),
+    ]
+
+
+def schedule_periodic():
+    """Ставит в очередь периодические задачи, интервал которых истек; вызывается воркером"""
+    scheduled = 0
+    for func, interval in periodic_tasks():
+        if cache.add(PERIODIC_KEY.format(func.task_name), 1, timeout=interval):
+            enqueue(func)
+            scheduled += 1
+    return scheduled
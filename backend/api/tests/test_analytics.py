@@ -0,0 +1,87 @@
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from api.analytics import rebuild_lesson_stats
+from api.models import Course, Lesson, LessonStats, Submission, Task, User
+from api.tasks import reconcile_lesson_analytics, schedule_periodic
+
+FIELDS = [
+    'submissions_count', 'pending_count', 'approved_count', 'rejected_count', 'students_attempted',
+    'students_completed', 'attempts_histogram', 'review_count', 'review_seconds_total',
+]
+
+
+def snapshot(lesson):
+    return LessonStats.objects.filter(lesson=lesson).values(*FIELDS).get()
+
+
+class IncrementalLessonStatsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.first = User.objects.create(username='first')
+        cls.second = User.objects.create(username='second')
+        course = Course.objects.create(id='c1', title='Course', description='')
+        cls.lesson = Lesson.objects.create(id='l1', course=course, title='L1', description='', order=1, content='')
+
+    def submit(self, student):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Submission.objects.create(student=student, lesson=self.lesson, code='print(1)')
+
+    def review(self, submission, status, minutes):
+        submission.status = status
+        submission.reviewed_at = submission.submitted_at + timedelta(minutes=minutes)
+        with self.captureOnCommitCallbacks(execute=True):
+            submission.save()
+
+    def assert_matches_rebuild(self):
+        incremental = snapshot(self.lesson)
+        rebuild_lesson_stats(self.lesson)
+        self.assertEqual(incremental, snapshot(self.lesson))
+        return incremental
+
+    def test_counters_follow_submission_lifecycle(self):
+        attempt = self.submit(self.first)
+        self.assert_matches_rebuild()
+        self.review(attempt, 'rejected', 10)
+        retry = self.submit(self.first)
+        self.submit(self.second)
+        self.review(retry, 'approved', 5)
+        stats = self.assert_matches_rebuild()
+        self.assertEqual(stats['attempts_histogram'], {'1': 1, '2': 1})
+        self.assertEqual((stats['students_attempted'], stats['students_completed']), (2, 1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            retry.delete()
+        stats = self.assert_matches_rebuild()
+        self.assertEqual((stats['submissions_count'], stats['students_completed']), (2, 0))
+        self.assertEqual(stats['attempts_histogram'], {'1': 2})
+
+    def test_review_time_is_counted_once(self):
+        submission = self.submit(self.first)
+        self.review(submission, 'approved', 10)
+        # Повторная проверка заменяет вклад отправки, а не добавляет второй
+        self.review(submission, 'rejected', 30)
+        stats = self.assert_matches_rebuild()
+        self.assertEqual((stats['review_count'], stats['review_seconds_total']), (1, 30 * 60))
+
+    def test_reconcile_repairs_drift(self):
+        self.submit(self.first)
+        LessonStats.objects.filter(lesson=self.lesson).update(submissions_count=7, attempts_histogram={'3': 1})
+        self.assertEqual(reconcile_lesson_analytics(), {'lessons': 1})
+        stats = snapshot(self.lesson)
+        self.assertEqual((stats['submissions_count'], stats['attempts_histogram']), (1, {'1': 1}))
+
+
+@override_settings(TASKS={'EAGER': False}, ANALYTICS={'RECONCILE_SECONDS': 3600})
+class SchedulePeriodicTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_enqueued_once_per_interval(self):
+        self.assertEqual(schedule_periodic(), 2)
+        self.assertEqual(schedule_periodic(), 0)
+        queued = Task.objects.get(name='api.tasks.reconcile_lesson_analytics')
+        self.assertLessEqual(queued.run_after, timezone.now())
@@ -0,0 +1,47 @@
+import tempfile
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from api import bundles, serializers
+from api.models import Course, Lesson
+from api.serializers import CourseListSerializer
+
+
+class CourseListBundleUrlTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for index in (1, 2, 3):
+            course = Course.objects.create(id=f'c{index}', title=f'Course {index}', description='')
+            Lesson.objects.create(id=f'l{index}', course=course, title='L', description='', order=1, content='')
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        cache.clear()
+
+    def serialize(self):
+        courses = Course.objects.order_by('id')
+        return {row['id']: row['bundle_url'] for row in CourseListSerializer(courses, many=True).data}
+
+    def test_urls_resolved_once_per_list(self):
+        published = {course_id: bundles.publish_course(course_id) for course_id in ('c1', 'c2')}
+        with mock.patch.object(serializers, 'bundle_url', side_effect=AssertionError('lookup per course')):
+            self.assertEqual(self.serialize(), {**published, 'c3': None})
+
+    def test_unpublished_course_checks_disk_once(self):
+        bundles.publish_course('c1')
+        with mock.patch.object(bundles, '_url_from_disk', wraps=bundles._url_from_disk) as from_disk:
+            self.serialize()
+            self.serialize()
+        self.assertEqual([call.args for call in from_disk.call_args_list], [('c2',), ('c3',)])
+
+    def test_url_recovered_from_disk_after_cache_loss(self):
+        url = bundles.publish_course('c1')
+        cache.clear()
+        self.assertEqual(self.serialize()['c1'], url)
+        self.assertEqual(bundles.bundle_url('c1'), url)
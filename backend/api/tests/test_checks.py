@@ -0,0 +1,27 @@
+from django.core.checks import run_checks
+from django.test import SimpleTestCase, override_settings
+
+LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+REDIS = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://localhost:6379/0'}}
+
+
+def error_ids(**kwargs):
+    return {message.id for message in run_checks(**kwargs)}
+
+
+@override_settings(DEBUG=False, CACHES=LOCMEM)
+class SharedCacheCheckTests(SimpleTestCase):
+    def test_locmem_passes_regular_checks(self):
+        # Такие же проверки выполняет manage.py test перед запуском тестов
+        self.assertNotIn('api.E001', error_ids())
+
+    def test_locmem_fails_deploy_checks(self):
+        self.assertIn('api.E001', error_ids(include_deployment_checks=True))
+
+    @override_settings(CACHES=REDIS)
+    def test_shared_cache_passes_deploy_checks(self):
+        self.assertNotIn('api.E001', error_ids(include_deployment_checks=True))
+
+    @override_settings(DEBUG=True)
+    def test_debug_allows_locmem(self):
+        self.assertNotIn('api.E001', error_ids(include_deployment_checks=True))
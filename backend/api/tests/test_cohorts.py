@@ -0,0 +1,82 @@
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from api.cohorts import bulk_assign_challenge, bulk_unlock
+from api.models import Cohort, Course, Event, Lesson, StudentChallenge, StudentLesson, User, UserProgress
+
+# Число запросов фиксировано для любого размера класса (без аутентификации и
+# поиска класса/урока в представлении)
+UNLOCK_QUERIES = 9
+ASSIGN_QUERIES = 5
+
+
+class CohortBulkTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user(username='teacher', password='x', role='teacher')
+        cls.course = Course.objects.create(id='c1', title='Course', description='')
+        Lesson.objects.create(id='l1', course=cls.course, title='L1', description='', order=1, content='')
+        cls.lesson = Lesson.objects.create(id='l2', course=cls.course, title='L2', description='', order=2, content='')
+
+    def make_cohort(self, size):
+        students = [User.objects.create(username=f's{size}_{i}') for i in range(size)]
+        # Часть учеников уже начала курс, у части прогресса нет, один урок был закрыт учителем
+        UserProgress.objects.create(user=students[0], course=self.course, unlocked_lesson_ids=['l1'])
+        UserProgress.objects.create(user=students[1], course=self.course, unlocked_lesson_ids=['l1', 'l2'])
+        StudentLesson.objects.create(student=students[2], lesson=self.lesson, is_unlocked=False)
+        cohort = Cohort.objects.create(name=f'cohort {size}', teacher=self.teacher)
+        cohort.students.set(students)
+        return cohort, students
+
+    def test_unlock_query_count_does_not_depend_on_cohort_size(self):
+        for size in (5, 40):
+            cohort, _ = self.make_cohort(size)
+            with self.subTest(size=size), self.assertNumQueries(UNLOCK_QUERIES):
+                self.assertEqual(bulk_unlock(cohort, self.lesson), size)
+
+    def test_assign_query_count_does_not_depend_on_cohort_size(self):
+        for size in (5, 40):
+            cohort, _ = self.make_cohort(size)
+            with self.subTest(size=size), self.assertNumQueries(ASSIGN_QUERIES):
+                bulk_assign_challenge(cohort, self.lesson, {'instructions': 'do', 'expected_output': 'hi'})
+
+    def test_unlock_updates_lessons_progress_and_events(self):
+        cohort, students = self.make_cohort(5)
+        with self.captureOnCommitCallbacks(execute=True):
+            bulk_unlock(cohort, self.lesson)
+
+        unlocked = StudentLesson.objects.filter(lesson=self.lesson, is_unlocked=True)
+        self.assertEqual(set(unlocked.values_list('student_id', flat=True)), {student.id for student in students})
+        for student in students:
+            progress = UserProgress.objects.get(user=student, course=self.course)
+            self.assertEqual(progress.unlocked_lesson_ids.count('l2'), 1)
+        self.assertEqual(UserProgress.objects.get(user=students[0]).unlocked_lesson_ids, ['l1', 'l2'])
+        self.assertEqual(Event.objects.filter(event_type='lesson.unlocked').count(), 5)
+
+        # Повторная разблокировка ничего не дублирует
+        bulk_unlock(cohort, self.lesson)
+        self.assertEqual(StudentLesson.objects.filter(lesson=self.lesson).count(), 5)
+        self.assertEqual(UserProgress.objects.get(user=students[0]).unlocked_lesson_ids, ['l1', 'l2'])
+
+    def test_assign_creates_and_updates_student_challenges(self):
+        cohort, _ = self.make_cohort(3)
+        bulk_assign_challenge(cohort, self.lesson, {'instructions': 'first', 'expected_output': 'a'})
+        bulk_assign_challenge(cohort, self.lesson, {'instructions': 'second'})
+        challenges = StudentChallenge.objects.filter(lesson=self.lesson)
+        self.assertEqual(challenges.count(), 3)
+        self.assertEqual(set(challenges.values_list('instructions', 'expected_output')), {('second', 'a')})
+
+    def test_empty_cohort(self):
+        cohort = Cohort.objects.create(name='empty', teacher=self.teacher)
+        self.assertEqual(bulk_unlock(cohort, self.lesson), 0)
+
+    def test_only_own_cohorts_can_be_unlocked(self):
+        cohort, _ = self.make_cohort(3)
+        other = User.objects.create_user(username='other', password='x', role='teacher')
+        client = APIClient()
+        client.force_authenticate(other)
+        response = client.post(f'/api/cohorts/{cohort.pk}/unlock/', {'lesson': 'l2'}, format='json')
+        self.assertEqual(response.status_code, 404)
+        client.force_authenticate(self.teacher)
+        response = client.post(f'/api/cohorts/{cohort.pk}/unlock/', {'lesson': 'l2'}, format='json')
+        self.assertEqual(response.json(), {'lesson': 'l2', 'students': 3})
@@ -0,0 +1,38 @@
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from api.events import SUBMISSIONS_CHANNEL
+from api.models import Course, Event, Lesson, Submission, User
+from api.tasks import prune_event_log
+
+
+class SubmissionEventTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create(username='student')
+        course = Course.objects.create(id='c1', title='Course', description='')
+        cls.lesson = Lesson.objects.create(id='l1', course=course, title='L1', description='', order=1, content='')
+
+    def test_payload_does_not_load_student(self):
+        submission = Submission.objects.create(student=self.student, lesson=self.lesson, code='print(1)')
+        submission = Submission.objects.defer('code', 'output', 'error').get(pk=submission.pk)
+        submission.status = 'approved'
+        with self.captureOnCommitCallbacks(execute=True):
+            submission.save(update_fields=['status'])
+        self.assertFalse(Submission.student.is_cached(submission))
+
+        event = Event.objects.filter(channel=SUBMISSIONS_CHANNEL, event_type='submission.reviewed').get()
+        self.assertEqual(event.payload['student'], self.student.pk)
+        self.assertNotIn('student_username', event.payload)
+
+
+@override_settings(SSE_EVENT_RETENTION_DAYS=7)
+class PruneEventsTests(TestCase):
+    def test_deletes_only_expired_events(self):
+        old = Event.objects.create(channel='submissions', event_type='x')
+        Event.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=8))
+        fresh = Event.objects.create(channel='submissions', event_type='x')
+        self.assertEqual(prune_event_log(), {'deleted': 1})
+        self.assertEqual(list(Event.objects.values_list('id', flat=True)), [fresh.pk])
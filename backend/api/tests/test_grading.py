@@ -0,0 +1,49 @@
+from django.core.cache import cache
+from django.test import TestCase
+
+from api.grading import compare_output, grade, local_verdicts
+from api.models import Challenge, Course, Lesson
+
+
+class GradeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        course = Course.objects.create(id='c1', title='Course', description='')
+        lesson = Lesson.objects.create(id='l1', course=course, title='Hello', description='', order=1, content='')
+        cls.challenge = Challenge.objects.create(
+            lesson=lesson, instructions='', initial_code='', expected_output='Hello Roblox',
+        )
+
+    def setUp(self):
+        cache.clear()
+        local_verdicts.clear()
+
+    def test_same_code_and_output_hits_cache(self):
+        self.assertEqual(grade(self.challenge, 'print("Hello Roblox")', ['Hello Roblox']), (True, False))
+        # Пробелы и комментарии не меняют нормализованный код
+        self.assertEqual(
+            grade(self.challenge, 'print( "Hello Roblox" ) -- done', ['Hello Roblox ']),
+            (True, True),
+        )
+
+    def test_different_output_gets_its_own_verdict(self):
+        code = 'print("Hello Roblox")'
+        self.assertEqual(grade(self.challenge, code, ['Hello Roblox']), (True, False))
+        self.assertEqual(grade(self.challenge, code, ['Goodbye']), (False, False))
+        self.assertEqual(grade(self.challenge, code, ['Hello Roblox']), (True, True))
+
+    def test_failed_verdict_does_not_stick(self):
+        code = 'print("Hello Roblox")'
+        self.assertEqual(grade(self.challenge, code, []), (False, False))
+        self.assertEqual(grade(self.challenge, code, 'Hello Roblox'), (True, False))
+
+    def test_changed_challenge_invalidates_verdicts(self):
+        code = 'print("Hello Roblox")'
+        grade(self.challenge, code, ['Hello Roblox'])
+        self.challenge.expected_output = 'Hi'
+        self.challenge.save()
+        self.assertEqual(grade(self.challenge, code, ['Hello Roblox']), (False, False))
+
+    def test_compare_output_rejects_unknown_types(self):
+        self.assertFalse(compare_output('1', 1))
+        self.assertTrue(compare_output('a b', ['a', '', 'b']))
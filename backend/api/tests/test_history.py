@@ -0,0 +1,47 @@
+from types import SimpleNamespace
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from api.history import attempt_diff, load_code, store_code
+
+
+class AttemptDiffTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def diff(self, before, after):
+        first = SimpleNamespace(number=1, code_id=store_code(before).hash)
+        second = SimpleNamespace(number=2, code_id=store_code(after).hash)
+        return attempt_diff(first, second)
+
+    def test_lines_with_newlines(self):
+        self.assertEqual(self.diff('a\nb\n', 'a\nc\n'), (
+            '--- attempt 1\n+++ attempt 2\n@@ -1,2 +1,2 @@\n a\n-b\n+c\n'
+        ))
+
+    def test_added_line_after_last_line_without_newline(self):
+        self.assertEqual(self.diff('print("Hello Roblox")', 'print("Hello Roblox")\n-- x'), (
+            '--- attempt 1\n+++ attempt 2\n@@ -1 +1,2 @@\n'
+            '-print("Hello Roblox")\n\\ No newline at end of file\n'
+            '+print("Hello Roblox")\n'
+            '+-- x\n\\ No newline at end of file\n'
+        ))
+
+    def test_only_new_version_lacks_newline(self):
+        self.assertEqual(self.diff('a\n', 'b'), (
+            '--- attempt 1\n+++ attempt 2\n@@ -1 +1 @@\n-a\n+b\n\\ No newline at end of file\n'
+        ))
+
+    def test_unchanged_last_line_without_newline(self):
+        self.assertEqual(self.diff('a\nend', 'b\nend'), (
+            '--- attempt 1\n+++ attempt 2\n@@ -1,2 +1,2 @@\n-a\n+b\n end\n\\ No newline at end of file\n'
+        ))
+
+    def test_delta_versions_roundtrip(self):
+        base = store_code('local x = 1\n' * 50)
+        code = 'local x = 1\n' * 49 + 'print(x)'
+        blob = store_code(code, base_hash=base.hash)
+        self.assertEqual(blob.base_id, base.hash)
+        cache.clear()
+        self.assertEqual(load_code(blob.hash), code)
@@ -0,0 +1,114 @@
+from django.test import TestCase, override_settings
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.idempotency import HEADER, idempotent, prune_expired
+from api.models import IdempotencyKey, User
+
+factory = APIRequestFactory()
+
+
+class IdempotentTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='student', password='x')
+        cls.other = User.objects.create_user(username='other', password='x')
+
+    def setUp(self):
+        self.calls = 0
+        self.inner = None
+
+    def make_view(self, result=None):
+        @api_view(['POST'])
+        @permission_classes([AllowAny])
+        @idempotent
+        def view(request):
+            self.calls += 1
+            if self.inner is not None:
+                # Дубль приходит, пока первый запрос еще выполняется
+                inner, self.inner = self.inner, None
+                self.inner_response = inner()
+            if isinstance(result, Exception):
+                raise result
+            return result or Response({'call': self.calls}, status=status.HTTP_201_CREATED)
+        return view
+
+    def post(self, view, data=None, key='key-1', user=None):
+        headers = {HEADER: key} if key else {}
+        request = factory.post('/api/things/', data or {'a': 1}, format='json', headers=headers)
+        force_authenticate(request, user=user or self.user)
+        return view(request)
+
+    def test_without_key_runs_every_time(self):
+        view = self.make_view()
+        self.post(view, key=None)
+        self.post(view, key=None)
+        self.assertEqual(self.calls, 2)
+
+    def test_repeat_replays_stored_response(self):
+        view = self.make_view()
+        first = self.post(view)
+        second = self.post(view)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(second.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+
+    def test_key_reused_with_other_body_is_rejected(self):
+        view = self.make_view()
+        self.post(view, data={'a': 1})
+        response = self.post(view, data={'a': 2})
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(self.calls, 1)
+
+    def test_keys_are_scoped_per_user(self):
+        view = self.make_view()
+        self.post(view)
+        self.post(view, user=self.other)
+        self.assertEqual(self.calls, 2)
+
+    def test_too_long_key(self):
+        response = self.post(self.make_view(), key='k' * 256)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(IDEMPOTENCY={'WAIT_SECONDS': 0.2, 'LOCK_TTL': 60})
+    def test_duplicate_of_in_flight_request_gets_409(self):
+        view = self.make_view()
+        self.inner = lambda: self.post(view)
+        response = self.post(view)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.inner_response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(self.inner_response['Retry-After'], '1')
+        self.assertEqual(self.calls, 1)
+
+    @override_settings(IDEMPOTENCY={'WAIT_SECONDS': 0.2, 'LOCK_TTL': 0})
+    def test_abandoned_in_flight_request_is_taken_over(self):
+        view = self.make_view()
+        self.inner = lambda: self.post(view)
+        self.post(view)
+        self.assertEqual(self.inner_response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.calls, 2)
+
+    def test_server_error_is_not_stored(self):
+        view = self.make_view(Response({'error': 'boom'}, status=status.HTTP_503_SERVICE_UNAVAILABLE))
+        self.post(view)
+        self.post(view)
+        self.assertEqual(self.calls, 2)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    def test_exception_releases_key(self):
+        view = self.make_view(RuntimeError('boom'))
+        with self.assertRaises(RuntimeError):
+            self.post(view)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    @override_settings(IDEMPOTENCY={'TTL': -1})
+    def test_expired_response_is_pruned_and_key_runs_again(self):
+        view = self.make_view()
+        self.post(view)
+        self.assertEqual(prune_expired(), 1)
+        self.post(view)
+        self.assertEqual(self.calls, 2)
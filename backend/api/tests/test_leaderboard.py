@@ -0,0 +1,72 @@
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+
+from api.leaderboard import Leaderboards, RankedBoard
+from api.models import Course, Lesson, Submission, User
+from api.xp import award_lesson_xp
+
+
+class RankedBoardTests(SimpleTestCase):
+    def setUp(self):
+        self.board = RankedBoard([(1, 50, 'a'), (2, 80, 'b'), (3, 50, 'c')])
+
+    def test_ties_share_rank(self):
+        self.assertEqual([self.board.rank(user_id) for user_id in (1, 2, 3)], [2, 1, 2])
+        self.assertIsNone(self.board.rank(4))
+        self.assertEqual(
+            [(row['rank'], row['user_id'], row['xp']) for row in self.board.top(3)],
+            [(1, 2, 80), (2, 1, 50), (2, 3, 50)],
+        )
+
+    def test_set_moves_student(self):
+        self.board.set(3, 100)
+        self.board.set(4, 10, 'd')
+        self.assertEqual((self.board.rank(3), self.board.rank(2), self.board.rank(4)), (1, 2, 4))
+        self.assertEqual(len(self.board), 4)
+        self.assertEqual(self.board.top(1)[0]['username'], 'c')
+
+    def test_subset(self):
+        subset = self.board.subset([3, 2, 3, 99])
+        self.assertEqual(len(subset), 2)
+        self.assertEqual((subset.rank(2), subset.rank(3)), (1, 2))
+
+
+class LeaderboardsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.course = Course.objects.create(id='c1', title='Course', description='')
+        cls.lesson = Lesson.objects.create(
+            id='l1', course=cls.course, title='L1', description='', order=1, content='', xp_reward=40,
+        )
+        cls.first = User.objects.create(username='first', xp=10)
+        cls.second = User.objects.create(username='second', xp=20)
+
+    def setUp(self):
+        cache.clear()
+        self.boards = Leaderboards()
+
+    def test_payload_and_ledger_updates(self):
+        payload = self.boards.payload(self.first, 10)
+        self.assertEqual([row['username'] for row in payload['top']], ['second', 'first'])
+        self.assertEqual(payload['me'], {'rank': 2, 'xp': 10, 'total': 2})
+
+        submission = Submission.objects.create(student=self.first, lesson=self.lesson, code='print(1)')
+        with self.captureOnCommitCallbacks(execute=True):
+            award_lesson_xp(submission)
+        self.assertEqual(self.boards.payload(self.first, 10)['me'], {'rank': 1, 'xp': 50, 'total': 2})
+
+        course = self.boards.payload(self.second, 10, course_id=self.course.pk)
+        self.assertEqual([(row['username'], row['xp']) for row in course['top']], [('first', 40)])
+        self.assertEqual(course['me'], {'rank': None, 'xp': None, 'total': 1})
+
+    def test_rebuild_rows_are_loaded_before_lock(self):
+        loaded = []
+        original = self.boards._load_global
+
+        def load():
+            loaded.append(self.boards._lock.locked())
+            return original()
+
+        self.boards._load_global = load
+        self.boards.payload(None, 10)
+        self.assertEqual(loaded, [False])
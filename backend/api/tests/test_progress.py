@@ -0,0 +1,54 @@
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from api.models import Course, Lesson, User, UserProgress
+
+
+class UserProgressCountersTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create(username='student')
+        cls.course = Course.objects.create(id='c1', title='Course', description='')
+        for order in (1, 2, 3, 4):
+            Lesson.objects.create(
+                id=f'l{order}', course=cls.course, title=f'L{order}', description='', order=order, content='',
+            )
+
+    def test_percent_recomputed_only_when_completed_changes(self):
+        progress = UserProgress.objects.create(user=self.student, course=self.course, completed_lesson_ids=['l1'])
+        self.assertEqual(progress.percent_complete, 25)
+
+        progress = UserProgress.objects.get(pk=progress.pk)
+        progress.unlocked_lesson_ids = ['l1', 'l2']
+        # Только UPDATE: число уроков курса не нужно
+        with self.assertNumQueries(1):
+            progress.save()
+        self.assertEqual(progress.unlocked_count, 2)
+
+        progress.completed_lesson_ids = ['l1', 'l2']
+        with self.assertNumQueries(2):
+            progress.save()
+        self.assertEqual((progress.completed_count, progress.percent_complete), (2, 50))
+
+
+class StuckStudentsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create(username='teacher', role='teacher')
+        cls.course = Course.objects.create(id='c1', title='Course', description='')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.teacher)
+
+    def stuck(self, days):
+        return self.client.get('/api/progress/stuck/', {'course': 'c1', 'lesson_order': 2, 'days': days})
+
+    def test_invalid_days_are_rejected(self):
+        for days in ('inf', '-inf', 'nan', 'abc'):
+            with self.subTest(days=days):
+                self.assertEqual(self.stuck(days).status_code, 400)
+
+    def test_large_days_are_clamped(self):
+        self.assertEqual(self.stuck('1e300').status_code, 200)
+        self.assertEqual(self.stuck('-5').status_code, 200)
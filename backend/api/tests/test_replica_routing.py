@@ -0,0 +1,89 @@
+"""
+Маршрутизация чтения на реплику с отдельным файлом SQLite (без TEST.MIRROR):
+реплика видит только то, что в нее скопировано, поэтому отставание заметно.
+"""
+import shutil
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from api import db_router
+from api.models import Cohort, Course, User
+
+REPLICA = 'replica'
+
+
+class ReplicaRoutingTests(TransactionTestCase):
+    # '__all__' раскрывается в setUpClass, уже после регистрации подключения реплики
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.mkdtemp()
+        configured = connections.configure_settings({
+            'default': dict(settings.DATABASES['default']),
+            REPLICA: {'ENGINE': 'django.db.backends.sqlite3', 'NAME': str(Path(cls.tmpdir) / 'replica.sqlite3')},
+        })
+        connections.settings[REPLICA] = configured[REPLICA]
+        cls.alias_patch = mock.patch.object(db_router, 'replica_alias', return_value=REPLICA)
+        cls.alias_patch.start()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.alias_patch.stop()
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.settings[REPLICA]
+        shutil.rmtree(cls.tmpdir)
+
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user(username='teacher', password='x', role='teacher')
+        Cohort.objects.create(name='replicated', teacher=self.teacher)
+        # "Репликация": снимок основной базы; дальнейшие записи в реплику не попадают
+        db_router.sync_sqlite_replica(REPLICA)
+        Cohort.objects.create(name='lagging', teacher=self.teacher)
+        self.client = APIClient()
+        self.client.force_authenticate(self.teacher)
+
+    def cohort_names(self):
+        response = self.client.get('/api/cohorts/')
+        self.assertEqual(response.status_code, 200)
+        return sorted(cohort['name'] for cohort in response.json()['results'])
+
+    def test_get_reads_from_replica(self):
+        with CaptureQueriesContext(connections[REPLICA]) as replica_queries:
+            self.assertEqual(self.cohort_names(), ['replicated'])
+        self.assertTrue(replica_queries.captured_queries)
+
+    def test_write_goes_to_primary_and_pins_user(self):
+        response = self.client.post('/api/cohorts/', {'name': 'new', 'students': []}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Cohort.objects.using('default').filter(name='new').exists())
+        self.assertFalse(Cohort.objects.using(REPLICA).filter(name='new').exists())
+
+        # После записи пользователь читает из основной базы и видит свои изменения
+        with CaptureQueriesContext(connections[REPLICA]) as replica_queries:
+            self.assertEqual(self.cohort_names(), ['lagging', 'new', 'replicated'])
+        self.assertEqual(replica_queries.captured_queries, [])
+
+    def test_pin_expires(self):
+        self.client.post('/api/cohorts/', {'name': 'new', 'students': []}, format='json')
+        cache.delete(f'{db_router.PIN_KEY_PREFIX}{self.teacher.pk}')
+        self.assertEqual(self.cohort_names(), ['replicated'])
+
+    def test_routing_is_reset_after_request(self):
+        self.cohort_names()
+        self.assertIsNone(db_router._read_alias.get())
+        # Код вне запроса (сигналы, команды) читает из основной базы
+        self.assertEqual(Course.objects.db, 'default')
+        self.assertEqual(Cohort.objects.count(), 2)
@@ -0,0 +1,108 @@
+import threading
+import time
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from api.singleflight import LOCK_PREFIX, SingleFlight, get_or_build, group, put
+
+
+def run_threads(count, target):
+    barrier = threading.Barrier(count)
+    results = []
+    lock = threading.Lock()
+
+    def run():
+        barrier.wait()
+        try:
+            value = target()
+        except Exception as error:
+            value = error
+        with lock:
+            results.append(value)
+
+    threads = [threading.Thread(target=run) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    return results
+
+
+class SingleFlightGroupTests(SimpleTestCase):
+    def test_concurrent_calls_share_one_build(self):
+        flight = SingleFlight()
+        builds = []
+        release = threading.Event()
+
+        def build():
+            builds.append(1)
+            release.wait(5)
+            return 'value'
+
+        # Лидер держит сборку, пока все остальные не встанут в ожидание
+        threading.Timer(0.2, release.set).start()
+        results = run_threads(10, lambda: flight.do('key', build))
+        self.assertEqual(len(builds), 1)
+        self.assertEqual(results, ['value'] * 10)
+        self.assertFalse(flight.in_flight('key'))
+
+    def test_error_reaches_waiters_and_releases_key(self):
+        flight = SingleFlight()
+        release = threading.Event()
+
+        def fail():
+            release.wait(5)
+            raise ValueError('boom')
+
+        threading.Timer(0.2, release.set).start()
+        results = run_threads(5, lambda: flight.do('key', fail))
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+        self.assertEqual(flight.do('key', lambda: 'retry'), 'retry')
+
+
+@override_settings(SINGLE_FLIGHT={'ENABLED': True, 'CROSS_WORKER_LOCK': True, 'LOCK_TTL': 30, 'WAIT_SECONDS': 1})
+class GetOrBuildTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.builds = 0
+
+    def build(self):
+        self.builds += 1
+        return f'v{self.builds}'
+
+    def expire(self, key):
+        entry = cache.get(key)
+        entry['fresh_until'] = time.time() - 1
+        cache.set(key, entry)
+
+    def test_fresh_value_is_not_rebuilt(self):
+        self.assertEqual(get_or_build('k', self.build, ttl=60), 'v1')
+        self.assertEqual(get_or_build('k', self.build, ttl=60), 'v1')
+        self.assertEqual(self.builds, 1)
+
+    def test_expired_value_is_rebuilt(self):
+        get_or_build('k', self.build, ttl=60, stale_ttl=0)
+        self.expire('k')
+        self.assertEqual(get_or_build('k', self.build, ttl=60), 'v2')
+
+    def test_stale_value_served_while_refreshing(self):
+        get_or_build('k', self.build, ttl=60, stale_ttl=60)
+        self.expire('k')
+        self.assertEqual(get_or_build('k', self.build, ttl=60, stale_ttl=60), 'v1')
+        deadline = time.monotonic() + 5
+        while cache.get('k')['value'] != 'v2' and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(get_or_build('k', self.build, ttl=60, stale_ttl=60), 'v2')
+        self.assertEqual(self.builds, 2)
+
+    def test_waits_for_build_in_another_worker(self):
+        cache.add(LOCK_PREFIX + 'k', 1)
+        threading.Timer(0.2, lambda: put('k', 'other worker', ttl=60)).start()
+        self.assertEqual(get_or_build('k', self.build, ttl=60), 'other worker')
+        self.assertEqual(self.builds, 0)
+
+    def test_builds_itself_when_other_worker_is_gone(self):
+        cache.add(LOCK_PREFIX + 'k', 1)
+        self.assertEqual(get_or_build('k', self.build, ttl=60), 'v1')
+        self.assertFalse(group.in_flight('k'))
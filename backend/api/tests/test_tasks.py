@@ -0,0 +1,116 @@
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from api.models import Task
+from api.tasks import claim, enqueue, execute, heartbeat, requeue_stale, retry, task
+
+calls = []
+
+
+@task
+def record_call(value):
+    calls.append(value)
+    return {'value': value}
+
+
+@task
+def always_fail():
+    raise RuntimeError('boom')
+
+
+def not_a_task():
+    calls.append('not a task')
+
+
+@override_settings(TASKS={'EAGER': False, 'MAX_ATTEMPTS': 2, 'BACKOFF_BASE': 5, 'BACKOFF_MAX': 60, 'LOCK_TIMEOUT': 600})
+class TaskQueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_enqueue_creates_pending_task(self):
+        created = enqueue(record_call, delay=30, value=1)
+        self.assertEqual(created.status, 'pending')
+        self.assertEqual(created.name, 'api.tests.test_tasks.record_call')
+        self.assertEqual(created.kwargs, {'value': 1})
+        self.assertEqual(created.max_attempts, 2)
+        self.assertGreater(created.run_after, timezone.now() + timedelta(seconds=25))
+
+    @override_settings(TASKS={'EAGER': True})
+    def test_eager_runs_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self.assertIsNone(enqueue(record_call, value=1))
+        self.assertEqual(calls, [])
+        for callback in callbacks:
+            callback()
+        self.assertEqual(calls, [1])
+        self.assertFalse(Task.objects.exists())
+
+    def test_claim_takes_ready_tasks_once(self):
+        first = enqueue(record_call, value=1)
+        second = enqueue(record_call, value=2)
+        enqueue(record_call, delay=600, value=3)
+
+        claimed = claim('w:0')
+        self.assertIn(claimed.pk, {first.pk, second.pk})
+        self.assertEqual((claimed.status, claimed.locked_by, claimed.attempts), ('running', 'w:0', 1))
+        # Без SKIP LOCKED (SQLite) кандидаты перебираются в случайном порядке
+        self.assertEqual({claimed.pk, claim('w:1').pk}, {first.pk, second.pk})
+        self.assertIsNone(claim('w:2'))
+
+    def test_execute_success_stores_result(self):
+        enqueue(record_call, value=7)
+        claimed = claim('w:0')
+        self.assertTrue(execute(claimed))
+        claimed.refresh_from_db()
+        self.assertEqual((claimed.status, claimed.result, claimed.locked_by), ('done', {'value': 7}, ''))
+        self.assertEqual(calls, [7])
+
+    def test_failure_is_retried_with_backoff_then_dead(self):
+        enqueue(always_fail)
+        claimed = claim('w:0')
+        self.assertFalse(execute(claimed))
+        claimed.refresh_from_db()
+        self.assertEqual(claimed.status, 'pending')
+        self.assertIn('RuntimeError: boom', claimed.last_error)
+        self.assertGreaterEqual(claimed.run_after, timezone.now() + timedelta(seconds=4))
+        self.assertIsNone(claim('w:0'))
+
+        Task.objects.filter(pk=claimed.pk).update(run_after=timezone.now())
+        claimed = claim('w:0')
+        with self.assertLogs('api.tasks', level='ERROR'):
+            self.assertFalse(execute(claimed))
+        claimed.refresh_from_db()
+        self.assertEqual((claimed.status, claimed.attempts), ('dead', 2))
+
+        self.assertEqual(retry(Task.objects.filter(status='dead')), 1)
+        claimed.refresh_from_db()
+        self.assertEqual((claimed.status, claimed.attempts), ('pending', 0))
+
+    def test_only_registered_functions_run(self):
+        Task.objects.create(name='api.tests.test_tasks.not_a_task')
+        claimed = claim('w:0')
+        self.assertFalse(execute(claimed))
+        self.assertEqual(calls, [])
+        claimed.refresh_from_db()
+        self.assertIn('не зарегистрирована', claimed.last_error)
+
+    def test_heartbeat_keeps_long_task_from_being_requeued(self):
+        long_ago = timezone.now() - timedelta(hours=1)
+        alive = Task.objects.create(name='x', status='running', locked_by='host:1:0', locked_at=long_ago)
+        dead = Task.objects.create(name='x', status='running', locked_by='host:2:0', locked_at=long_ago)
+        self.assertEqual(heartbeat(['host:1:0', 'host:1:1']), 1)
+        self.assertEqual(requeue_stale(), 1)
+        alive.refresh_from_db()
+        dead.refresh_from_db()
+        self.assertEqual((alive.status, dead.status), ('running', 'pending'))
+
+    def test_result_of_requeued_task_is_not_overwritten(self):
+        enqueue(record_call, value=1)
+        claimed = claim('w:old')
+        # Задачу вернули в очередь и взял другой воркер
+        Task.objects.filter(pk=claimed.pk).update(locked_by='w:new')
+        execute(claimed)
+        claimed.refresh_from_db()
+        self.assertEqual((claimed.status, claimed.locked_by), ('running', 'w:new'))
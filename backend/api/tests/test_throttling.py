@@ -0,0 +1,89 @@
+import threading
+from types import SimpleNamespace
+from unittest import mock
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from api.throttling import bucket_throttles, parse_rate
+
+BUCKETS = {'test': {'user': (3, '60/min'), 'ip': (5, '60/min')}}
+START = 1_700_000_000.0
+
+
+def make_request(user_id=1, ip='10.0.0.1'):
+    user = SimpleNamespace(pk=user_id, is_authenticated=True) if user_id else AnonymousUser()
+    return SimpleNamespace(user=user, META={'REMOTE_ADDR': ip})
+
+
+@override_settings(THROTTLE_BUCKETS=BUCKETS)
+class TokenBucketTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.now = START
+        patcher = mock.patch('api.throttling.time.time', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user_throttle, self.ip_throttle = bucket_throttles('test')
+
+    def allowed(self, throttle_class, request, count):
+        return [throttle_class().allow_request(request, None) for _ in range(count)]
+
+    def test_parse_rate(self):
+        self.assertEqual(parse_rate('30/min'), 0.5)
+        self.assertEqual(parse_rate('2/s'), 2)
+
+    def test_burst_then_denied_with_wait(self):
+        request = make_request()
+        self.assertEqual(self.allowed(self.user_throttle, request, 4), [True, True, True, False])
+        throttle = self.user_throttle()
+        self.assertFalse(throttle.allow_request(request, None))
+        self.assertAlmostEqual(throttle.wait(), 1.0, places=2)
+
+    def test_refills_at_rate(self):
+        request = make_request()
+        self.allowed(self.user_throttle, request, 3)
+        self.now += 1  # 60/min: один токен в секунду
+        self.assertEqual(self.allowed(self.user_throttle, request, 2), [True, False])
+
+    def test_denied_requests_do_not_consume_tokens(self):
+        request = make_request()
+        self.allowed(self.user_throttle, request, 3)
+        self.assertEqual(self.allowed(self.user_throttle, request, 10), [False] * 10)
+        self.now += 1
+        self.assertTrue(self.user_throttle().allow_request(request, None))
+
+    def test_idle_bucket_holds_at_most_burst(self):
+        request = make_request()
+        self.allowed(self.user_throttle, request, 1)
+        self.now += 3600
+        self.assertEqual(self.allowed(self.user_throttle, request, 4), [True, True, True, False])
+
+    def test_buckets_are_per_user_and_per_ip(self):
+        self.allowed(self.user_throttle, make_request(user_id=1), 3)
+        self.assertTrue(self.user_throttle().allow_request(make_request(user_id=2), None))
+        # Анонимный запрос ограничивает только ведро по IP
+        anonymous = make_request(user_id=None)
+        self.assertEqual(self.allowed(self.user_throttle, anonymous, 10), [True] * 10)
+        self.assertEqual(self.allowed(self.ip_throttle, anonymous, 6), [True] * 5 + [False])
+
+    def test_concurrent_requests_never_exceed_burst(self):
+        request = make_request()
+        results = []
+        lock = threading.Lock()
+        barrier = threading.Barrier(20)
+
+        def hit():
+            barrier.wait()
+            for _ in range(5):
+                allowed = self.user_throttle().allow_request(request, None)
+                with lock:
+                    results.append(allowed)
+
+        threads = [threading.Thread(target=hit) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results.count(True), 3)
@@ -0,0 +1,62 @@
+from django.db import transaction
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from api.models import Course, Lesson, Submission, User, XPTransaction
+from api.xp import XP_PER_LEVEL, award_lesson_xp
+
+
+class AwardLessonXPTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user(username='student', password='x')
+        cls.teacher = User.objects.create_user(username='teacher', password='x', role='teacher')
+        course = Course.objects.create(id='c1', title='Course', description='')
+        cls.lesson = Lesson.objects.create(
+            id='l1', course=course, title='L1', description='', order=1, content='', xp_reward=150,
+        )
+        cls.second_lesson = Lesson.objects.create(
+            id='l2', course=course, title='L2', description='', order=2, content='', xp_reward=100,
+        )
+
+    def submit(self, lesson=None):
+        return Submission.objects.create(student=self.student, lesson=lesson or self.lesson, code='print(1)')
+
+    def test_credits_reward_and_level(self):
+        entry = award_lesson_xp(self.submit())
+        self.assertEqual((entry.amount, entry.course_id), (150, 'c1'))
+        award_lesson_xp(self.submit(self.second_lesson))
+        self.student.refresh_from_db()
+        self.assertEqual(self.student.xp, 250)
+        self.assertEqual(self.student.level, 1 + 250 // XP_PER_LEVEL)
+
+    def test_lesson_is_credited_once(self):
+        award_lesson_xp(self.submit())
+        # Другая отправка того же урока (повторное одобрение) не начисляет XP
+        self.assertIsNone(award_lesson_xp(self.submit()))
+        self.student.refresh_from_db()
+        self.assertEqual(self.student.xp, 150)
+        self.assertEqual(XPTransaction.objects.count(), 1)
+
+    def test_duplicate_keeps_outer_transaction_usable(self):
+        award_lesson_xp(self.submit())
+        with transaction.atomic():
+            self.assertIsNone(award_lesson_xp(self.submit()))
+            # Конфликт уникальности откатывает только точку сохранения
+            self.assertEqual(User.objects.get(pk=self.student.pk).xp, 150)
+
+    def test_zero_reward_is_skipped(self):
+        Lesson.objects.filter(pk=self.lesson.pk).update(xp_reward=0)
+        self.lesson.refresh_from_db()
+        self.assertIsNone(award_lesson_xp(self.submit()))
+        self.assertFalse(XPTransaction.objects.exists())
+
+    def test_repeated_approve_requests_credit_once(self):
+        client = APIClient()
+        client.force_authenticate(self.teacher)
+        for submission in (self.submit(), self.submit()):
+            for _ in range(2):
+                response = client.post(f'/api/submissions/{submission.pk}/approve/')
+                self.assertEqual(response.status_code, 200)
+        self.student.refresh_from_db()
+        self.assertEqual(self.student.xp, 150)
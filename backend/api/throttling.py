@@ -0,0 +1,120 @@
+"""
+Ограничение частоты запросов (token bucket).
+
+Ведро вмещает `burst` запросов и пополняется со скоростью `rate`:
+короткие всплески проходят, а длительная нагрузка ограничивается
+устойчивой скоростью. Отдельные ведра ведутся по пользователю и по IP
+(лимиты задаются в THROTTLE_BUCKETS).
+
+Состояние ведра - одно число в общем кэше (в продакшене Redis, см.
+api.checks): теоретическое время, когда ведро снова станет полным (GCRA).
+Каждый запрос сдвигает его атомарным cache.incr, поэтому лимит общий для
+всех воркеров и процессов и не превышается при одновременных запросах.
+"""
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.throttling import BaseThrottle
+
+from . import metrics
+
+KEY_PREFIX = 'throttle:'
+PERIODS = {'s': 1, 'sec': 1, 'm': 60, 'min': 60, 'h': 3600, 'hour': 3600, 'd': 86400, 'day': 86400}
+
+
+def parse_rate(rate):
+    """'30/min' -> токенов в секунду"""
+    num, period = rate.split('/')
+    return int(num) / PERIODS[period]
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Базовый класс: ведро для (scope, идентификатор клиента)"""
+    scope = None
+    kind = None  # 'user' или 'ip', ключ в THROTTLE_BUCKETS[scope]
+
+    def get_ident_key(self, request):
+        raise NotImplementedError
+
+    def get_limits(self):
+        burst, rate = settings.THROTTLE_BUCKETS[self.scope][self.kind]
+        return burst, parse_rate(rate)
+
+    def allow_request(self, request, view):
+        ident = self.get_ident_key(request)
+        if ident is None:
+            return True
+
+        burst, rate = self.get_limits()
+        key = f'{KEY_PREFIX}{self.scope}:{self.kind}:{ident}'
+        # Миллисекунды: incr работает с целыми числами
+        interval = max(1, round(1000 / rate))
+        capacity = burst * interval
+        # Ведро заполнится полностью за burst / rate секунд, дальше запись не нужна
+        timeout = math.ceil(capacity / 1000) + 1
+        now = int(time.time() * 1000)
+
+        full_at = _advance(key, interval, now, timeout)
+        if full_at - now <= capacity:
+            cache.touch(key, timeout)
+            self._wait = None
+            return True
+
+        # Отклоненный запрос не расходует токен
+        try:
+            cache.decr(key, interval)
+        except ValueError:
+            pass
+        self._wait = (full_at - now - capacity) / 1000
+        metrics.incr(f'throttle.{self.scope}.{self.kind}.denied')
+        return False
+
+    def wait(self):
+        return getattr(self, '_wait', None)
+
+
+def _advance(key, interval, now, timeout):
+    """Атомарно забирает токен: сдвигает время заполнения ведра на interval и возвращает его"""
+    for _ in range(3):
+        try:
+            full_at = cache.incr(key, interval)
+        except ValueError:
+            # Ключа нет: ведро полное, отсчет от текущего момента
+            if cache.add(key, now + interval, timeout=timeout):
+                return now + interval
+            continue
+        if full_at - interval >= now:
+            return full_at
+        # Время в прошлом - ведро успело заполниться. Одновременные запросы в этот
+        # момент могут затереть друг друга, но ведро полное, и они все равно проходят
+        cache.set(key, now + interval, timeout=timeout)
+        return now + interval
+    return now + interval
+
+
+class UserTokenBucketThrottle(TokenBucketThrottle):
+    """Ведро на пользователя (анонимные запросы ограничивает только ведро по IP)"""
+    kind = 'user'
+
+    def get_ident_key(self, request):
+        if request.user and request.user.is_authenticated:
+            return request.user.pk
+        return None
+
+
+class IPTokenBucketThrottle(TokenBucketThrottle):
+    """Ведро на IP: ограничивает также перебор с разных учетных записей"""
+    kind = 'ip'
+
+    def get_ident_key(self, request):
+        return self.get_ident(request)
+
+
+def bucket_throttles(scope):
+    """Классы throttle для группы эндпоинтов: [по пользователю, по IP]"""
+    return [
+        type(f'{kind.__name__}_{scope}', (kind,), {'scope': scope})
+        for kind in (UserTokenBucketThrottle, IPTokenBucketThrottle)
+    ]
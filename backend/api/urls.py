@@ -3,9 +3,11 @@ from django.views.decorators.csrf import csrf_exempt
 from rest_framework.routers import DefaultRouter
 from .views import (
     CourseViewSet, LessonViewSet, UserViewSet, UserProgressViewSet, check_code,
-    StudentLessonViewSet, StudentChallengeViewSet, SubmissionViewSet
+    StudentLessonViewSet, StudentChallengeViewSet, SubmissionViewSet, metrics,
+    event_ticket, submission_events, my_events, leaderboard, LessonStatsViewSet, course_analytics,
+    CohortViewSet, TaskViewSet, search
 )
-from .auth_views import login, logout, me
+from .auth_views import login, logout, me, refresh
 
 router = DefaultRouter()
 router.register(r'courses', CourseViewSet, basename='course')
@@ -15,12 +17,23 @@ router.register(r'progress', UserProgressViewSet, basename='userprogress')
 router.register(r'student-lessons', StudentLessonViewSet, basename='studentlesson')
 router.register(r'student-challenges', StudentChallengeViewSet, basename='studentchallenge')
 router.register(r'submissions', SubmissionViewSet, basename='submission')
+router.register(r'analytics/lessons', LessonStatsViewSet, basename='lessonstats')
+router.register(r'cohorts', CohortViewSet, basename='cohort')
+router.register(r'tasks', TaskViewSet, basename='task')
 
 urlpatterns = [
     path('', include(router.urls)),
     path('auth/login/', csrf_exempt(login), name='login'),
     path('auth/logout/', csrf_exempt(logout), name='logout'),
+    path('auth/refresh/', csrf_exempt(refresh), name='token_refresh'),
     path('auth/me/', me, name='me'),
     path('check_code/', check_code, name='check_code'),
+    path('metrics/', metrics, name='metrics'),
+    path('leaderboard/', leaderboard, name='leaderboard'),
+    path('events/ticket/', event_ticket, name='event_ticket'),
+    path('events/submissions/', submission_events, name='submission_events'),
+    path('events/me/', my_events, name='my_events'),
+    path('analytics/courses/<str:course_id>/', course_analytics, name='course_analytics'),
+    path('search/', search, name='search'),
 ]
 
@@ -0,0 +1,98 @@
+"""
+Кэш пользователей для аутентификации.
+
+Два уровня: локальный LRU с TTL внутри процесса и общий кэш Django.
+Локальный уровень живет недолго, поэтому изменения, сделанные в другом
+воркере, становятся видны не позже чем через AUTH_USER_CACHE['LOCAL_TTL'].
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+
+SHARED_KEY_PREFIX = 'auth:user:'
+
+
+def _setting(name, default):
+    return getattr(settings, 'AUTH_USER_CACHE', {}).get(name, default)
+
+
+class LocalUserCache:
+    """Потокобезопасный LRU кэш с ограничением по времени жизни записи"""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+local_cache = LocalUserCache(
+    maxsize=_setting('LOCAL_MAXSIZE', 1024),
+    ttl=_setting('LOCAL_TTL', 10),
+)
+
+
+def shared_ttl():
+    return _setting('SHARED_TTL', 300)
+
+
+def get_user(user_id):
+    """
+    Возвращает пользователя по id: сначала из локального кэша, затем из общего,
+    и только потом из базы. Каждому запросу отдается своя копия объекта.
+    """
+    user = local_cache.get(user_id)
+    if user is None:
+        shared_key = f'{SHARED_KEY_PREFIX}{user_id}'
+        user = cache.get(shared_key)
+        if user is None:
+            user = get_user_model().objects.get(pk=user_id)
+            cache.set(shared_key, user, timeout=shared_ttl())
+        local_cache.set(user_id, user)
+    return copy.copy(user)
+
+
+def invalidate_user(user_id):
+    """Удаляет пользователя из обоих уровней кэша"""
+    local_cache.delete(user_id)
+    cache.delete(f'{SHARED_KEY_PREFIX}{user_id}')
@@ -1,26 +1,68 @@
+import math
+from datetime import timedelta
+
 from rest_framework import viewsets, status
-from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.decorators import (
+    action, api_view, permission_classes, throttle_classes
+)
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticatedOrReadOnly, AllowAny, IsAuthenticated
+from rest_framework.exceptions import APIException, NotAuthenticated, PermissionDenied
+from rest_framework.request import Request
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Max, Q
 from django.utils import timezone
 from .models import (
     Course, Lesson, UserProgress, Challenge,
-    StudentLesson, StudentChallenge, Submission
+    StudentLesson, StudentChallenge, Submission, LessonStats, Cohort, SubmissionAttempt, Task,
+    SearchDocument
+)
+from .authentication import JWTAuthentication, StreamTicketAuthentication, issue_stream_ticket
+from .db_router import ReplicaReadMixin
+from .xp import award_lesson_xp
+from .analytics import summarize
+from .grading import grade
+from .throttling import bucket_throttles
+from .idempotency import idempotent
+from .catalog import bump_catalog_version, course_for_user
+from .cohorts import CHALLENGE_FIELDS, bulk_assign_challenge, bulk_unlock
+from .similarity import DEFAULT_THRESHOLD, find_similar
+from .history import attempt_diff, load_code
+from .payloads import full_payload
+from .search import backend_name, search as search_documents
+from .tasks import (
+    complete_approved_lesson, enqueue, is_eager, publish_course_bundle, reconcile_progress, retry as retry_tasks
 )
+from .events import (
+    SUBMISSIONS_CHANNEL, astream_events, notify_student, parse_last_event_id, stream_events, student_channel
+)
+from .metrics import metrics_snapshot
+from .leaderboard import leaderboards
+from .permissions import IsAdminRole, IsTeacherOrAdmin
 from .serializers import (
     CourseSerializer, CourseListSerializer,
     LessonSerializer, LessonCreateUpdateSerializer,
     UserSerializer, UserProgressSerializer, UserProgressCreateUpdateSerializer,
     StudentLessonSerializer, StudentChallengeSerializer,
-    SubmissionSerializer, SubmissionCreateSerializer
+    SubmissionSerializer, SubmissionCreateSerializer, LessonStatsSerializer,
+    ChallengeSerializer, CohortSerializer, SubmissionAttemptSerializer, TaskSerializer
 )
 
 User = get_user_model()
 
+CHECK_CODE_THROTTLES = bucket_throttles('check_code')
+WRITE_THROTTLES = bucket_throttles('write')
+# Верхняя граница параметра days в /api/progress/stuck/
+MAX_STUCK_DAYS = 3650
+
 
-class CourseViewSet(viewsets.ModelViewSet):
+class CourseViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     """ViewSet для CRUD операций с курсами"""
     queryset = Course.objects.all()
     permission_classes = [AllowAny]  # Разрешаем GET без аутентификации
@@ -35,16 +77,69 @@ class CourseViewSet(viewsets.ModelViewSet):
         # Можно добавить фильтрацию по параметрам запроса
         return queryset.prefetch_related('lessons', 'lessons__challenge')
     
+    def retrieve(self, request, *args, **kwargs):
+        """Курс с уроками: общий payload из кэша каталога + is_locked ученика"""
+        payload = course_for_user(kwargs['pk'], request.user)
+        if payload is None:
+            return Response({'detail': 'Не найдено.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(payload)
+    
     @action(detail=True, methods=['get'])
     def lessons(self, request, pk=None):
         """Получить все уроки курса"""
-        course = self.get_object()
-        lessons = course.lessons.all().order_by('order')
-        serializer = LessonSerializer(lessons, many=True, context={'request': request})
-        return Response(serializer.data)
+        payload = course_for_user(pk, request.user)
+        if payload is None:
+            return Response({'detail': 'Не найдено.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(payload['lessons'])
+    
+    @action(
+        detail=True, methods=['post'],
+        permission_classes=[IsTeacherOrAdmin], throttle_classes=WRITE_THROTTLES,
+    )
+    def reorder(self, request, pk=None):
+        """
+        Новый порядок уроков курса: {"lesson_ids": [...]} - все уроки курса по порядку.
+        Применяется одной транзакцией; кэш каталога сбрасывается один раз.
+        """
+        lesson_ids = request.data.get('lesson_ids')
+        if not isinstance(lesson_ids, list) or not all(isinstance(lesson_id, str) for lesson_id in lesson_ids):
+            return Response({'error': 'lesson_ids должен быть списком id уроков'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(set(lesson_ids)) != len(lesson_ids):
+            return Response({'error': 'lesson_ids содержит повторы'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        with transaction.atomic():
+            course = get_object_or_404(Course.objects.select_for_update(), pk=pk)
+            lessons = {lesson.id: lesson for lesson in Lesson.objects.select_for_update().filter(course=course)}
+            if set(lesson_ids) != set(lessons):
+                return Response({
+                    'error': 'lesson_ids должен содержать все уроки курса',
+                    'missing': sorted(set(lessons) - set(lesson_ids)),
+                    'unknown': sorted(set(lesson_ids) - set(lessons)),
+                }, status=status.HTTP_400_BAD_REQUEST)
+            
+            changed = [lessons[lesson_id] for position, lesson_id in enumerate(lesson_ids, start=1)
+                       if lessons[lesson_id].order != position]
+            if changed:
+                # unique_together (course, order) проверяется на каждой строке, поэтому в два шага:
+                # сначала отрицательные временные номера (не пересекаются с занятыми), затем итоговые
+                new_order = {lesson_id: position for position, lesson_id in enumerate(lesson_ids, start=1)}
+                now = timezone.now()
+                for lesson in changed:
+                    lesson.order = -new_order[lesson.id]
+                Lesson.objects.bulk_update(changed, ['order'])
+                for lesson in changed:
+                    lesson.order = new_order[lesson.id]
+                    lesson.updated_at = now
+                Lesson.objects.bulk_update(changed, ['order', 'updated_at'])
+                # bulk_update не отправляет сигналы: сбрасываем каталог и бандл один раз
+                transaction.on_commit(bump_catalog_version)
+                enqueue(publish_course_bundle, course_id=course.id)
+        
+        payload = course_for_user(course.id, request.user)
+        return Response({'updated': len(changed), 'lessons': payload['lessons']})
 
 
-class LessonViewSet(viewsets.ModelViewSet):
+class LessonViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     """ViewSet для CRUD операций с уроками"""
     queryset = Lesson.objects.all()
     permission_classes = [AllowAny]  # Разрешаем GET без аутентификации
@@ -79,7 +174,7 @@ class LessonViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     """ViewSet для CRUD операций с пользователями"""
     queryset = User.objects.all()
     serializer_class = UserSerializer
@@ -94,7 +189,7 @@ class UserViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class UserProgressViewSet(viewsets.ModelViewSet):
+class UserProgressViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     """ViewSet для CRUD операций с прогрессом пользователя"""
     queryset = UserProgress.objects.all()
     permission_classes = [AllowAny]  # Разрешаем GET без аутентификации
@@ -116,7 +211,8 @@ class UserProgressViewSet(viewsets.ModelViewSet):
         
         return queryset.select_related('user', 'course')
     
-    @action(detail=False, methods=['post'])
+    @action(detail=False, methods=['post'], throttle_classes=WRITE_THROTTLES)
+    @idempotent
     def complete_lesson(self, request):
         """Отметить урок как завершенный"""
         user_id = request.data.get('user_id')
@@ -139,10 +235,77 @@ class UserProgressViewSet(viewsets.ModelViewSet):
             progress.completed_lesson_ids.append(lesson_id)
             progress.current_lesson_id = lesson_id
             progress.save()
+            notify_student(progress.user_id, 'lesson.completed', {'lesson': lesson_id, 'course': course_id})
         
         serializer = self.get_serializer(progress)
         return Response(serializer.data)
     
+    def _course_rows(self, request):
+        """Прогресс учеников курса (?course, опционально ?cohort) без JSON-списков уроков"""
+        course_id = request.query_params.get('course')
+        if not course_id:
+            return None, Response({'error': 'course обязателен'}, status=status.HTTP_400_BAD_REQUEST)
+        queryset = UserProgress.objects.filter(course_id=course_id)
+        cohort_id = request.query_params.get('cohort')
+        if cohort_id:
+            queryset = queryset.filter(user__cohorts=cohort_id)
+        return queryset.values(
+            'user_id', 'user__username', 'completed_count', 'unlocked_count',
+            'percent_complete', 'current_lesson_id', 'last_activity_at',
+        ), None
+    
+    @action(detail=False, methods=['get'], permission_classes=[IsTeacherOrAdmin])
+    def overview(self, request):
+        """Сводка класса по курсу: "7/20 уроков, 35%" для каждого ученика"""
+        rows, error = self._course_rows(request)
+        if error:
+            return error
+        lessons_total = Lesson.objects.filter(course_id=request.query_params['course']).count()
+        rows = list(rows.order_by('-percent_complete', 'user__username'))
+        return Response({'lessons_total': lessons_total, 'students': rows})
+    
+    @action(detail=False, methods=['get'], permission_classes=[IsTeacherOrAdmin])
+    def stuck(self, request):
+        """
+        Ученики, застрявшие на уроке: завершено ровно lesson_order - 1 уроков
+        и нет активности дольше days дней (по умолчанию 3).
+        """
+        rows, error = self._course_rows(request)
+        if error:
+            return error
+        try:
+            lesson_order = int(request.query_params.get('lesson_order', ''))
+            days = float(request.query_params.get('days', 3))
+            if not math.isfinite(days):
+                raise ValueError(days)
+        except ValueError:
+            return Response({'error': 'lesson_order и days должны быть числами'}, status=status.HTTP_400_BAD_REQUEST)
+        # Очень большие значения не должны переполнять timedelta
+        days = min(max(days, 0), MAX_STUCK_DAYS)
+        
+        inactive_since = timezone.now() - timedelta(days=days)
+        rows = rows.filter(completed_count=lesson_order - 1).filter(
+            Q(last_activity_at__lt=inactive_since) | Q(last_activity_at__isnull=True)
+        ).order_by('last_activity_at')
+        return Response({'lesson_order': lesson_order, 'inactive_since': inactive_since, 'students': list(rows)})
+    
+    @action(detail=False, methods=['post'], permission_classes=[IsAdminRole], throttle_classes=WRITE_THROTTLES)
+    def reconcile(self, request):
+        """
+        Сверка StudentLesson и UserProgress (только админ): {"course", "user", "dry_run"}.
+        Сверка одного курса или ученика выполняется сразу и возвращает отчет;
+        полная сверка ставится фоновой задачей, отчет - в /api/tasks/<id>/ (result).
+        """
+        options = {
+            'course_id': request.data.get('course') or None,
+            'user_id': request.data.get('user') or None,
+            'dry_run': str(request.data.get('dry_run', '')).lower() in ['1', 'true', 'yes'],
+        }
+        if options['course_id'] or options['user_id'] or is_eager():
+            return Response(reconcile_progress(**options))
+        task = enqueue(reconcile_progress, **options)
+        return Response({'task': task.id, 'status': task.status}, status=status.HTTP_202_ACCEPTED)
+    
     @action(detail=False, methods=['get'], url_path='current')
     def current(self, request):
         """Получить текущий прогресс пользователя по курсу"""
@@ -171,6 +334,8 @@ class UserProgressViewSet(viewsets.ModelViewSet):
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])  # Требуем аутентификацию
+@throttle_classes(CHECK_CODE_THROTTLES)
+@idempotent
 def check_code(request):
     """
     Проверяет выполнение Lua кода, сравнивает результат с ожидаемым выводом
@@ -220,15 +385,8 @@ def check_code(request):
         if challenge.expected_output:
             expected_output = challenge.expected_output
             
-            # Проверяем, совпадает ли вывод с ожидаемым
-            passed_auto_check = False
-            
-            if isinstance(output, list):
-                # Объединяем все строки вывода в одну строку через пробел
-                actual_output = ' '.join(str(line).strip() for line in output if line)
-                passed_auto_check = actual_output.strip() == str(expected_output).strip()
-            elif isinstance(output, str):
-                passed_auto_check = str(output).strip() == str(expected_output).strip()
+            # Проверяем, совпадает ли вывод с ожидаемым (готовый вердикт для уже проверенного кода)
+            passed_auto_check, cached_verdict = grade(challenge, code, output)
             
             # Создаем Submission ТОЛЬКО если проверка пройдена
             if passed_auto_check:
@@ -270,6 +428,7 @@ def check_code(request):
                     'message': 'Challenge пройден! Задание отправлено на проверку админу.',
                     'expected': expected_output,
                     'actual': output,
+                    'cached': cached_verdict,
                     'submission_id': submission.id,
                 })
             else:
@@ -279,6 +438,7 @@ def check_code(request):
                     'message': 'Challenge не пройден. Проверьте код и попробуйте снова.',
                     'expected': expected_output,
                     'actual': output,
+                    'cached': cached_verdict,
                 })
         else:
             # Challenge есть, но нет expected_output - создаем Submission без проверки
@@ -360,7 +520,7 @@ def check_code(request):
     })
 
 
-class StudentLessonViewSet(viewsets.ModelViewSet):
+class StudentLessonViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     """ViewSet для CRUD операций с индивидуальными уроками учеников"""
     queryset = StudentLesson.objects.all()
     serializer_class = StudentLessonSerializer
@@ -390,17 +550,22 @@ class StudentLessonViewSet(viewsets.ModelViewSet):
         
         return queryset.select_related('student', 'lesson')
     
-    @action(detail=True, methods=['post'])
+    @action(detail=True, methods=['post'], throttle_classes=WRITE_THROTTLES)
     def unlock(self, request, pk=None):
         """Разблокировать урок для ученика"""
         student_lesson = self.get_object()
         student_lesson.is_unlocked = True
         student_lesson.save()  # save() автоматически синхронизирует с UserProgress.unlocked_lesson_ids
+        notify_student(student_lesson.student_id, 'lesson.unlocked', {
+            'lesson': student_lesson.lesson_id,
+            'course': student_lesson.lesson.course_id,
+        })
         
         serializer = self.get_serializer(student_lesson)
         return Response(serializer.data)
     
-    @action(detail=True, methods=['post'])
+    @action(detail=True, methods=['post'], throttle_classes=WRITE_THROTTLES)
+    @idempotent
     def complete(self, request, pk=None):
         """Отметить урок как завершенный"""
         student_lesson = self.get_object()
@@ -437,11 +602,16 @@ class StudentLessonViewSet(viewsets.ModelViewSet):
                 current_lesson_id=student_lesson.lesson.id
             )
         
+        notify_student(student_lesson.student_id, 'lesson.completed', {
+            'lesson': student_lesson.lesson_id,
+            'course': student_lesson.lesson.course_id,
+        })
+        
         serializer = self.get_serializer(student_lesson)
         return Response(serializer.data)
 
 
-class StudentChallengeViewSet(viewsets.ModelViewSet):
+class StudentChallengeViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     """ViewSet для CRUD операций с индивидуальными заданиями учеников"""
     queryset = StudentChallenge.objects.all()
     serializer_class = StudentChallengeSerializer
@@ -472,7 +642,7 @@ class StudentChallengeViewSet(viewsets.ModelViewSet):
         return queryset.select_related('student', 'lesson')
 
 
-class SubmissionViewSet(viewsets.ModelViewSet):
+class SubmissionViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     """ViewSet для CRUD операций с отправленными заданиями"""
     queryset = Submission.objects.all()
     permission_classes = [IsAuthenticated]
@@ -502,7 +672,8 @@ class SubmissionViewSet(viewsets.ModelViewSet):
         
         return queryset.select_related('student', 'lesson', 'reviewed_by')
     
-    @action(detail=True, methods=['post'])
+    @action(detail=True, methods=['post'], throttle_classes=WRITE_THROTTLES)
+    @idempotent
     def approve(self, request, pk=None):
         """Одобрить задание (только админ/учитель)"""
         if request.user.role not in ['admin', 'teacher']:
@@ -514,45 +685,106 @@ class SubmissionViewSet(viewsets.ModelViewSet):
         submission = self.get_object()
         admin_comment = request.data.get('admin_comment', '')
         
-        submission.status = 'approved'
-        submission.admin_comment = admin_comment
-        submission.reviewed_by = request.user
-        submission.reviewed_at = timezone.now()
-        submission.save()
-        
-        # Разблокируем следующий урок для ученика
-        lesson = submission.lesson
-        course = lesson.course
-        
-        # Находим следующий урок
-        next_lesson = Lesson.objects.filter(
-            course=course,
-            order=lesson.order + 1
-        ).first()
-        
-        if next_lesson:
-            student_lesson, created = StudentLesson.objects.get_or_create(
-                student=submission.student,
-                lesson=next_lesson,
-                defaults={'is_unlocked': True}
-            )
-            if not created:
-                student_lesson.is_unlocked = True
-                student_lesson.save()
-        
-        # Отмечаем текущий урок как завершенный
-        student_lesson_current, _ = StudentLesson.objects.get_or_create(
-            student=submission.student,
-            lesson=lesson
-        )
-        student_lesson_current.is_completed = True
-        student_lesson_current.completed_at = timezone.now()
-        student_lesson_current.save()
+        with transaction.atomic():
+            submission.status = 'approved'
+            submission.admin_comment = admin_comment
+            submission.reviewed_by = request.user
+            submission.reviewed_at = timezone.now()
+            submission.save()
+            
+            # Начисляем XP за урок (повторное одобрение не начисляет повторно)
+            award_lesson_xp(submission)
+            
+            # Завершение урока и разблокировка следующего - в фоне, после коммита одобрения
+            enqueue(complete_approved_lesson, submission_id=submission.id)
         
         serializer = self.get_serializer(submission)
         return Response(serializer.data)
     
-    @action(detail=True, methods=['post'])
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        """
+        Похожие решения других учеников по тому же уроку (только админ/учитель).
+        Параметры: threshold (0..1, по умолчанию 0.5), limit (по умолчанию 20).
+        """
+        if request.user.role not in ['admin', 'teacher']:
+            return Response(
+                {'error': 'Только админ или учитель могут искать похожие решения'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        submission = self.get_object()
+        try:
+            threshold = min(max(float(request.query_params.get('threshold', DEFAULT_THRESHOLD)), 0.0), 1.0)
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), 100)
+        except ValueError:
+            return Response({'error': 'Некорректные параметры threshold или limit'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        results = [
+            {
+                'id': other.id,
+                'student': other.student_id,
+                'student_username': other.student.username,
+                'status': other.status,
+                'submitted_at': other.submitted_at,
+                'similarity': round(score, 3),
+            }
+            for score, other in find_similar(submission, threshold=threshold, limit=limit)
+        ]
+        return Response({'submission': submission.id, 'lesson': submission.lesson_id, 'results': results})
+    
+    @action(detail=True, methods=['get'])
+    def payload(self, request, pk=None):
+        """Полные вывод и ошибка отправки (в списке отдается только их начало, см. has_payload)"""
+        submission = self.get_object()
+        return Response({'id': submission.id, **full_payload(submission)})
+    
+    def _attempts(self, submission):
+        return SubmissionAttempt.objects.filter(
+            student_id=submission.student_id, lesson_id=submission.lesson_id
+        ).select_related('code').order_by('number')
+    
+    @action(detail=True, methods=['get'])
+    def attempts(self, request, pk=None):
+        """
+        История попыток ученика по уроку этой отправки (включая отклоненные отправки).
+        Параметр number возвращает одну попытку вместе с кодом.
+        """
+        submission = self.get_object()
+        attempts = self._attempts(submission)
+        number = request.query_params.get('number')
+        if number is not None:
+            attempt = get_object_or_404(attempts, number=number)
+            data = SubmissionAttemptSerializer(attempt).data
+            data['code'] = load_code(attempt.code_id)
+            return Response(data)
+        return Response(SubmissionAttemptSerializer(attempts, many=True).data)
+    
+    @action(detail=True, methods=['get'])
+    def diff(self, request, pk=None):
+        """
+        Diff кода между попытками: параметры from и to (номера попыток).
+        По умолчанию - последняя попытка против предыдущей.
+        """
+        submission = self.get_object()
+        attempts = self._attempts(submission)
+        try:
+            to_number = int(request.query_params.get('to') or attempts.aggregate(last=Max('number'))['last'] or 0)
+            from_number = int(request.query_params.get('from') or to_number - 1)
+        except ValueError:
+            return Response({'error': 'from и to должны быть номерами попыток'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        by_number = {attempt.number: attempt for attempt in attempts.filter(number__in=[from_number, to_number])}
+        if from_number not in by_number or to_number not in by_number:
+            return Response({'error': 'Попытка не найдена'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({
+            'from': from_number,
+            'to': to_number,
+            'diff': attempt_diff(by_number[from_number], by_number[to_number]),
+        })
+    
+    @action(detail=True, methods=['post'], throttle_classes=WRITE_THROTTLES)
+    @idempotent
     def reject(self, request, pk=None):
         """Отклонить задание (только админ/учитель)"""
         if request.user.role not in ['admin', 'teacher']:
@@ -573,3 +805,260 @@ class SubmissionViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(submission)
         return Response(serializer.data)
 
+
+@api_view(['GET'])
+@permission_classes([IsAdminRole])
+def metrics(request):
+    """Метрики текущего воркера (подключения к БД, кэши и т.д.)"""
+    return Response(metrics_snapshot())
+
+
+def _stream_user(request, permission_class):
+    """
+    Аутентификация и проверка прав для потока SSE.
+    Потоки - асинхронные view Django (DRF не отдает асинхронные ответы),
+    поэтому проверки DRF вызываются вручную.
+    """
+    drf_request = Request(request, authenticators=[JWTAuthentication(), StreamTicketAuthentication()])
+    if not permission_class().has_permission(drf_request, None):
+        if not drf_request.user.is_authenticated:
+            raise NotAuthenticated()
+        raise PermissionDenied()
+    return drf_request.user
+
+
+async def event_stream_response(request, permission_class, channels_for):
+    """
+    StreamingHttpResponse с потоком SSE по каналам channels_for(user).
+    Под ASGI поток - корутина и не занимает поток воркера; под WSGI - обычный генератор.
+    """
+    if request.method != 'GET':
+        return JsonResponse({'detail': 'Метод не разрешен'}, status=405)
+    try:
+        user = await sync_to_async(_stream_user)(request, permission_class)
+    except APIException as error:
+        return JsonResponse({'detail': error.detail}, status=error.status_code)
+
+    channels = channels_for(user)
+    last_event_id = await sync_to_async(parse_last_event_id)(request, channels)
+    if isinstance(request, ASGIRequest):
+        stream = astream_events(channels, last_event_id)
+    else:
+        stream = stream_events(channels, last_event_id)
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # nginx не должен буферизовать поток
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def event_ticket(request):
+    """
+    Короткоживущий билет для потоков SSE: /api/events/.../?ticket=<ticket>.
+    Запрашивается обычным запросом с JWT (истекший токен обновится на клиенте)
+    перед каждым подключением.
+    """
+    return Response({'ticket': issue_stream_ticket(request.user), 'expires_in': settings.SSE_TICKET_SECONDS})
+
+
+async def submission_events(request):
+    """
+    Поток SSE для проверки заданий: submission.created / submission.updated / submission.reviewed.
+    Поддерживает возобновление по заголовку Last-Event-ID.
+    """
+    return await event_stream_response(request, IsTeacherOrAdmin, lambda user: [SUBMISSIONS_CHANNEL])
+
+
+async def my_events(request):
+    """
+    Личный поток SSE ученика: submission.reviewed, lesson.unlocked, lesson.completed,
+    challenge.assigned, xp.changed.
+    Клиент по событию обновляет только затронутые данные вместо опроса прогресса.
+    """
+    return await event_stream_response(request, IsAuthenticated, lambda user: [student_channel(user.pk)])
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def leaderboard(request):
+    """
+    Рейтинг учеников по XP.
+    Параметры: course (рейтинг по XP, заработанному в курсе), cohort (только ученики
+    класса; доступен ученикам класса, его учителю и админу), limit (по умолчанию 10).
+    """
+    try:
+        limit = min(max(int(request.query_params.get('limit', 10)), 1), 100)
+    except ValueError:
+        limit = 10
+
+    course_id = request.query_params.get('course')
+    if course_id and not Course.objects.filter(pk=course_id).exists():
+        return Response({'error': 'Курс не найден'}, status=status.HTTP_404_NOT_FOUND)
+
+    student_ids = None
+    cohort_id = request.query_params.get('cohort')
+    if cohort_id:
+        user = request.user
+        cohorts = Cohort.objects.all()
+        if not (user.role == 'admin' or user.is_staff):
+            cohorts = cohorts.filter(Q(teacher=user) | Q(students=user)).distinct()
+        cohort = cohorts.filter(pk=cohort_id).first() if cohort_id.isdigit() else None
+        if cohort is None:
+            return Response({'error': 'Класс не найден'}, status=status.HTTP_404_NOT_FOUND)
+        student_ids = list(cohort.students.values_list('id', flat=True))
+
+    return Response(leaderboards.payload(request.user, limit, course_id=course_id, student_ids=student_ids))
+
+
+class LessonStatsViewSet(ReplicaReadMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Аналитика по урокам для учителей (предрасчитанные LessonStats).
+    Фильтр: ?course=<id>
+    """
+    serializer_class = LessonStatsSerializer
+    permission_classes = [IsTeacherOrAdmin]
+    
+    def get_queryset(self):
+        queryset = LessonStats.objects.select_related('lesson').order_by('course_id', 'lesson__order')
+        course_id = self.request.query_params.get('course')
+        if course_id:
+            queryset = queryset.filter(course_id=course_id)
+        return queryset
+
+
+class CohortViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
+    """
+    Классы учителя. Учитель видит только свои классы, админ - все.
+    unlock и assign-challenge применяются ко всем ученикам класса сразу.
+    """
+    serializer_class = CohortSerializer
+    permission_classes = [IsTeacherOrAdmin]
+    
+    def get_queryset(self):
+        queryset = Cohort.objects.select_related('teacher').prefetch_related('students')
+        user = self.request.user
+        if not (user.role == 'admin' or user.is_staff):
+            queryset = queryset.filter(teacher=user)
+        return queryset
+    
+    def perform_create(self, serializer):
+        serializer.save(teacher=self.request.user)
+    
+    @action(detail=True, methods=['post'], throttle_classes=WRITE_THROTTLES)
+    def unlock(self, request, pk=None):
+        """Разблокировать урок всем ученикам класса: {"lesson": "<id>"}"""
+        cohort = self.get_object()
+        lesson = get_object_or_404(Lesson, pk=request.data.get('lesson'))
+        count = bulk_unlock(cohort, lesson)
+        return Response({'lesson': lesson.id, 'students': count})
+    
+    @action(detail=True, methods=['post'], url_path='assign-challenge', throttle_classes=WRITE_THROTTLES)
+    def assign_challenge(self, request, pk=None):
+        """
+        Выдать задание урока всем ученикам класса: {"lesson": "<id>", "instructions": ..., ...}.
+        Не переданные поля берутся из шаблона задания урока.
+        """
+        cohort = self.get_object()
+        lesson = get_object_or_404(Lesson.objects.select_related('challenge'), pk=request.data.get('lesson'))
+        template = getattr(lesson, 'challenge', None)
+        challenge_data = ChallengeSerializer(template).data if template else {}
+        
+        overrides = {name: request.data[name] for name in CHALLENGE_FIELDS if name in request.data}
+        serializer = ChallengeSerializer(data={**challenge_data, **overrides})
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        count = bulk_assign_challenge(cohort, lesson, serializer.validated_data)
+        return Response({'lesson': lesson.id, 'students': count})
+
+
+class TaskViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Фоновые задачи (только админ). Фильтры: ?status=dead, ?name=<путь к функции>.
+    retry перезапускает задачу с новым счетчиком попыток.
+    """
+    serializer_class = TaskSerializer
+    permission_classes = [IsAdminRole]
+    
+    def get_queryset(self):
+        # Очередь читается только из основной базы: реплика может отставать
+        queryset = Task.objects.all()
+        status_filter = self.request.query_params.get('status')
+        if status_filter:
+            queryset = queryset.filter(status=status_filter)
+        name = self.request.query_params.get('name')
+        if name:
+            queryset = queryset.filter(name=name)
+        return queryset
+    
+    @action(detail=True, methods=['post'], throttle_classes=WRITE_THROTTLES)
+    def retry(self, request, pk=None):
+        task = self.get_object()
+        if not retry_tasks(Task.objects.filter(pk=task.pk)):
+            return Response({'error': 'Задача уже выполняется'}, status=status.HTTP_409_CONFLICT)
+        task.refresh_from_db()
+        return Response(self.get_serializer(task).data)
+
+
+@api_view(['GET'])
+@permission_classes([IsTeacherOrAdmin])
+def course_analytics(request, course_id):
+    """
+    Сводная аналитика курса: складывает роллапы уроков,
+    не обращаясь к таблице отправок.
+    """
+    course = get_object_or_404(Course, pk=course_id)
+    rows = list(LessonStats.objects.filter(course=course).select_related('lesson').order_by('lesson__order'))
+    return Response({
+        'course': course.id,
+        'course_title': course.title,
+        'summary': summarize(rows),
+        'lessons': LessonStatsSerializer(rows, many=True).data,
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsTeacherOrAdmin])
+def search(request):
+    """
+    Полнотекстовый поиск по урокам, заданиям и коду отправок.
+    Параметры: q (фраза - в кавычках, например "while true"),
+    kind (lesson,challenge,submission - через запятую), course, limit (по умолчанию 20).
+    """
+    query = request.query_params.get('q', '').strip()
+    if len(query) < 2:
+        return Response({'error': 'q должен содержать хотя бы 2 символа'}, status=status.HTTP_400_BAD_REQUEST)
+    kinds = [kind for kind in request.query_params.get('kind', '').split(',') if kind]
+    unknown = set(kinds) - {choice for choice, _ in SearchDocument.KIND_CHOICES}
+    if unknown:
+        return Response({'error': f'Неизвестный kind: {", ".join(sorted(unknown))}'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        limit = min(max(int(request.query_params.get('limit', 20)), 1), 100)
+    except ValueError:
+        return Response({'error': 'limit должен быть числом'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    documents = search_documents(query, kinds=kinds, course_id=request.query_params.get('course'), limit=limit)
+    lessons = Lesson.objects.in_bulk({document.lesson_id for document in documents})
+    usernames = dict(User.objects.filter(
+        pk__in={document.student_id for document in documents if document.student_id}
+    ).values_list('id', 'username'))
+    return Response({
+        'query': query,
+        'backend': backend_name(),
+        'results': [
+            {
+                'kind': document.kind,
+                'id': document.object_id,
+                'course': document.course_id,
+                'lesson': document.lesson_id,
+                'lesson_title': lessons[document.lesson_id].title if document.lesson_id in lessons else None,
+                'student': document.student_id,
+                'student_username': usernames.get(document.student_id),
+                'score': round(float(document.score), 4),
+                'snippet': document.snippet,
+            }
+            for document in documents
+        ],
+    })
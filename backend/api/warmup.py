@@ -0,0 +1,81 @@
+"""
+Прогрев процесса и кэшей перед приемом трафика.
+
+warm_process() выполняет работу, которую иначе оплачивают первые запросы
+после деплоя: импорт модулей, построение URL резолвера, разбор полей
+сериализаторов и моделей. С preload_app (gunicorn.conf.py) он выполняется
+один раз в мастере, и воркеры получают готовое состояние через fork.
+warm_caches() заполняет общий кэш каталога и рейтинг процесса.
+"""
+import importlib
+import inspect
+import time
+
+from django.conf import settings
+from django.urls import get_resolver
+from rest_framework import serializers as drf_serializers
+
+from . import catalog, serializers as api_serializers
+from .leaderboard import leaderboards
+
+# Модули, которые загружаются лениво при первом запросе
+LAZY_MODULES = [
+    'api.views',
+    'api.auth_views',
+    'api.events',
+    'rest_framework.renderers',
+    'rest_framework.parsers',
+    'rest_framework.negotiation',
+    'rest_framework.metadata',
+    'rest_framework_simplejwt.tokens',
+]
+
+
+def _timed(steps, name, fn):
+    started = time.perf_counter()
+    result = fn()
+    steps.append((name, (time.perf_counter() - started) * 1000))
+    return result
+
+
+def _import_modules():
+    modules = list(LAZY_MODULES)
+    if 'drf_spectacular' in settings.INSTALLED_APPS:
+        modules += ['drf_spectacular.openapi', 'drf_spectacular.views']
+    for name in modules:
+        importlib.import_module(name)
+
+
+def _build_resolver():
+    resolver = get_resolver()
+    # Обращение к reverse_dict заполняет внутренние таблицы резолвера
+    resolver.reverse_dict
+    for pattern in resolver.url_patterns:
+        getattr(pattern, 'url_patterns', None)
+
+
+def _build_serializers():
+    count = 0
+    for _, serializer_class in inspect.getmembers(api_serializers, inspect.isclass):
+        if issubclass(serializer_class, drf_serializers.Serializer) and serializer_class.__module__ == api_serializers.__name__:
+            # Поля ModelSerializer строятся из _meta модели: кэши _meta заполняются здесь
+            serializer_class().fields
+            count += 1
+    return count
+
+
+def warm_process():
+    """Прогрев без обращения к БД. Возвращает список (шаг, мс)"""
+    steps = []
+    _timed(steps, 'imports', _import_modules)
+    _timed(steps, 'url resolver', _build_resolver)
+    _timed(steps, 'serializers', _build_serializers)
+    return steps
+
+
+def warm_caches():
+    """Прогрев кэшей (требует БД). Возвращает список (шаг, мс)"""
+    steps = []
+    _timed(steps, 'catalog cache', catalog.prefill)
+    _timed(steps, 'leaderboard', lambda: leaderboards.payload(None, 10))
+    return steps
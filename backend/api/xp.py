@@ -0,0 +1,57 @@
+"""
+Начисление опыта (XP) и уровня
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .events import notify_student
+from .leaderboard import ledger_changed
+from .models import User, XPTransaction
+from .user_cache import invalidate_user
+
+XP_PER_LEVEL = 200
+
+
+def award_lesson_xp(submission):
+    """
+    Начисляет ученику lesson.xp_reward за одобренное задание.
+
+    Идемпотентно: повторное одобрение того же урока ничего не начисляет
+    (уникальная запись в журнале XPTransaction). XP и уровень обновляются
+    одним UPDATE с F-выражением, без чтения пользователя.
+    Возвращает запись журнала или None, если XP уже начислен.
+    """
+    lesson = submission.lesson
+    amount = lesson.xp_reward
+    if amount <= 0:
+        return None
+
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                entry = XPTransaction.objects.create(
+                    user_id=submission.student_id,
+                    lesson=lesson,
+                    course_id=lesson.course_id,
+                    submission=submission,
+                    amount=amount,
+                    reason='lesson',
+                )
+        except IntegrityError:
+            return None
+
+        # В SET оба выражения видят старое значение xp
+        User.objects.filter(pk=submission.student_id).update(
+            xp=F('xp') + amount,
+            level=1 + (F('xp') + amount) / XP_PER_LEVEL,
+        )
+
+        # update() не вызывает post_save, сбрасываем кэш вручную
+        transaction.on_commit(lambda: invalidate_user(submission.student_id))
+        transaction.on_commit(ledger_changed)
+        notify_student(submission.student_id, 'xp.changed', {
+            'amount': amount,
+            'lesson': lesson.id,
+            'course': lesson.course_id,
+        })
+    return entry
@@ -0,0 +1,41 @@
+"""
+Настройки gunicorn (gunicorn -c gunicorn.conf.py roblox_academy.wsgi:application)
+
+С preload_app приложение импортируется и прогревается один раз в мастере
+до fork: воркеры получают готовые модули, URL резолвер и кэши через
+copy-on-write и не тратят на это первые запросы после деплоя.
+"""
+import gc
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', 3))
+# gthread для API; потоки SSE обслуживает отдельный процесс с асинхронным воркером
+# (GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker и roblox_academy.asgi:application)
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'True').lower() in ('true', '1', 'yes')
+
+
+def when_ready(server):
+    if not preload_app:
+        return
+    from django.db import connections
+
+    from api.warmup import warm_caches, warm_process
+
+    steps = warm_process()
+    try:
+        steps += warm_caches()
+    except Exception:
+        # Без БД (например, миграции еще не применены) прогреваем только процесс
+        server.log.exception('Прогрев кэшей пропущен')
+    for name, elapsed in steps:
+        server.log.info('warmup %s: %.1fms', name, elapsed)
+
+    # Подключения к БД не должны наследоваться воркерами через fork
+    connections.close_all()
+    # Объекты, созданные при загрузке, больше не просматриваются сборщиком мусора,
+    # и их страницы памяти остаются общими для всех воркеров
+    gc.freeze()
+
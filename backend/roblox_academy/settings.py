@@ -2,6 +2,7 @@
 Django settings for roblox_academy project.
 """
 
+from datetime import timedelta
 from pathlib import Path
 from decouple import config
 
@@ -32,8 +33,8 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'rest_framework',
     'rest_framework.authtoken',
+    'rest_framework_simplejwt.token_blacklist',
     'corsheaders',
-    'drf_spectacular',
     'api',
 ]
 
@@ -46,6 +47,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.db_router.ReplicaRoutingMiddleware',
 ]
 
 ROOT_URLCONF = 'roblox_academy.urls'
@@ -83,6 +85,17 @@ if DB_ENGINE:
             'PASSWORD': config('POSTGRES_PASSWORD', default='roblox_password'),
             'HOST': config('POSTGRES_HOST', default='db'),
             'PORT': config('POSTGRES_PORT', default='5432'),
+            # Постоянные подключения: одно на поток воркера, пересоздается
+            # не реже чем раз в DB_CONN_MAX_AGE секунд
+            'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=60, cast=int),
+            # Перед повторным использованием подключение проверяется,
+            # упавшее подключение заменяется новым без ошибки запроса
+            'CONN_HEALTH_CHECKS': config('DB_CONN_HEALTH_CHECKS', default=True, cast=bool),
+            'OPTIONS': {
+                'connect_timeout': config('DB_CONNECT_TIMEOUT', default=5, cast=int),
+                'keepalives': 1,
+                'keepalives_idle': 30,
+            },
         }
     }
 else:
@@ -93,6 +106,32 @@ else:
         }
     }
 
+# Read replica
+# GET запросы к api читаются из реплики, запись всегда идет в default.
+# В тестах реплика зеркалирует default (TEST.MIRROR), поэтому данные,
+# созданные тестом, сразу видны при чтении.
+DATABASE_REPLICA_ALIAS = 'replica'
+REPLICA_STICKY_SECONDS = config('REPLICA_STICKY_SECONDS', default=5, cast=int)
+
+if config('POSTGRES_REPLICA_HOST', default=None):
+    DATABASES[DATABASE_REPLICA_ALIAS] = {
+        **DATABASES['default'],
+        'HOST': config('POSTGRES_REPLICA_HOST'),
+        'PORT': config('POSTGRES_REPLICA_PORT', default=DATABASES['default'].get('PORT', '5432')),
+        'TEST': {'MIRROR': 'default'},
+    }
+elif config('SQLITE_REPLICA', default=False, cast=bool):
+    # Локальная замена реплики: отдельный файл SQLite, который копирует из
+    # основной базы команда sync_sqlite_replica (до синхронизации он отстает,
+    # как настоящая реплика)
+    DATABASES[DATABASE_REPLICA_ALIAS] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / config('SQLITE_REPLICA_NAME', default='db.replica.sqlite3'),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['api.db_router.ReplicaRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -144,7 +183,10 @@ AUTH_USER_MODEL = 'api.User'
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        # Подписанные JWT проверяются без запроса к таблице токенов
+        'api.authentication.JWTAuthentication',
+        # Старые непрозрачные токены продолжают работать до повторного входа
+        'api.authentication.CachedTokenAuthentication',
         # SessionAuthentication отключен, так как используем только Token Authentication
         # Это устраняет необходимость в CSRF токенах для API endpoints
     ],
@@ -156,9 +198,134 @@ REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': [
         'rest_framework.renderers.JSONRenderer',
     ],
-    'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    # Запросы приходят через nginx: IP клиента берется из X-Forwarded-For
+    'NUM_PROXIES': config('NUM_PROXIES', default=1, cast=int),
+}
+
+# JWT settings
+SIMPLE_JWT = {
+    'ACCESS_TOKEN_LIFETIME': timedelta(minutes=config('JWT_ACCESS_TOKEN_MINUTES', default=15, cast=int)),
+    'REFRESH_TOKEN_LIFETIME': timedelta(days=config('JWT_REFRESH_TOKEN_DAYS', default=7, cast=int)),
+    'ROTATE_REFRESH_TOKENS': True,
+    'BLACKLIST_AFTER_ROTATION': True,
+    'UPDATE_LAST_LOGIN': False,
+    'SIGNING_KEY': SECRET_KEY,
+    # Frontend отправляет заголовок `Authorization: Token <token>`
+    'AUTH_HEADER_TYPES': ('Bearer', 'Token'),
+    # Смена пароля делает недействительными выданные токены
+    'CHECK_REVOKE_TOKEN': True,
+}
+
+# Старые токены authtoken (до перехода на JWT) принимаются столько дней после выдачи
+LEGACY_TOKEN_MAX_AGE_DAYS = config('LEGACY_TOKEN_MAX_AGE_DAYS', default=30, cast=int)
+
+# Cache settings
+# В кэше хранятся список отзыва JWT, ведра throttling, ключи Idempotency-Key и
+# версия каталога, поэтому при DEBUG=False нужен общий для всех процессов backend
+# (django.core.cache.backends.redis.RedisCache), иначе manage.py check --deploy
+# (его запускают сервисы docker-compose.prod.yml перед стартом) завершается ошибкой
+# api.E001. LocMemCache подходит только для разработки и тестов.
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='roblox-academy'),
+    }
+}
+
+# Кэш пользователей для аутентификации: локальный LRU + общий кэш
+AUTH_USER_CACHE = {
+    'LOCAL_MAXSIZE': config('AUTH_USER_CACHE_SIZE', default=1024, cast=int),
+    'LOCAL_TTL': config('AUTH_USER_CACHE_LOCAL_TTL', default=10, cast=int),
+    'SHARED_TTL': config('AUTH_USER_CACHE_SHARED_TTL', default=300, cast=int),
+}
+
+# Лимиты запросов (api/throttling.py): (burst, устойчивая скорость) по пользователю и по IP
+THROTTLE_BUCKETS = {
+    'check_code': {
+        'user': (config('THROTTLE_CHECK_CODE_BURST', default=10, cast=int), config('THROTTLE_CHECK_CODE_RATE', default='30/min')),
+        'ip': (config('THROTTLE_CHECK_CODE_IP_BURST', default=40, cast=int), config('THROTTLE_CHECK_CODE_IP_RATE', default='120/min')),
+    },
+    'write': {
+        'user': (config('THROTTLE_WRITE_BURST', default=20, cast=int), config('THROTTLE_WRITE_RATE', default='60/min')),
+        'ip': (config('THROTTLE_WRITE_IP_BURST', default=80, cast=int), config('THROTTLE_WRITE_IP_RATE', default='240/min')),
+    },
 }
 
+# Повторы запросов с заголовком Idempotency-Key (api/idempotency.py)
+IDEMPOTENCY = {
+    'TTL': config('IDEMPOTENCY_TTL', default=86400, cast=int),  # Сколько хранится ответ
+    'LOCK_TTL': config('IDEMPOTENCY_LOCK_TTL', default=60, cast=int),  # Максимальное время выполнения запроса
+    'WAIT_SECONDS': config('IDEMPOTENCY_WAIT_SECONDS', default=5, cast=int),  # Ожидание одновременного дубля
+}
+
+# Кэш каталога курсов (api/catalog.py): свежесть и окно stale-while-revalidate, секунды
+CATALOG_CACHE = {
+    'TTL': config('CATALOG_CACHE_TTL', default=300, cast=int),
+    'STALE_TTL': config('CATALOG_CACHE_STALE_TTL', default=60, cast=int),
+    # Копия версии каталога в общем кэше (источник - таблица CatalogVersion)
+    'VERSION_TTL': config('CATALOG_VERSION_TTL', default=60, cast=int),
+}
+
+# Single-flight при промахах кэша (api/singleflight.py)
+SINGLE_FLIGHT = {
+    'ENABLED': config('SINGLE_FLIGHT_ENABLED', default=True, cast=bool),
+    'CROSS_WORKER_LOCK': config('SINGLE_FLIGHT_CROSS_WORKER_LOCK', default=True, cast=bool),
+    'LOCK_TTL': 30,  # Максимальное время сборки значения
+    'WAIT_SECONDS': 5,  # Сколько ждать сборку в другом воркере
+}
+
+# Кэш вердиктов проверки кода (см. api/grading.py)
+GRADING_CACHE = {
+    'LOCAL_MAXSIZE': config('GRADING_CACHE_SIZE', default=4096, cast=int),
+    'LOCAL_TTL': config('GRADING_CACHE_LOCAL_TTL', default=300, cast=int),
+    'SHARED_TTL': config('GRADING_CACHE_SHARED_TTL', default=86400, cast=int),
+}
+
+# Ограничения размера отправок (api/payloads.py). Сверх *_MAX данные обрезаются
+# с пометкой; вывод и ошибка сверх INLINE_* хранятся сжатыми в SubmissionPayload,
+# а в строке Submission остается начало
+SUBMISSION_LIMITS = {
+    'CODE_MAX_CHARS': config('SUBMISSION_CODE_MAX_CHARS', default=50000, cast=int),
+    'OUTPUT_MAX_LINES': config('SUBMISSION_OUTPUT_MAX_LINES', default=5000, cast=int),
+    'OUTPUT_MAX_CHARS': config('SUBMISSION_OUTPUT_MAX_CHARS', default=200000, cast=int),
+    'OUTPUT_LINE_MAX_CHARS': 1000,
+    'ERROR_MAX_CHARS': config('SUBMISSION_ERROR_MAX_CHARS', default=20000, cast=int),
+    'INLINE_OUTPUT_LINES': 50,
+    'INLINE_OUTPUT_CHARS': 4000,
+    'INLINE_ERROR_CHARS': 2000,
+}
+
+# Фоновые задачи (api/tasks.py, команда run_worker). В режиме EAGER задачи
+# выполняются сразу после коммита в процессе веб-сервера (удобно для разработки)
+TASKS = {
+    'EAGER': config('TASKS_EAGER', default=DEBUG, cast=bool),
+    'MAX_ATTEMPTS': config('TASKS_MAX_ATTEMPTS', default=5, cast=int),
+    # Повтор после ошибки: BACKOFF_BASE * 2^(попытка-1) секунд, не больше BACKOFF_MAX
+    'BACKOFF_BASE': 5,
+    'BACKOFF_MAX': 3600,
+    # Воркер продлевает locked_at своих задач каждые HEARTBEAT_SECONDS; задача,
+    # блокировку которой не продлили LOCK_TIMEOUT секунд (воркер упал), возвращается в очередь
+    'HEARTBEAT_SECONDS': 60,
+    'LOCK_TIMEOUT': 600,
+    'KEEP_DONE_SECONDS': 24 * 60 * 60,
+}
+
+# Аналитика уроков (api/analytics.py): роллапы обновляются инкрементально, а воркер
+# раз в RECONCILE_SECONDS пересчитывает их с нуля (задача reconcile_lesson_analytics)
+ANALYTICS = {
+    'RECONCILE_SECONDS': config('ANALYTICS_RECONCILE_SECONDS', default=24 * 60 * 60, cast=int),
+}
+
+# Server-Sent Events: максимальная длительность одного потока,
+# после чего клиент переподключается с Last-Event-ID
+SSE_MAX_STREAM_SECONDS = config('SSE_MAX_STREAM_SECONDS', default=300, cast=int)
+# Сколько живет билет ?ticket= для открытия потока (вместо JWT в URL)
+SSE_TICKET_SECONDS = config('SSE_TICKET_SECONDS', default=60, cast=int)
+# Окно перечитывания журнала: события, закоммиченные не по порядку id
+SSE_REPLAY_SECONDS = config('SSE_REPLAY_SECONDS', default=5, cast=int)
+# Сколько дней хранится журнал событий; старые удаляет периодическая задача prune_event_log
+SSE_EVENT_RETENTION_DAYS = config('SSE_EVENT_RETENTION_DAYS', default=7, cast=int)
+
 # Swagger/OpenAPI settings
 SPECTACULAR_SETTINGS = {
     'TITLE': 'Roblox Academy API',
@@ -167,6 +334,14 @@ SPECTACULAR_SETTINGS = {
     'SERVE_INCLUDE_SCHEMA': False,
 }
 
+# Живая генерация схемы (drf_spectacular) только в разработке. В продакшене
+# /api/schema/ отдает файлы из SCHEMA_DIR, собранные при сборке образа
+SCHEMA_LIVE = config('SCHEMA_LIVE', default=DEBUG, cast=bool)
+SCHEMA_DIR = Path(config('SCHEMA_DIR', default=str(BASE_DIR / 'schema')))
+if SCHEMA_LIVE:
+    INSTALLED_APPS.insert(INSTALLED_APPS.index('api'), 'drf_spectacular')
+    REST_FRAMEWORK['DEFAULT_SCHEMA_CLASS'] = 'drf_spectacular.openapi.AutoSchema'
+
 # CORS settings
 # Для разработки проще всего разрешить все источники.
 # В продакшене это нужно будет заменить на конкретный домен вашего фронтенда.
@@ -186,6 +361,7 @@ CORS_ALLOW_HEADERS = [
     'authorization',
     'content-type',
     'dnt',
+    'idempotency-key',
     'origin',
     'user-agent',
     'x-csrftoken',
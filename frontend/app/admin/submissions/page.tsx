@@ -2,9 +2,11 @@
 
 import { useState, useEffect } from "react"
 import { useRouter } from "next/navigation"
-import { useAppSelector } from "@/lib/hooks"
+import { useAppSelector, useAppDispatch } from "@/lib/hooks"
+import { useEventStream } from "@/lib/event-stream"
 import { useGetMeQuery } from "@/lib/api/authSlice"
 import { 
+  apiSlice,
   useGetSubmissionsQuery, 
   useApproveSubmissionMutation, 
   useRejectSubmissionMutation 
@@ -37,6 +39,7 @@ import type { Submission } from "@/lib/types"
 
 export default function SubmissionsPage() {
   const router = useRouter()
+  const dispatch = useAppDispatch()
   const { user, isAuthenticated, token } = useAppSelector((state) => state.auth)
   const [selectedSubmission, setSelectedSubmission] = useState<Submission | null>(null)
   const [adminComment, setAdminComment] = useState("")
@@ -51,6 +54,14 @@ export default function SubmissionsPage() {
     { skip: !isAuthenticated && !token }
   )
 
+  // Новые и проверенные задания приходят через SSE, список обновляется только при изменениях
+  useEventStream(
+    '/events/submissions/',
+    ['submission.created', 'submission.updated', 'submission.reviewed'],
+    () => dispatch(apiSlice.util.invalidateTags(['Submission'])),
+    isAuthenticated && (user?.role === 'admin' || user?.role === 'teacher')
+  )
+
   const [approveSubmission, { isLoading: isApproving }] = useApproveSubmissionMutation()
   const [rejectSubmission, { isLoading: isRejecting }] = useRejectSubmissionMutation()
 
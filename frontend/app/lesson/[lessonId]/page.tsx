@@ -1,6 +1,6 @@
 "use client"
 
-import { useState, useEffect } from "react"
+import { useState, useEffect, useRef } from "react"
 import { useParams, useRouter } from "next/navigation"
 import Link from "next/link"
 import { 
@@ -9,11 +9,15 @@ import {
   useGetCurrentProgressQuery, 
   useCompleteLessonMutation,
   useGetStudentLessonsQuery,
-  useGetStudentChallengesQuery
+  useGetStudentChallengesQuery,
+  useGetSubmissionsQuery,
+  useCheckCodeMutation,
+  newIdempotencyKey
 } from "@/lib/api/apiSlice"
 import { useAppSelector, useAppDispatch } from "@/lib/hooks"
 import { useGetMeQuery, setCredentials } from "@/lib/api/authSlice"
 import { StudentNav } from "@/components/student/student-nav"
+import { useStudentEvents } from "@/lib/event-stream"
 import { VideoPlayer } from "@/components/lesson/video-player"
 import { LuaEditor } from "@/components/lesson/lua-editor"
 import { OutputConsole } from "@/components/lesson/output-console"
@@ -58,6 +62,9 @@ export default function LessonPage() {
     { skip: !user?.id || !lesson?.course }
   )
   const [completeLesson] = useCompleteLessonMutation()
+  const [checkCode] = useCheckCodeMutation()
+  // Ключ идемпотентности последней неудачной отправки: повтор того же кода идет с ним
+  const checkAttemptRef = useRef<{ attempt: string; key: string } | null>(null)
 
   // Получаем индивидуальный урок ученика
   const { data: studentLessons } = useGetStudentLessonsQuery(
@@ -76,6 +83,15 @@ export default function LessonPage() {
   // Определяем, какое задание использовать (индивидуальное или общее)
   const challenge = studentChallenge || lesson?.challenge
 
+  // Поток событий нужен, только пока отправка по уроку ждет проверки:
+  // после проверки событие обновит прогресс и разблокирует следующий урок
+  const { data: pendingSubmissions } = useGetSubmissionsQuery(
+    { studentId: user?.id, lessonId, status: 'pending' },
+    { skip: !user?.id }
+  )
+  const [submittedForReview, setSubmittedForReview] = useState(false)
+  useStudentEvents(submittedForReview || (pendingSubmissions?.length ?? 0) > 0)
+
   useEffect(() => {
     setIsClient(true)
   }, [])
@@ -142,6 +158,7 @@ export default function LessonPage() {
     setShowSuccessModal(false)
     setShowErrorModal(false)
     setCheckResult(null)
+    setSubmittedForReview(false)
   }, [lessonId])
 
   // Проверяем, заблокирован ли урок
@@ -199,89 +216,84 @@ export default function LessonPage() {
       setOutput(output.length > 0 ? output : ["(no output)"])
     }
 
-    // Отправляем результаты на backend для проверки
+    // Отправляем результаты на backend для проверки. Запрос идет через apiSlice:
+    // истекший access токен обновится, а повтор получит тот же Idempotency-Key
+    const attempt = JSON.stringify({ lessonId: lesson.id, code, output, error })
+    const previous = checkAttemptRef.current
+    const idempotencyKey = previous?.attempt === attempt ? previous.key : newIdempotencyKey()
+    checkAttemptRef.current = { attempt, key: idempotencyKey }
     try {
-      const API_BASE_URL = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000/api'
-      const token = typeof window !== 'undefined' ? localStorage.getItem('token') : null
-      
-      const response = await fetch(`${API_BASE_URL}/check_code/`, {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-          ...(token && { 'Authorization': `Token ${token}` }),
-        },
-        body: JSON.stringify({
-          lesson_id: lesson.id,
-          code: code,
-          output: output,
-          error: error,
-        }),
+      const result = await checkCode({
+        lessonId: lesson.id,
+        code,
+        output,
+        error,
+        idempotencyKey,
+      }).unwrap()
+      checkAttemptRef.current = null
+
+      // Сохраняем результат проверки
+      setCheckResult({
+        message: result.message || '',
+        expected: result.expected,
+        actual: result.actual,
       })
-
-      if (response.ok) {
-        const result = await response.json()
-        
-        // Сохраняем результат проверки
-        setCheckResult({
-          message: result.message || '',
-          expected: result.expected,
-          actual: result.actual,
-        })
+      
+      // Если код успешно выполнен (passed = true)
+      if (result.passed) {
+        setIsCompleted(true)
         
-        // Если код успешно выполнен (passed = true)
-        if (result.passed) {
-          setIsCompleted(true)
+        // Если задание отправлено на проверку, показываем соответствующее сообщение
+        if (result.submissionId) {
+          setSubmittedForReview(true)
+          setShowSuccessModal(true)
+          // Не переходим автоматически, ждем одобрения админа
+        } else {
+          // Старая логика для обратной совместимости
+          setShowSuccessModal(true)
           
-          // Если задание отправлено на проверку, показываем соответствующее сообщение
-          if (result.submission_id) {
-            setShowSuccessModal(true)
-            // Не переходим автоматически, ждем одобрения админа
-          } else {
-            // Старая логика для обратной совместимости
-            setShowSuccessModal(true)
-            
-            if (user) {
-              try {
-                await completeLesson({
-                  userId: user.id,
-                  courseId: courseId,
-                  lessonId: lesson.id,
-                }).unwrap()
-              } catch (err) {
-                console.error('Failed to complete lesson:', err)
-              }
+          if (user) {
+            try {
+              await completeLesson({
+                userId: user.id,
+                courseId: courseId,
+                lessonId: lesson.id,
+              }).unwrap()
+            } catch (err) {
+              console.error('Failed to complete lesson:', err)
             }
-            
-            confetti({
-              particleCount: 100,
-              spread: 70,
-              origin: { y: 0.6 },
-            })
-
-            const currentNextLesson = lessons?.find((l) => l.order === (lesson?.order || 0) + 1)
-            setTimeout(() => {
-              if (currentNextLesson) {
-                router.push(`/lesson/${currentNextLesson.id}`)
-              } else {
-                router.push("/")
-              }
-            }, 2000)
-          }
-        } else {
-          // Код не прошел проверку - задание НЕ отправлено
-          setIsCompleted(false)
-          setShowErrorModal(true)
-          // Показываем ошибку в консоли вывода
-          if (result.message) {
-            setError(result.message)
           }
+          
+          confetti({
+            particleCount: 100,
+            spread: 70,
+            origin: { y: 0.6 },
+          })
+
+          const currentNextLesson = lessons?.find((l) => l.order === (lesson?.order || 0) + 1)
+          setTimeout(() => {
+            if (currentNextLesson) {
+              router.push(`/lesson/${currentNextLesson.id}`)
+            } else {
+              router.push("/")
+            }
+          }, 2000)
         }
       } else {
+        // Код не прошел проверку - задание НЕ отправлено
+        setIsCompleted(false)
+        setShowErrorModal(true)
+        // Показываем ошибку в консоли вывода
+        if (result.message) {
+          setError(result.message)
+        }
+      }
+    } catch (err: any) {
+      if (err?.status !== 'FETCH_ERROR') {
         // Ошибка при запросе к API
-        const errorData = await response.json().catch(() => ({}))
-        setError(errorData.error || 'Ошибка при проверке кода')
+        setError(err?.data?.error || 'Ошибка при проверке кода')
+        return
       }
-    } catch (err) {
       console.error('Failed to check code on backend:', err)
       // Fallback: проверяем локально, если backend недоступен
       if (lesson.challenge && lesson.challenge.expectedOutput && !error) {
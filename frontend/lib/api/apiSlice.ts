@@ -1,7 +1,8 @@
 import { createApi, fetchBaseQuery } from '@reduxjs/toolkit/query/react'
+import type { BaseQueryApi, BaseQueryFn, FetchArgs, FetchBaseQueryError } from '@reduxjs/toolkit/query/react'
 import type { 
   Course, Lesson, User, UserProgress,
-  StudentLesson, StudentChallenge, Submission, SubmissionStatus
+  StudentLesson, StudentChallenge, Submission, SubmissionStatus, CheckCodeResult
 } from '../types'
 
 // Для локальной разработки используем localhost:8000, для продакшна - переменную окружения
@@ -92,33 +93,98 @@ const transformProgress = (apiProgress: any): UserProgress => ({
   currentLessonId: apiProgress.current_lesson_id || '',
 })
 
+// Ключ для заголовка Idempotency-Key: повтор того же запроса (после 401 или
+// обрыва сети) сервер не выполняет повторно, а возвращает сохраненный ответ
+export const newIdempotencyKey = (): string => {
+  if (typeof crypto !== 'undefined' && 'randomUUID' in crypto) {
+    return crypto.randomUUID()
+  }
+  return `${Date.now()}-${Math.random().toString(36).slice(2)}`
+}
+
+const rawBaseQuery = fetchBaseQuery({
+  baseUrl: API_BASE_URL,
+  prepareHeaders: (headers, { getState, endpoint, extra }) => {
+    // Получаем токен из Redux state
+    const state = getState() as any
+    const token = state?.auth?.token
+    const isAuthenticated = state?.auth?.isAuthenticated
+    
+    // Для /auth/me/ отправляем токен даже если isAuthenticated === false,
+    // чтобы проверить валидность токена при восстановлении сессии
+    const isAuthMeEndpoint = endpoint === 'getMe' || endpoint?.toString().includes('/auth/me/')
+    
+    // Отправляем токен если:
+    // 1. Пользователь залогинен ИЛИ
+    // 2. Это эндпоинт проверки токена (/auth/me/) и токен есть
+    if (token && token.trim() && (isAuthenticated || isAuthMeEndpoint)) {
+      headers.set('Authorization', `Token ${token}`)
+    }
+    
+    // Не устанавливаем Content-Type для FormData, браузер установит его автоматически
+    // RTK Query автоматически определяет FormData и не устанавливает Content-Type
+    
+    return headers
+  },
+})
+
+const currentToken = (api: BaseQueryApi): string | null => (api.getState() as any)?.auth?.token ?? null
+
+const refreshAccessToken = async (api: BaseQueryApi, extraOptions: {}): Promise<boolean> => {
+  const refresh = localStorage.getItem('refresh')
+  if (!refresh) {
+    return false
+  }
+  const refreshResult = await rawBaseQuery(
+    { url: '/auth/refresh/', method: 'POST', body: { refresh } },
+    api,
+    extraOptions
+  )
+  if (!refreshResult.data) {
+    return false
+  }
+  // Action из authSlice (импорт напрямую создал бы циклическую зависимость)
+  api.dispatch({ type: 'auth/tokenRefreshed', payload: refreshResult.data })
+  return true
+}
+
+// Refresh токен одноразовый (ротация + blacklist): параллельные 401 ждут одно
+// общее обновление, иначе все запросы, кроме первого, получили бы отказ
+let refreshInFlight: Promise<boolean> | null = null
+
+// Access токен живет недолго: при 401 пробуем обновить его по refresh токену
+// и повторяем исходный запрос
+const baseQueryWithReauth: BaseQueryFn<string | FetchArgs, unknown, FetchBaseQueryError> = async (
+  args,
+  api,
+  extraOptions
+) => {
+  const tokenUsed = currentToken(api)
+  let result = await rawBaseQuery(args, api, extraOptions)
+  if (result.error?.status !== 401 || typeof window === 'undefined') {
+    return result
+  }
+
+  // Пока запрос шел, токен уже обновил другой запрос: достаточно повторить
+  let refreshed = currentToken(api) !== tokenUsed
+  if (!refreshed) {
+    if (!refreshInFlight) {
+      refreshInFlight = refreshAccessToken(api, extraOptions).finally(() => {
+        refreshInFlight = null
+      })
+    }
+    refreshed = await refreshInFlight
+  }
+  if (refreshed) {
+    result = await rawBaseQuery(args, api, extraOptions)
+  }
+
+  return result
+}
+
 export const apiSlice = createApi({
   reducerPath: 'api',
-  baseQuery: fetchBaseQuery({
-    baseUrl: API_BASE_URL,
-    prepareHeaders: (headers, { getState, endpoint, extra }) => {
-      // Получаем токен из Redux state
-      const state = getState() as any
-      const token = state?.auth?.token
-      const isAuthenticated = state?.auth?.isAuthenticated
-      
-      // Для /auth/me/ отправляем токен даже если isAuthenticated === false,
-      // чтобы проверить валидность токена при восстановлении сессии
-      const isAuthMeEndpoint = endpoint === 'getMe' || endpoint?.toString().includes('/auth/me/')
-      
-      // Отправляем токен если:
-      // 1. Пользователь залогинен ИЛИ
-      // 2. Это эндпоинт проверки токена (/auth/me/) и токен есть
-      if (token && token.trim() && (isAuthenticated || isAuthMeEndpoint)) {
-        headers.set('Authorization', `Token ${token}`)
-      }
-      
-      // Не устанавливаем Content-Type для FormData, браузер установит его автоматически
-      // RTK Query автоматически определяет FormData и не устанавливает Content-Type
-      
-      return headers
-    },
-  }),
+  baseQuery: baseQueryWithReauth,
   tagTypes: ['Course', 'Lesson', 'User', 'Progress', 'StudentLesson', 'StudentChallenge', 'Submission'],
   endpoints: (builder) => ({
     // Courses
@@ -286,6 +352,7 @@ export const apiSlice = createApi({
       query: (body) => ({
         url: '/progress/complete_lesson/',
         method: 'POST',
+        headers: { 'Idempotency-Key': newIdempotencyKey() },
         body: {
           user_id: body.userId,
           course_id: body.courseId,
@@ -369,6 +436,7 @@ export const apiSlice = createApi({
       query: (id) => ({
         url: `/student-lessons/${id}/complete/`,
         method: 'POST',
+        headers: { 'Idempotency-Key': newIdempotencyKey() },
       }),
       invalidatesTags: ['StudentLesson', 'Progress'],
     }),
@@ -389,6 +457,47 @@ export const apiSlice = createApi({
       providesTags: (result, error, id) => [{ type: 'StudentChallenge', id }],
     }),
 
+    // Проверка кода урока. Ключ идемпотентности передает страница: повтор той же
+    // отправки после сетевой ошибки не создает вторую Submission
+    checkCode: builder.mutation<
+      CheckCodeResult,
+      { lessonId: string; code: string; output: string[]; error: string | null; idempotencyKey: string }
+    >({
+      query: ({ idempotencyKey, ...body }) => ({
+        url: '/check_code/',
+        method: 'POST',
+        headers: { 'Idempotency-Key': idempotencyKey },
+        body: {
+          lesson_id: body.lessonId,
+          code: body.code,
+          output: body.output,
+          error: body.error,
+        },
+      }),
+      transformResponse: (response: any): CheckCodeResult => ({
+        passed: Boolean(response.passed),
+        message: response.message || '',
+        expected: response.expected,
+        actual: response.actual,
+        error: response.error,
+        submissionId: response.submission_id,
+        cached: response.cached,
+      }),
+      invalidatesTags: ['Submission'],
+    }),
+
+    // Короткоживущий билет для открытия потока SSE (JWT в URL не передается)
+    getEventTicket: builder.mutation<{ ticket: string; expiresIn: number }, void>({
+      query: () => ({
+        url: '/events/ticket/',
+        method: 'POST',
+      }),
+      transformResponse: (response: any) => ({
+        ticket: response.ticket,
+        expiresIn: response.expires_in,
+      }),
+    }),
+
     // Submissions
     getSubmissions: builder.query<Submission[], { studentId?: string; lessonId?: string; status?: SubmissionStatus } | void>({
       query: (params) => {
@@ -419,6 +528,7 @@ export const apiSlice = createApi({
       query: ({ id, adminComment }) => ({
         url: `/submissions/${id}/approve/`,
         method: 'POST',
+        headers: { 'Idempotency-Key': newIdempotencyKey() },
         body: { admin_comment: adminComment },
       }),
       transformResponse: (response: any) => transformSubmission(response),
@@ -456,6 +566,8 @@ export const {
   useGetStudentLessonQuery,
   useUnlockStudentLessonMutation,
   useCompleteStudentLessonMutation,
+  useCheckCodeMutation,
+  useGetEventTicketMutation,
   // Student Challenges
   useGetStudentChallengesQuery,
   useGetStudentChallengeQuery,
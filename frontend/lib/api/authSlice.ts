@@ -46,7 +46,7 @@ const initialState: AuthState = getInitialState()
 // Auth API endpoints (определяем до authSlice для использования в extraReducers)
 export const authApi = apiSlice.injectEndpoints({
   endpoints: (builder) => ({
-    login: builder.mutation<{ token: string; user: User }, { username: string; password: string }>({
+    login: builder.mutation<{ token: string; refresh: string; user: User }, { username: string; password: string }>({
       query: (credentials) => ({
         url: '/auth/login/',
         method: 'POST',
@@ -57,6 +57,7 @@ export const authApi = apiSlice.injectEndpoints({
         const user = transformUser(response.user)
         return {
           token: response.token,
+          refresh: response.refresh,
           user,
         }
       },
@@ -65,6 +66,10 @@ export const authApi = apiSlice.injectEndpoints({
       query: () => ({
         url: '/auth/logout/',
         method: 'POST',
+        // Refresh токен отзывается на сервере вместе с access токеном
+        body: {
+          refresh: typeof window !== 'undefined' ? localStorage.getItem('refresh') : null,
+        },
       }),
     }),
     getMe: builder.query<User, void>({
@@ -95,9 +100,19 @@ const authSlice = createSlice({
       
       if (typeof window !== 'undefined') {
         localStorage.removeItem('token')
+        localStorage.removeItem('refresh')
         localStorage.removeItem('user')
       }
     },
+    tokenRefreshed: (state, action: PayloadAction<{ token: string; refresh?: string }>) => {
+      state.token = action.payload.token
+      if (typeof window !== 'undefined') {
+        localStorage.setItem('token', action.payload.token)
+        if (action.payload.refresh) {
+          localStorage.setItem('refresh', action.payload.refresh)
+        }
+      }
+    },
     updateUser: (state, action: PayloadAction<User>) => {
       state.user = action.payload
       if (typeof window !== 'undefined') {
@@ -115,6 +130,7 @@ const authSlice = createSlice({
           state.isAuthenticated = true
           if (typeof window !== 'undefined') {
             localStorage.setItem('token', action.payload.token)
+            localStorage.setItem('refresh', action.payload.refresh)
             localStorage.setItem('user', JSON.stringify(action.payload.user))
           }
         }
@@ -127,6 +143,7 @@ const authSlice = createSlice({
           state.isAuthenticated = false
           if (typeof window !== 'undefined') {
             localStorage.removeItem('token')
+            localStorage.removeItem('refresh')
             localStorage.removeItem('user')
           }
         }
@@ -134,7 +151,7 @@ const authSlice = createSlice({
   },
 })
 
-export const { setCredentials, logout, updateUser } = authSlice.actions
+export const { setCredentials, logout, tokenRefreshed, updateUser } = authSlice.actions
 export default authSlice.reducer
 
 export const { useLoginMutation, useLogoutMutation, useGetMeQuery } = authApi
@@ -0,0 +1,164 @@
+import { useEffect, useRef, useState } from 'react'
+import { useAppDispatch, useAppSelector } from './hooks'
+import { apiSlice, useGetEventTicketMutation } from './api/apiSlice'
+
+const API_BASE_URL = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000/api'
+
+// Сколько последних id помнить для отбрасывания повторов
+const SEEN_IDS_LIMIT = 500
+const MAX_RECONNECT_DELAY = 30000
+
+// Подписка на поток Server-Sent Events API.
+// EventSource не умеет передавать заголовки, поэтому перед каждым подключением
+// запрашивается короткоживущий билет (обычный запрос: истекший JWT обновится),
+// и он идет в query параметре. Поток закрывается сервером по таймауту, при
+// обрыве или истечении билета: подключаемся заново с новым билетом и
+// last_event_id. Сервер при возобновлении перечитывает небольшое окно событий,
+// повторы отбрасываются по id.
+// В скрытой вкладке поток закрыт: соединения держат только открытые страницы.
+export function useEventStream(
+  path: string,
+  eventTypes: string[],
+  onEvent: (type: string, data: any) => void,
+  enabled = true
+) {
+  const isAuthenticated = useAppSelector((state) => state.auth.isAuthenticated)
+  const visible = usePageVisible()
+  const [getTicket] = useGetEventTicketMutation()
+  const handlerRef = useRef(onEvent)
+  handlerRef.current = onEvent
+  const lastEventIdRef = useRef<string | null>(null)
+  const seenRef = useRef<Set<string>>(new Set())
+  const typesKey = eventTypes.join(',')
+
+  useEffect(() => {
+    if (!enabled || !visible || !isAuthenticated || typeof window === 'undefined') {
+      return
+    }
+
+    let source: EventSource | null = null
+    let timer: ReturnType<typeof setTimeout> | undefined
+    let stopped = false
+    let failures = 0
+
+    const listener = (event: MessageEvent) => {
+      if (event.lastEventId) {
+        const seen = seenRef.current
+        if (seen.has(event.lastEventId)) {
+          return
+        }
+        seen.add(event.lastEventId)
+        if (seen.size > SEEN_IDS_LIMIT) {
+          seen.delete(seen.values().next().value as string)
+        }
+        if (!lastEventIdRef.current || Number(event.lastEventId) > Number(lastEventIdRef.current)) {
+          lastEventIdRef.current = event.lastEventId
+        }
+      }
+      let data: any = null
+      try {
+        data = JSON.parse(event.data)
+      } catch {
+        // Игнорируем некорректные события
+      }
+      handlerRef.current(event.type, data)
+    }
+
+    const types = typesKey.split(',')
+
+    const reconnect = () => {
+      if (stopped) {
+        return
+      }
+      failures += 1
+      timer = setTimeout(connect, Math.min(MAX_RECONNECT_DELAY, 1000 * 2 ** Math.min(failures, 5)))
+    }
+
+    const connect = async () => {
+      let ticket: string
+      try {
+        ticket = (await getTicket().unwrap()).ticket
+      } catch {
+        reconnect()
+        return
+      }
+      if (stopped) {
+        return
+      }
+      const params = new URLSearchParams({ ticket })
+      if (lastEventIdRef.current) {
+        params.set('last_event_id', lastEventIdRef.current)
+      }
+      const current = new EventSource(`${API_BASE_URL}${path}?${params}`)
+      source = current
+      types.forEach((type) => current.addEventListener(type, listener))
+      current.onopen = () => {
+        failures = 0
+      }
+      current.onerror = () => {
+        // Сам EventSource повторил бы запрос со старым билетом: переподключаемся с новым
+        types.forEach((type) => current.removeEventListener(type, listener))
+        current.close()
+        if (source === current) {
+          source = null
+        }
+        reconnect()
+      }
+    }
+
+    connect()
+    return () => {
+      stopped = true
+      clearTimeout(timer)
+      if (source) {
+        types.forEach((type) => source?.removeEventListener(type, listener))
+        source.close()
+      }
+    }
+  }, [path, typesKey, isAuthenticated, enabled, visible, getTicket])
+}
+
+function usePageVisible() {
+  const [visible, setVisible] = useState(
+    typeof document === 'undefined' || document.visibilityState !== 'hidden'
+  )
+
+  useEffect(() => {
+    const onChange = () => setVisible(document.visibilityState !== 'hidden')
+    document.addEventListener('visibilitychange', onChange)
+    return () => document.removeEventListener('visibilitychange', onChange)
+  }, [])
+
+  return visible
+}
+
+// Какие данные устаревают после события из личного потока ученика
+const STUDENT_EVENT_TAGS = {
+  'submission.reviewed': ['Submission', 'Progress', 'StudentLesson', 'Lesson', 'Course'],
+  'lesson.unlocked': ['Progress', 'StudentLesson', 'Lesson', 'Course'],
+  'lesson.completed': ['Progress', 'StudentLesson'],
+  'xp.changed': ['User'],
+} as const
+
+type StudentEventType = keyof typeof STUDENT_EVENT_TAGS
+
+// Личный поток ученика: вместо опроса /progress/current/ и /student-lessons/
+// инвалидируем только затронутые событием данные.
+// Поток открывают только страницы, которые ждут событий (например, урок с
+// отправкой на проверке), а не каждая страница ученика.
+export function useStudentEvents(enabled = true) {
+  const dispatch = useAppDispatch()
+  const { isAuthenticated, user } = useAppSelector((state) => state.auth)
+
+  useEventStream(
+    '/events/me/',
+    Object.keys(STUDENT_EVENT_TAGS),
+    (type) => {
+      const tags = STUDENT_EVENT_TAGS[type as StudentEventType]
+      if (tags) {
+        dispatch(apiSlice.util.invalidateTags([...tags]))
+      }
+    },
+    enabled && isAuthenticated && user?.role === 'student'
+  )
+}
@@ -73,6 +73,17 @@ export interface StudentChallenge {
 
 export type SubmissionStatus = 'pending' | 'approved' | 'rejected'
 
+// Ответ /check_code/: submissionId есть, если задание отправлено на проверку
+export interface CheckCodeResult {
+  passed: boolean
+  message: string
+  expected?: string
+  actual?: string[]
+  error?: string
+  submissionId?: number
+  cached?: boolean
+}
+
 export interface Submission {
   id: number
   student: number